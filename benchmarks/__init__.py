@@ -0,0 +1,4 @@
+"""Load and latency benchmarks for the account service
+
+Run with ``python -m benchmarks --help``.
+"""
@@ -0,0 +1,123 @@
+"""Command line entry point for the benchmarks
+
+Examples:
+
+    # In-process, 1000 seeded accounts, mixed workload
+    python -m benchmarks --accounts 1000 --requests 5000
+
+    # Against a local gunicorn with 4 workers, 16 concurrent clients
+    python -m benchmarks --gunicorn --workers 4 --concurrency 16
+
+    # Against a running server, failing on a >10% regression
+    python -m benchmarks --url http://localhost:8080 --baseline results/main.json
+
+    # Save a new baseline
+    python -m benchmarks --output results/main.json
+
+    # Time import-to-first-request of 20 fresh processes
+    python -m benchmarks --startup --runs 20
+"""
+
+import argparse
+import json
+import shutil
+import sys
+
+from benchmarks import runner, startup
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the account endpoints")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="benchmark a running server at this base URL")
+    target.add_argument("--gunicorn", action="store_true", help="start a local gunicorn and benchmark it")
+    target.add_argument("--startup", action="store_true", help="time import-to-first-request of fresh processes")
+    parser.add_argument("--runs", type=int, default=10, help="processes to start (with --startup)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers (with --gunicorn)")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker (with --gunicorn)")
+    parser.add_argument("--mix", choices=sorted(runner.MIXES), default="mixed", help="operation mix")
+    parser.add_argument("--accounts", type=int, default=1000, help="accounts to seed before measuring")
+    parser.add_argument("--requests", type=int, default=2000, help="requests to measure")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests sent first")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the operation sequence")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument(
+        "--threshold", type=float, default=10.0, help="percent change in p95 or throughput counted as a regression"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = {
+        "mix": args.mix,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "accounts": args.accounts,
+        "seed": args.seed,
+        "warmup": args.warmup,
+    }
+
+    directory = None
+    try:
+        if args.url:
+            target = args.url
+            client = runner.HttpClient(args.url)
+            results = runner.run_benchmark(client, **options)
+        else:
+            directory, database_uri = runner.temporary_database()
+            runner.create_schema(database_uri)
+            if args.startup:
+                target = "startup"
+                client = None
+                results = startup.measure_startup(database_uri, runs=args.runs)
+            elif args.gunicorn:
+                target = f"gunicorn (workers={args.workers}, threads={args.threads})"
+                with runner.Gunicorn(database_uri, workers=args.workers, threads=args.threads) as server:
+                    client = runner.HttpClient(server.url)
+                    results = runner.run_benchmark(client, **options)
+            else:
+                from service import create_app
+
+                target = "in-process"
+                client = runner.InProcessClient(create_app({"SQLALCHEMY_DATABASE_URI": database_uri}))
+                results = runner.run_benchmark(client, **options)
+        if client:
+            client.close()
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.startup:
+        document = {"meta": runner.metadata(target, None, args.runs, 1, 0), "results": results}
+        print(f"{target}, runs={args.runs}")
+    else:
+        document = {
+            "meta": runner.metadata(target, args.mix, args.requests, args.concurrency, args.accounts),
+            "results": results,
+        }
+        print(f"{target}, mix={args.mix}, requests={args.requests}, concurrency={args.concurrency}")
+    print(runner.format_table(results))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(document, handle, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = runner.compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"Regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions against {args.baseline} (threshold {args.threshold}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""Benchmark Runner
+
+Seeds a database with accounts, then drives a weighted mix of account
+operations against the service and records the latency of every request.
+
+Two targets are supported:
+    in-process  the Flask test client, which measures the application
+                code without any network or server overhead
+    HTTP        any running server, or a local gunicorn started by the
+                runner, which measures what a client actually sees
+
+Results are summarised per operation (throughput and p50/p95/p99
+latency), can be written to a JSON file, and can be compared with an
+earlier result file to flag regressions.
+"""
+
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Relative weights of each operation in a mix
+MIXES = {
+    "read": {"read": 70, "list": 20, "update": 10},
+    "write": {"create": 40, "update": 30, "delete": 10, "read": 20},
+    "mixed": {"create": 10, "read": 50, "update": 15, "list": 20, "delete": 5},
+    "list": {"list": 100},
+}
+
+# Accounts created per POST /accounts/bulk while seeding
+SEED_CHUNK = 1000
+
+LIST_PAGE_SIZE = 100
+
+PERCENTILES = (50, 95, 99)
+
+
+class InProcessClient:
+    """Sends requests through the Flask test client"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        """Send a request and return (status, decoded JSON body or None)"""
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        """Nothing to release for the test client"""
+
+
+class HttpClient:
+    """Sends requests over keep-alive HTTP connections, one per thread"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def request(self, method, path, body=None):
+        """Send a request and return (status, decoded JSON body or None)"""
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request(method, self.prefix + path, body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server closed the keep-alive connection; retry once on a new one
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        """Close every connection opened by the worker threads"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+class Gunicorn:
+    """A local gunicorn serving service:create_app() on a free port"""
+
+    def __init__(self, database_uri, workers=2, threads=1):
+        self.database_uri = database_uri
+        self.workers = workers
+        self.threads = threads
+        self.port = _free_port()
+        self.process = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout=30):
+        """Start gunicorn and wait until it answers"""
+        env = dict(os.environ, DATABASE_URI=self.database_uri)
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn",
+                "--bind", f"127.0.0.1:{self.port}",
+                "--workers", str(self.workers),
+                "--threads", str(self.threads),
+                "--log-level", "warning",
+                "service:create_app()",
+            ],
+            cwd=REPO_ROOT,
+            env=env,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {self.process.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("gunicorn did not start in time")
+
+    def stop(self):
+        """Stop gunicorn"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def create_schema(database_uri):
+    """Create the tables once, before any server process starts
+
+    Runs `flask db-create`, the same step a deployment runs.
+    """
+    from service import create_app
+
+    result = create_app({"SQLALCHEMY_DATABASE_URI": database_uri}).test_cli_runner().invoke(args=["db-create"])
+    if result.exit_code != 0:
+        raise RuntimeError(f"db-create failed: {result.output}")
+
+
+def temporary_database():
+    """Return (directory, URI) of a fresh SQLite file"""
+    directory = tempfile.mkdtemp(prefix="accounts-bench-")
+    return directory, f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+
+class Workload:
+    """Issues the operations of a mix and tracks the ids they can target"""
+
+    def __init__(self, client, mix, seed=0):
+        self.client = client
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.random = random.Random(seed)
+        self.ids = []
+        self.lock = threading.Lock()
+        self.counter = 0
+        # Keeps emails unique across runs against the same database
+        self.token = uuid.uuid4().hex[:8]
+
+    def _next_email(self):
+        with self.lock:
+            self.counter += 1
+            return f"bench-{self.token}-{self.counter}@example.com"
+
+    def _pick_id(self, remove=False):
+        with self.lock:
+            if not self.ids:
+                return None
+            index = self.random.randrange(len(self.ids))
+            chosen = self.ids[index]
+            if remove:
+                # Swap with the last id so removal is O(1)
+                self.ids[index] = self.ids[-1]
+                self.ids.pop()
+            return chosen
+
+    def seed(self, count):
+        """Create count accounts through POST /accounts/bulk"""
+        for start in range(0, count, SEED_CHUNK):
+            batch = [
+                {"name": f"Bench User {i}", "email": self._next_email(), "address": f"{i} Benchmark Way"}
+                for i in range(start, min(count, start + SEED_CHUNK))
+            ]
+            status, body = self.client.request("POST", "/accounts/bulk", batch)
+            if status != 201:
+                raise RuntimeError(f"Seeding failed with status {status}: {body}")
+            self.ids.extend(result["id"] for result in body["results"])
+
+    def choose(self):
+        """Pick the next operation according to the mix weights"""
+        with self.lock:
+            return self.random.choices(self.operations, self.weights)[0]
+
+    def run(self, operation):
+        """Run one operation and return its HTTP status"""
+        if operation == "create":
+            status, body = self.client.request(
+                "POST", "/accounts", {"name": "Bench Create", "email": self._next_email()}
+            )
+            if status == 201:
+                with self.lock:
+                    self.ids.append(body["id"])
+            return status
+        if operation == "list":
+            after_id = self._pick_id() or 0
+            return self.client.request("GET", f"/accounts?limit={LIST_PAGE_SIZE}&after={_cursor(after_id)}")[0]
+
+        account_id = self._pick_id(remove=operation == "delete")
+        if account_id is None:
+            return self.run("create")
+        if operation == "read":
+            return self.client.request("GET", f"/accounts/{account_id}")[0]
+        if operation == "update":
+            return self.client.request("PATCH", f"/accounts/{account_id}", {"address": "1 Updated Road"})[0]
+        if operation == "delete":
+            return self.client.request("DELETE", f"/accounts/{account_id}")[0]
+        raise ValueError(f"Unknown operation: {operation}")
+
+
+def _cursor(account_id):
+    """Build a list cursor, as service.routes encodes them"""
+    from service.routes import _encode_cursor
+
+    return _encode_cursor(account_id)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarise(samples, elapsed):
+    """Turn (latency seconds, ok) samples into a result dict"""
+    latencies = sorted(latency for latency, _ in samples)
+    summary = {
+        "requests": len(samples),
+        "errors": sum(1 for _, ok in samples if not ok),
+        "throughput": round(len(samples) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+    }
+    for pct in PERCENTILES:
+        value = percentile(latencies, pct)
+        summary[f"p{pct}_ms"] = round(value * 1000, 3) if value is not None else None
+    return summary
+
+
+def run_benchmark(client, mix="mixed", requests=1000, concurrency=1, accounts=1000, seed=0, warmup=50):
+    """Seed accounts, run the mix and return the summarised results"""
+    workload = Workload(client, MIXES[mix], seed=seed)
+    workload.seed(accounts)
+    for _ in range(warmup):
+        workload.run("read")
+
+    samples = {name: [] for name in workload.operations}
+    samples_lock = threading.Lock()
+
+    def one_request(_):
+        operation = workload.choose()
+        started = time.perf_counter()
+        try:
+            status = workload.run(operation)
+            ok = status < 400
+        except Exception:  # a failed request is a sample, not the end of the run
+            ok = False
+        latency = time.perf_counter() - started
+        with samples_lock:
+            samples[operation].append((latency, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    results = {"overall": summarise([s for group in samples.values() for s in group], elapsed)}
+    for name, group in samples.items():
+        if group:
+            results[name] = summarise(group, elapsed)
+    return results
+
+
+def metadata(target, mix, requests, concurrency, accounts):
+    """Describe the run, so results files can be told apart"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": target,
+        "mix": mix,
+        "requests": requests,
+        "concurrency": concurrency,
+        "accounts": accounts,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(current, baseline, threshold=10.0):
+    """Compare two result dicts and return a list of regressions
+
+    A regression is a p95 latency more than threshold percent higher, or
+    a throughput more than threshold percent lower, than the baseline.
+    """
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous.get("p95_ms") and result.get("p95_ms") is not None:
+            change = (result["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+            if change > threshold:
+                regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {result['p95_ms']}ms (+{change:.1f}%)")
+        if previous.get("throughput") and result.get("throughput") is not None:
+            change = (previous["throughput"] - result["throughput"]) / previous["throughput"] * 100
+            if change > threshold:
+                regressions.append(
+                    f"{name}: throughput {previous['throughput']}/s -> {result['throughput']}/s (-{change:.1f}%)"
+                )
+    return regressions
+
+
+def format_table(results):
+    """Render results as a plain text table"""
+    columns = ["requests", "errors", "throughput", "mean_ms"] + [f"p{pct}_ms" for pct in PERCENTILES]
+    width = max([10] + [len(name) + 1 for name in results])
+    lines = ["operation".ljust(width) + "".join(f"{column:>12}" for column in columns)]
+    for name, result in results.items():
+        cells = "".join(f"{'-' if result[column] is None else result[column]:>12}" for column in columns)
+        lines.append(f"{name:<{width}}{cells}")
+    return "\n".join(lines)
@@ -0,0 +1,70 @@
+"""Startup Benchmark
+
+Measures how long a new worker takes from `from service import
+create_app` to the response of its first request, the cost paid by
+every gunicorn fork and every rollout. Each run is a fresh Python
+process, so all imports are cold.
+
+The time is split into phases:
+    import          importing the service package
+    create_app      building the app (no database work)
+    first_request   the first request, including the first connection
+    total           the sum of the three
+"""
+
+import json
+import subprocess
+import sys
+
+from benchmarks.runner import REPO_ROOT, summarise
+
+# Runs in the child process; prints the phase timings as JSON
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from service import create_app
+imported = time.perf_counter()
+app = create_app({"SQLALCHEMY_DATABASE_URI": sys.argv[1]})
+created = time.perf_counter()
+status = app.test_client().get(sys.argv[2]).status_code
+finished = time.perf_counter()
+print(json.dumps({
+    "status": status,
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_request": finished - created,
+    "total": finished - started,
+}))
+"""
+
+PHASES = ("import", "create_app", "first_request", "total")
+
+FIRST_REQUEST = "/accounts?limit=1"
+
+
+def run_once(database_uri, path=FIRST_REQUEST):
+    """Start one fresh process and return its timings in seconds"""
+    completed = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT, database_uri, path],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def measure_startup(database_uri, runs=10, path=FIRST_REQUEST):
+    """Start runs processes and summarise each phase
+
+    The schema must already exist, as it would in a deployment. The
+    results use the same fields as the load benchmarks, so they can be
+    printed with format_table() and compared with compare().
+    """
+    samples = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        timings = run_once(database_uri, path)
+        ok = timings["status"] < 400
+        for phase in PHASES:
+            samples[phase].append((timings[phase], ok))
+    return {phase: summarise(samples[phase], None) for phase in PHASES}
@@ -0,0 +1,28 @@
+"""Gunicorn configuration
+
+Loaded automatically by gunicorn from the working directory. It switches
+prometheus_client to multiprocess mode so /metrics adds up the values of
+every worker (see service/metrics.py).
+"""
+
+import os
+
+# Must exist before the app, and with it prometheus_client, is imported.
+# The config file is loaded first, including with --preload.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def on_starting(server):
+    """Start from an empty metrics directory"""
+    # Files left by an earlier run would be added to this run's totals
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that has exited"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
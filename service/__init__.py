@@ -1,36 +1,132 @@
-"""Service Package"""
+"""Service Package
 
-from flask import Flask
+create_app() is the one application factory: gunicorn, the flask CLI,
+app.py and the tests all build the app through it. It does no database
+work, so starting a worker costs no round trip; the schema is created
+by `flask db-create` as a separate deployment step. Only Flask and
+Flask-SQLAlchemy are imported with the package, the rest of the app is
+imported by the factory, so `from service import db` stays cheap.
+"""
+
+import os
+
+from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 
-# Initialize SQLAlchemy
-db = SQLAlchemy()
+from service.replicas import RoutingSession
+
+# Initialize SQLAlchemy; the session sends replica-safe reads to replicas
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+DEFAULT_SECRET_KEY = "dev-secret-key-change-in-production"
 
 
 def create_app(test_config=None):
     """Create Flask Application"""
+    from service import (
+        admission, commands, compression, database, json_provider, metrics, profiling, replicas, routes
+    )
+
     app = Flask(__name__)
 
-    # Default configuration
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///accounts.db"
+    # Default configuration, with database and admission settings taken from the environment
+    app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", DEFAULT_SECRET_KEY)
+    app.config.update(database.settings_from_env())
+    app.config.update(admission.settings_from_env())
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     # Override with test config if provided
     if test_config:
         app.config.update(test_config)
 
-    # Initialize db with app
-    db.init_app(app)
+    # Encode responses with orjson when it is installed
+    json_provider.init_app(app)
+    _init_security(app)
+
+    # Pool settings depend on the final database URI
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", database.engine_options(app.config))
+    replica_engines = replicas.configure(app)
 
-    # Import models to register them with SQLAlchemy
+    # Initialize db with app; the engines connect on first use
+    db.init_app(app)
     with app.app_context():
-        from service.models import Account
+        for engine in [db.engine] + replica_engines:
+            database.track_engine(engine)
+            database.apply_sqlite_pragmas(engine, app.config.get("SQLITE_PRAGMAS"))
+            metrics.instrument_engine(engine)
+            profiling.instrument_engine(
+                engine, app.config.get("SQL_SLOW_QUERY_MS", profiling.DEFAULT_SLOW_QUERY_MS)
+            )
 
-        db.create_all()
+    routes.init_app(app)
+    _init_site(app)
+    commands.init_app(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    # After metrics, so shed requests are still counted
+    admission.init_app(app)
+    replicas.init_app(app)
+    compression.init_app(app)
 
-    # Import and register routes
-    from service.routes import init_app
+    return app
 
-    init_app(app)
 
-    return app
+def _init_security(app):
+    """Add the security headers (Flask-Talisman) and CORS (Flask-CORS)"""
+    from flask_cors import CORS
+    from flask_talisman import Talisman
+
+    Talisman(
+        app,
+        content_security_policy={
+            'default-src': ['\'self\''],
+            'style-src': ['\'self\'', '\'unsafe-inline\''],
+            'script-src': ['\'self\'', '\'unsafe-inline\'']
+        },
+        content_security_policy_nonce_in=['script-src'],
+        force_https=False,  # Set to True in production
+        force_https_permanent=False,
+        session_cookie_secure=True,
+        session_cookie_http_only=True,
+        session_cookie_samesite='Lax'
+    )
+
+    CORS(app,
+         resources={r"/*": {"origins": "*"}},
+         supports_credentials=True,
+         allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+         expose_headers=["Content-Type", "Authorization"],
+         max_age=600)
+
+
+def _init_site(app):
+    """Add the service-level routes and the JSON error handlers"""
+
+    @app.route("/")
+    def index():
+        """Root endpoint with service info"""
+        return jsonify({"name": "Account REST API Service", "version": "1.0"})
+
+    @app.route("/health")
+    def health():
+        """Health check endpoint"""
+        return jsonify({"status": "healthy"}), 200
+
+    @app.route("/test-cors")
+    def test_cors():
+        """Test CORS endpoint"""
+        return jsonify({"message": "CORS test successful", "cors_enabled": True}), 200
+
+    @app.errorhandler(400)
+    def handle_bad_request(e):
+        """Handle bad requests including invalid JSON"""
+        if hasattr(e, "description") and "Failed to decode JSON object" in str(e.description):
+            return jsonify({"error": "Invalid JSON format"}), 400
+        return jsonify({"error": str(e.description) if hasattr(e, "description") else "Bad request"}), 400
+
+    @app.errorhandler(500)
+    def handle_internal_error(e):
+        """Handle internal server errors"""
+        app.logger.error(f"Internal server error: {e}")
+        return jsonify({"error": "Internal server error"}), 500
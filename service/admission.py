@@ -0,0 +1,205 @@
+"""Admission Control
+
+Sheds load before it queues up, so latency stays bounded during a spike
+instead of growing until the health probes time out. Every request
+except the health, info and metrics endpoints passes three checks:
+
+1. a token bucket per client (ADMISSION_CLIENT_RATE requests/second,
+   bursts of ADMISSION_CLIENT_BURST), answered with 429 when empty
+2. a global token bucket (ADMISSION_GLOBAL_RATE, ADMISSION_GLOBAL_BURST),
+   answered with 503 when empty
+3. a limit on requests in flight per route class, answered with 503:
+       read    GET and HEAD requests           ADMISSION_MAX_READS
+       write   every other method              ADMISSION_MAX_WRITES
+       list    handlers marked @route_class("list"), which scan many
+               rows or stream                  ADMISSION_MAX_LISTS
+
+Rejections carry a Retry-After header: the time until the client's (or
+the global) bucket has a token again, or ADMISSION_RETRY_AFTER seconds
+for a concurrency limit. A rate or limit of 0 turns that check off,
+which is the default.
+
+Clients are told apart by their address, or by the first value of the
+ADMISSION_CLIENT_HEADER header (e.g. X-Forwarded-For behind a proxy).
+All state is per process, so with gunicorn each worker enforces the
+limits on its own share of the traffic.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, jsonify, request
+
+# Setting name, parser and default for each admission setting
+SETTINGS = {
+    "ADMISSION_CLIENT_RATE": (float, 0),
+    "ADMISSION_CLIENT_BURST": (int, 0),
+    "ADMISSION_GLOBAL_RATE": (float, 0),
+    "ADMISSION_GLOBAL_BURST": (int, 0),
+    "ADMISSION_MAX_READS": (int, 0),
+    "ADMISSION_MAX_WRITES": (int, 0),
+    "ADMISSION_MAX_LISTS": (int, 0),
+    "ADMISSION_RETRY_AFTER": (int, 1),
+    "ADMISSION_CLIENT_HEADER": (str, ""),
+    "ADMISSION_MAX_CLIENTS": (int, 10000),
+}
+
+# Endpoints that are never shed: probes must keep answering under load
+EXEMPT_ENDPOINTS = frozenset(("index", "health", "metrics", "static"))
+
+SAFE_METHODS = ("GET", "HEAD")
+ROUTE_CLASSES = ("read", "write", "list")
+
+
+def settings_from_env(environ=None):
+    """Return the admission settings for app.config from the environment"""
+    environ = os.environ if environ is None else environ
+    settings = {}
+    for name, (parse, default) in SETTINGS.items():
+        value = environ.get(name)
+        settings[name] = default if value in (None, "") else parse(value)
+    return settings
+
+
+class TokenBucket:
+    """Refills rate tokens per second up to burst; each request takes one"""
+
+    def __init__(self, rate, burst=0):
+        self.rate = rate
+        self.burst = max(burst, 1) if burst else max(math.ceil(rate), 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token; return 0 on success, else seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class ClientBuckets:
+    """A token bucket per client, forgetting the least recently seen clients"""
+
+    def __init__(self, rate, burst=0, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+        return bucket.take()
+
+
+class Admission:
+    """The buckets and concurrency limits of one app"""
+
+    def __init__(self, config):
+        self.retry_after = config.get("ADMISSION_RETRY_AFTER", 1)
+        self.client_header = config.get("ADMISSION_CLIENT_HEADER", "")
+        client_rate = config.get("ADMISSION_CLIENT_RATE", 0)
+        global_rate = config.get("ADMISSION_GLOBAL_RATE", 0)
+        self.clients = ClientBuckets(
+            client_rate, config.get("ADMISSION_CLIENT_BURST", 0), config.get("ADMISSION_MAX_CLIENTS", 10000)
+        ) if client_rate else None
+        self.bucket = TokenBucket(global_rate, config.get("ADMISSION_GLOBAL_BURST", 0)) if global_rate else None
+        self.slots = {}
+        for name in ROUTE_CLASSES:
+            limit = config.get(f"ADMISSION_MAX_{name.upper()}S", 0)
+            if limit:
+                self.slots[name] = threading.BoundedSemaphore(limit)
+
+    @property
+    def enabled(self):
+        return bool(self.clients or self.bucket or self.slots)
+
+    def client(self):
+        """Identify the client of the current request"""
+        if self.client_header:
+            value = request.headers.get(self.client_header, "")
+            if value:
+                return value.split(",")[0].strip()
+        return request.remote_addr or "unknown"
+
+
+def route_class(name):
+    """Put a handler in a route class other than the one its method implies"""
+    if name not in ROUTE_CLASSES:
+        raise ValueError(f"Unknown route class: {name}")
+
+    def decorator(view):
+        view.admission_class = name
+        return view
+
+    return decorator
+
+
+def _route_class():
+    view = current_app.view_functions.get(request.endpoint)
+    name = getattr(view, "admission_class", None)
+    if name:
+        return name
+    return "read" if request.method in SAFE_METHODS else "write"
+
+
+def _reject(status, message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def _before_request():
+    if request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+    admission = current_app.extensions["admission"]
+
+    if admission.clients:
+        wait = admission.clients.take(admission.client())
+        if wait:
+            return _reject(429, "Too many requests", wait)
+    if admission.bucket:
+        wait = admission.bucket.take()
+        if wait:
+            return _reject(503, "Service is over capacity, retry later", wait)
+
+    name = _route_class()
+    slots = admission.slots.get(name)
+    if slots is not None:
+        if not slots.acquire(blocking=False):
+            return _reject(503, f"Too many {name} requests in progress, retry later", admission.retry_after)
+        g.admission_slots = slots
+    return None
+
+
+def _teardown_request(error=None):
+    # Runs once a streamed body is finished, so a stream holds its slot to the end
+    slots = g.pop("admission_slots", None)
+    if slots is not None:
+        slots.release()
+
+
+def init_app(app):
+    """Check every request of app against the configured limits"""
+    app.extensions["admission"] = admission = Admission(app.config)
+    if admission.enabled:
+        app.before_request(_before_request)
+        app.teardown_request(_teardown_request)
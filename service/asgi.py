@@ -0,0 +1,517 @@
+"""ASGI Application
+
+An asyncio variant of the account routes, for serving many slow or idle
+clients from a handful of processes. It uses SQLAlchemy's async engine
+(aiosqlite or asyncpg) with the same Account model, query builders,
+validation and serialization as the Flask blueprint, so both apps can run
+side by side against one database and return the same documents.
+
+Run it under uvicorn:
+
+    uvicorn --factory service.asgi:create_asgi_app --host 0.0.0.0 --port 8080
+
+Served routes:
+    GET    /health
+    GET    /accounts                 filters, keyset pages, NDJSON stream
+    POST   /accounts                 including ?on_conflict=update and Idempotency-Key
+    GET    /accounts/<id>
+    PUT    /accounts/<id>
+    PATCH  /accounts/<id>
+    DELETE /accounts/<id>
+
+Bulk operations, search and cache statistics stay on the WSGI app.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from service import database, db, idempotency, json_provider, routes
+from service.cache import make_cache, MemoryBackend, NullBackend
+from service.models import Account
+
+logger = logging.getLogger(__name__)
+
+# Largest request body read into memory
+MAX_BODY_SIZE = 1024 * 1024
+
+JSON_MIMETYPE = "application/json"
+
+
+class HTTPError(Exception):
+    """Raised by a handler to answer with a JSON error document"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def dumps(payload):
+    """Encode a document to bytes the way Flask's jsonify does"""
+    data = json_provider.fast_dumps(payload)
+    if data is None or not data.isascii():
+        data = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return data + b"\n"
+
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need"""
+
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.root_path = scope.get("root_path", "")
+        self.query_string = scope.get("query_string", b"")
+        self.body = body
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+        self.args = {}
+        for key, value in parse_qsl(scope.get("query_string", b"").decode(), keep_blank_values=True):
+            # Like request.args.get(), the first value of a repeated key wins
+            self.args.setdefault(key, value)
+
+    def get_json(self):
+        """Return the decoded JSON body, or None if it is missing or invalid"""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+    def if_none_match(self, etag):
+        """Return True if If-None-Match lists etag (weak comparison)"""
+        header = self.headers.get("if-none-match")
+        if not header:
+            return False
+        for tag in header.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/").strip('"') == etag:
+                return True
+        return False
+
+    def wants_stream(self):
+        """Return True if the client asked for a streamed NDJSON list"""
+        if self.args.get("stream", "").lower() in ("1", "true"):
+            return True
+        # JSON stays the default whenever the client accepts both
+        accept = self.headers.get("accept", "")
+        return routes.NDJSON_MIMETYPE in accept and JSON_MIMETYPE not in accept
+
+
+class Response:
+    """A complete response sent in one body message"""
+
+    def __init__(self, body=b"", status=200, headers=None, mimetype=JSON_MIMETYPE):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.headers = dict(headers or {})
+        if mimetype and self.body:
+            self.headers["content-type"] = mimetype
+
+    @classmethod
+    def json(cls, payload, status=200, etag=None, headers=None):
+        """Build a JSON response, optionally carrying an ETag"""
+        headers = dict(headers or {})
+        if etag:
+            headers["etag"] = f'"{etag}"'
+        return cls(dumps(payload), status, headers)
+
+    def raw_headers(self):
+        """Return the headers as the list of byte pairs ASGI expects"""
+        return [(name.encode("latin-1"), value.encode("latin-1")) for name, value in self.headers.items()]
+
+    async def __call__(self, send):
+        self.headers["content-length"] = str(len(self.body))
+        await send({"type": "http.response.start", "status": self.status, "headers": self.raw_headers()})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class StreamingResponse(Response):
+    """A response whose body is produced by an async iterator of chunks"""
+
+    def __init__(self, chunks, status=200, mimetype=JSON_MIMETYPE):
+        super().__init__(status=status, headers={"content-type": mimetype}, mimetype=None)
+        self.chunks = chunks
+
+    async def __call__(self, send):
+        await send({"type": "http.response.start", "status": self.status, "headers": self.raw_headers()})
+        try:
+            async for chunk in self.chunks:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            # Release the database connection even if the client went away
+            await self.chunks.aclose()
+        await send({"type": "http.response.body", "body": b""})
+
+
+class AccountsASGI:
+    """ASGI callable serving the account routes with an async engine"""
+
+    def __init__(self, config):
+        self.config = config
+        self.engine = create_async_engine(
+            database.async_database_uri(config["SQLALCHEMY_DATABASE_URI"]),
+            **database.async_engine_options(config),
+        )
+        database.track_engine(self.engine.sync_engine)
+        database.apply_sqlite_pragmas(self.engine.sync_engine, config.get("SQLITE_PRAGMAS"))
+        # Rows stay readable after commit, so serializing never triggers a reload
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.cache = make_cache(config, logger)
+        self.idempotency = idempotency.make_store(config, logger)
+        self.routes = [
+            ("GET", re.compile(r"/health"), self.health),
+            ("GET", re.compile(r"/accounts"), self.list_accounts),
+            ("POST", re.compile(r"/accounts"), self.create_account),
+            ("GET", re.compile(r"/accounts/(\d+)"), self.read_account),
+            ("PUT", re.compile(r"/accounts/(\d+)"), self.update_account),
+            ("PATCH", re.compile(r"/accounts/(\d+)"), self.patch_account),
+            ("DELETE", re.compile(r"/accounts/(\d+)"), self.delete_account),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            response = await self.dispatch(scope, receive)
+            await response(send)
+
+    async def lifespan(self, receive, send):
+        """Close the pool on shutdown
+
+        Startup does no database work: the schema comes from flask db-create.
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def create_all(self):
+        """Create the database tables, the async counterpart of flask db-create"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(db.metadata.create_all)
+
+    async def dispatch(self, scope, receive):
+        """Route a request to its handler and turn errors into JSON responses"""
+        methods = set()
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(scope["path"])
+            if match is None:
+                continue
+            methods.add(method)
+            if method != scope["method"]:
+                continue
+            try:
+                request = Request(scope, await self.read_body(receive))
+                return await handler(request, *(int(arg) for arg in match.groups()))
+            except HTTPError as e:
+                return Response.json({"error": e.message}, e.status)
+            except Exception as e:
+                logger.error(f"Error handling {scope['method']} {scope['path']}: {e}")
+                return Response.json({"error": "Internal server error"}, 500)
+
+        if methods:
+            return Response(
+                dumps({"error": "Method not allowed"}), 405, {"allow": ", ".join(sorted(methods))}
+            )
+        return Response.json({"error": "Not found"}, 404)
+
+    @staticmethod
+    async def read_body(receive):
+        """Read the whole request body, refusing anything over MAX_BODY_SIZE"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_SIZE:
+                raise HTTPError(413, "Request body too large")
+            if not message.get("more_body", False):
+                break
+        return bytes(body)
+
+    @staticmethod
+    async def backend_call(owner, method, *args):
+        """Call the cache or idempotency store without blocking the event loop on network backends"""
+        call = getattr(owner, method)
+        if isinstance(owner.backend, (MemoryBackend, NullBackend)):
+            return call(*args)
+        return await asyncio.to_thread(call, *args)
+
+    async def cache_call(self, method, *args):
+        """Call the account cache"""
+        return await self.backend_call(self.cache, method, *args)
+
+    async def idempotent(self, request, handler):
+        """Run handler once per Idempotency-Key, replaying its response to retries
+
+        The asyncio counterpart of service.idempotency.idempotent, sharing
+        its store settings, messages and fingerprint.
+        """
+        key = request.headers.get(idempotency.HEADER.lower())
+        if key is None:
+            return await handler(request)
+        try:
+            idempotency.check_key(key)
+        except ValueError as e:
+            raise HTTPError(400, str(e)) from None
+
+        store = self.idempotency
+        key = idempotency.store_key(request.method, request.path, key)
+        digest = idempotency.fingerprint(request.method, request.path, request.query_string, request.body)
+        deadline = time.monotonic() + store.wait
+        while not await self.backend_call(store, "claim", key, digest):
+            entry = await self.backend_call(store, "get", key)
+            if entry is None:
+                # Released or expired since the claim failed: try again
+                continue
+            if entry["fingerprint"] != digest:
+                raise HTTPError(422, idempotency.KEY_REUSED)
+            if "status" in entry:
+                response = Response(entry["body"], entry["status"], mimetype=entry["mimetype"])
+                response.headers[idempotency.REPLAYED_HEADER.lower()] = "true"
+                return response
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return Response.json({"error": idempotency.IN_PROGRESS}, 409, headers={"retry-after": "1"})
+            await asyncio.sleep(min(idempotency.POLL_INTERVAL, remaining))
+
+        try:
+            response = await handler(request)
+        except HTTPError as e:
+            response = Response.json({"error": e.message}, e.status)
+        except Exception:
+            await self.backend_call(store, "release", key)
+            raise
+        if response.status >= 500:
+            await self.backend_call(store, "release", key)
+        else:
+            mimetype = response.headers.get("content-type", JSON_MIMETYPE)
+            await self.backend_call(store, "complete", key, digest, response.status, mimetype, response.body.decode())
+        return response
+
+    @staticmethod
+    def not_found(account_id):
+        """Build the error raised for a missing account"""
+        return HTTPError(404, f"Account with id {account_id} not found")
+
+    @staticmethod
+    def integrity_error(error):
+        """Build the error raised for a write rejected by a constraint"""
+        if Account.is_duplicate_email(error):
+            return HTTPError(400, routes.DUPLICATE_EMAIL)
+        return HTTPError(400, "Account data violates a database constraint")
+
+    ######################################################################
+    # Handlers
+    ######################################################################
+
+    async def health(self, request):
+        """Health check endpoint"""
+        return Response.json({"status": "healthy"})
+
+    async def list_accounts(self, request):
+        """List accounts, optionally filtered, one page at a time when limit/after are given"""
+        try:
+            filters = routes._parse_filters(request.args)
+            fields = routes._parse_fields(request.args.get("fields"))
+            paged = "limit" in request.args or "after" in request.args
+            limit = routes._parse_limit(request.args.get("limit")) if paged else None
+            after = routes._decode_cursor(request.args.get("after"))
+        except ValueError as e:
+            raise HTTPError(400, str(e)) from None
+
+        if request.wants_stream():
+            return StreamingResponse(self.stream_accounts(filters, fields), mimetype=routes.NDJSON_MIMETYPE)
+
+        # Fetch one extra row to find out whether there is a next page
+        window = limit + 1 if paged else None
+        async with self.sessions() as session:
+            rows = (await session.execute(Account.collection_etag_stmt(after, window, filters))).all()
+            etag = routes._fields_etag(Account.make_collection_etag(rows, after, window, filters), fields)
+            if request.if_none_match(etag):
+                return Response(status=304, headers={"etag": f'"{etag}"'})
+            columns = Account.serialized_columns(fields)
+            stmt = Account.build_query(*columns, filters=filters, after=after, limit=window)
+            rows = (await session.execute(stmt)).all()
+
+        response = Response.json([Account.serialize_row(row, fields) for row in rows[:limit]], etag=etag)
+        if paged and len(rows) > limit:
+            params = {"limit": limit, "after": routes._encode_cursor(rows[limit - 1].id)}
+            params.update(
+                (key, request.args[key]) for key in Account.FILTERS + ("fields",) if key in request.args
+            )
+            response.headers["link"] = f'<{request.root_path}/accounts?{urlencode(params)}>; rel="next"'
+        return response
+
+    async def stream_accounts(self, filters, fields=None):
+        """Yield every matching account as NDJSON, one batch of rows per chunk"""
+        stmt = Account.build_query(*Account.serialized_columns(fields), filters=filters)
+        stmt = stmt.execution_options(yield_per=routes.STREAM_BATCH_SIZE)
+        async with self.sessions() as session:
+            result = await session.stream(stmt)
+            async for batch in result.partitions():
+                # Same line format as the WSGI stream, which uses json.dumps defaults
+                yield "".join(
+                    json.dumps(Account.serialize_row(row, fields), sort_keys=True) + "\n" for row in batch
+                ).encode()
+
+    async def create_account(self, request):
+        """Create a new account, replaying the first response to a retried Idempotency-Key"""
+        return await self.idempotent(request, self.create)
+
+    async def create(self, request):
+        """Create a new account, or update the one with its email when ?on_conflict=update"""
+        data = request.get_json()
+        if not data:
+            raise HTTPError(400, "No data provided")
+        on_conflict = request.args.get("on_conflict", "error")
+        if on_conflict not in ("error", "update"):
+            raise HTTPError(400, "on_conflict must be 'error' or 'update'")
+        unsupported = Account.upsert_unsupported(self.engine.dialect.name) if on_conflict == "update" else None
+        if unsupported:
+            raise HTTPError(400, unsupported)
+
+        account = Account()
+        try:
+            account.deserialize(data)
+        except ValueError as e:
+            raise HTTPError(400, str(e)) from None
+
+        async with self.sessions() as session:
+            try:
+                if on_conflict == "update":
+                    stmt = Account.upsert_stmt(account.writable_values(), self.engine.dialect.name)
+                    account = (await session.scalars(stmt)).one()
+                    status = 200
+                else:
+                    session.add(account)
+                    await session.flush()
+                    status = 201
+                payload = account.serialize()
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                raise self.integrity_error(e) from None
+
+        if on_conflict == "update":
+            await self.cache_call("invalidate", payload["id"])
+        return Response.json(payload, status)
+
+    async def read_account(self, request, account_id):
+        """Read an account by id, answering a matching If-None-Match with 304"""
+        try:
+            fields = routes._parse_fields(request.args.get("fields"))
+        except ValueError as e:
+            raise HTTPError(400, str(e)) from None
+
+        # A cached entry is confirmed with a version lookup first: another
+        # process may have written the account without invalidating this cache
+        cached = await self.cache_call("get", account_id)
+        entry = None
+        if cached is not None:
+            async with self.sessions() as session:
+                version = await session.scalar(Account.version_stmt(account_id))
+            if version is None:
+                raise self.not_found(account_id)
+            entry = Account.fresh_entry(cached, Account.make_etag(account_id, version))
+        if entry is None:
+            async with self.sessions() as session:
+                row = (await session.execute(Account.entry_stmt(account_id))).one_or_none()
+            if row is None:
+                raise self.not_found(account_id)
+            entry = Account.make_entry(row)
+            if cached is not None:
+                await self.cache_call("discard", account_id)
+            await self.cache_call("set", account_id, entry)
+
+        etag = routes._fields_etag(entry["etag"], fields)
+        if request.if_none_match(etag):
+            return Response(status=304, headers={"etag": f'"{etag}"'})
+        data = entry["data"]
+        if fields is not None:
+            data = {field: data[field] for field in fields}
+        return Response.json(data, etag=etag)
+
+    async def update_account(self, request, account_id):
+        """Replace the writable fields of an existing account"""
+        async with self.sessions() as session:
+            account = await session.scalar(
+                db.select(Account).where(Account.id == account_id, Account.live())
+            )
+            if account is None:
+                raise self.not_found(account_id)
+
+            data = request.get_json()
+            if not data:
+                raise HTTPError(400, "No data provided")
+            try:
+                account.deserialize(data)
+            except ValueError as e:
+                raise HTTPError(400, str(e)) from None
+
+            try:
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                raise self.integrity_error(e) from None
+
+        await self.cache_call("invalidate", account_id)
+        return Response.json(account.serialize())
+
+    async def patch_account(self, request, account_id):
+        """Partially update an account with a single UPDATE statement"""
+        try:
+            changes = routes._validate_changes(request.get_json())
+        except ValueError as e:
+            raise HTTPError(400, str(e)) from None
+
+        async with self.sessions() as session:
+            try:
+                account = (await session.scalars(Account.patch_stmt(account_id, changes))).one_or_none()
+                if account is not None:
+                    payload, etag = account.serialize(), account.etag
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                raise self.integrity_error(e) from None
+
+        if account is None:
+            raise self.not_found(account_id)
+        await self.cache_call("invalidate", account_id)
+        return Response.json(payload, etag=etag)
+
+    async def delete_account(self, request, account_id):
+        """Delete an account with a single statement, answering 204 either way"""
+        stmt = Account.delete_stmt(self.config.get("ACCOUNT_SOFT_DELETE", False))
+        stmt = stmt.where(Account.id == account_id, Account.live())
+        async with self.sessions() as session:
+            await session.execute(stmt.execution_options(synchronize_session=False))
+            await session.commit()
+        await self.cache_call("invalidate", account_id)
+        return Response(status=204)
+
+
+def create_asgi_app(test_config=None):
+    """Create the ASGI application
+
+    Reads the same environment settings as create_app(), and test_config
+    overrides them in the same way.
+    """
+    config = database.settings_from_env()
+    if test_config:
+        config.update(test_config)
+    return AccountsASGI(config)
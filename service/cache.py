@@ -0,0 +1,406 @@
+"""Account Cache
+
+A read-through cache for serialized accounts. Entries are kept in a
+pluggable backend: a bounded in-process LRU with a TTL by default, or any
+server that speaks the Redis protocol when several workers should share
+one cache.
+
+A fill reads the database and then stores the row, so a write can land
+in between. Invalidating therefore leaves a short-lived tombstone rather
+than deleting the entry, and fills only store into a free slot: a row
+read before the write can no longer overwrite the invalidation.
+
+Invalidations only reach the cache they are sent to, and the memory
+backend is private to one process. Readers therefore check every entry
+against the row version (one primary key lookup) before serving it, so
+several workers, or the WSGI and ASGI apps side by side, never serve a
+row another process has since written.
+
+Configuration (all optional):
+    ACCOUNT_CACHE_BACKEND        "memory" (default), "redis" or "none"
+    ACCOUNT_CACHE_SIZE           maximum entries kept by the memory backend
+    ACCOUNT_CACHE_TTL            seconds an entry stays valid
+    ACCOUNT_CACHE_REPLICA_TTL    seconds an entry read from a read replica
+                                 stays valid, which bounds replica lag
+    ACCOUNT_CACHE_TOMBSTONE_TTL  seconds a written account is kept out of
+                                 the cache; longer than the slowest fill
+    ACCOUNT_CACHE_URL            redis://host:port/db for the redis backend
+"""
+
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from flask import current_app
+
+DEFAULT_SIZE = 10000
+DEFAULT_TTL = 60
+DEFAULT_TOMBSTONE_TTL = 5
+DEFAULT_REPLICA_TTL = 10
+
+# Stored by invalidate(); read back as a miss, and blocks fills until it expires
+TOMBSTONE = {"tombstone": True}
+# Key of the tombstone left by clear(), which blocks every fill
+CLEARED_KEY = "cleared"
+
+
+class CacheError(Exception):
+    """Raised when a cache backend cannot be reached or fails"""
+
+
+class CacheBackend:
+    """Interface every cache backend implements"""
+
+    def get(self, key):
+        """Return the value stored under key, or None"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds"""
+        raise NotImplementedError
+
+    def add(self, key, value, ttl):
+        """Store value under key for ttl seconds unless the key is taken; return True if stored"""
+        raise NotImplementedError
+
+    def set_many(self, keys, value, ttl):
+        """Store the same value under every key for ttl seconds"""
+        for key in keys:
+            self.set(key, value, ttl)
+
+    def delete(self, *keys):
+        """Remove keys from the cache"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every entry from the cache"""
+        raise NotImplementedError
+
+    @property
+    def evictions(self):
+        """Number of entries dropped because of size or age"""
+        return 0
+
+
+class NullBackend(CacheBackend):
+    """Backend that stores nothing, used to switch caching off"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def add(self, key, value, ttl):
+        return True
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Bounded in-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_size=DEFAULT_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend(CacheBackend):
+    """Cache backend for any server that speaks the Redis protocol (RESP)
+
+    Values are stored as JSON under a key prefix. Each thread keeps its
+    own connection, which is reopened after a failure.
+    """
+
+    def __init__(self, url, prefix="accounts:", timeout=0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.database = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            if self.password:
+                self._command("AUTH", self.password)
+            if self.database:
+                self._command("SELECT", self.database)
+        return conn
+
+    def _disconnect(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def _command(self, *args):
+        """Send one command and return its decoded reply"""
+        return self._pipeline([args])[0]
+
+    def _pipeline(self, commands):
+        """Send several commands in one round trip and return their replies"""
+        parts = []
+        for args in commands:
+            parts.append(f"*{len(args)}\r\n".encode())
+            for arg in args:
+                data = arg if isinstance(arg, bytes) else str(arg).encode()
+                parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        try:
+            sock, reader = self._connection()
+            sock.sendall(b"".join(parts))
+            replies = []
+            for _ in commands:
+                try:
+                    replies.append(self._read_reply(reader))
+                except CacheError as error:
+                    # Keep reading so the connection stays in step
+                    replies.append(error)
+        except OSError as error:
+            self._disconnect()
+            raise CacheError(f"Redis connection failed: {error}") from error
+        for reply in replies:
+            if isinstance(reply, CacheError):
+                raise reply
+        return replies
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise OSError("connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise CacheError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise CacheError(f"Unexpected reply from server: {line!r}")
+
+    def get(self, key):
+        data = self._command("GET", f"{self.prefix}{key}")
+        return None if data is None else json.loads(data)
+
+    def set(self, key, value, ttl):
+        self._command("SET", f"{self.prefix}{key}", json.dumps(value), "PX", int(ttl * 1000))
+
+    def add(self, key, value, ttl):
+        reply = self._command("SET", f"{self.prefix}{key}", json.dumps(value), "PX", int(ttl * 1000), "NX")
+        return reply == "OK"
+
+    def set_many(self, keys, value, ttl):
+        if keys:
+            data, milliseconds = json.dumps(value), int(ttl * 1000)
+            self._pipeline([("SET", f"{self.prefix}{key}", data, "PX", milliseconds) for key in keys])
+
+    def delete(self, *keys):
+        if keys:
+            self._command("DEL", *(f"{self.prefix}{key}" for key in keys))
+
+    def clear(self):
+        cursor = "0"
+        while True:
+            cursor, keys = self._command("SCAN", cursor, "MATCH", f"{self.prefix}*", "COUNT", 1000)
+            if keys:
+                self._command("DEL", *keys)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else str(cursor)
+            if cursor == "0":
+                break
+
+
+class AccountCache:
+    """Read-through cache of serialized accounts keyed by account id
+
+    Backend failures are logged and treated as misses, so an unreachable
+    cache server slows the service down instead of breaking it.
+    """
+
+    def __init__(
+        self, backend, ttl=DEFAULT_TTL, logger=None, tombstone_ttl=DEFAULT_TOMBSTONE_TTL,
+        replica_ttl=DEFAULT_REPLICA_TTL,
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.replica_ttl = min(ttl, replica_ttl)
+        self.logger = logger
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _failed(self, error):
+        with self._lock:
+            self.errors += 1
+        if self.logger:
+            self.logger.warning(f"Account cache unavailable: {error}")
+
+    def get(self, account_id):
+        """Return the cached account dict, or None on a miss"""
+        try:
+            value = self.backend.get(account_id)
+        except CacheError as error:
+            self._failed(error)
+            value = None
+        if value == TOMBSTONE:
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, account_id, value, ttl=None):
+        """Cache an account read from the database
+
+        Nothing is stored while the account (or the whole cache) carries a
+        tombstone, since the row may predate the write that left it.
+        Returns True if the entry was stored.
+        """
+        try:
+            if self.backend.get(CLEARED_KEY) is not None:
+                return False
+            return self.backend.add(account_id, value, self.ttl if ttl is None else ttl)
+        except CacheError as error:
+            self._failed(error)
+            return False
+
+    def discard(self, account_id):
+        """Drop an entry found to be outdated so a fresh one can be stored"""
+        try:
+            self.backend.delete(account_id)
+        except CacheError as error:
+            self._failed(error)
+
+    def invalidate(self, *account_ids):
+        """Replace the given accounts with tombstones after they were written"""
+        try:
+            self.backend.set_many(account_ids, TOMBSTONE, self.tombstone_ttl)
+        except CacheError as error:
+            self._failed(error)
+
+    def clear(self):
+        """Drop every cached account and block fills for the tombstone TTL"""
+        try:
+            self.backend.clear()
+            self.backend.set(CLEARED_KEY, TOMBSTONE, self.tombstone_ttl)
+        except CacheError as error:
+            self._failed(error)
+
+    def stats(self):
+        """Return the hit/miss/eviction counters"""
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "errors": self.errors,
+        }
+
+
+def make_backend(config, setting="ACCOUNT_CACHE", prefix="accounts:"):
+    """Build the cache backend selected by the {setting}_* app configuration"""
+    name = config.get(f"{setting}_BACKEND", "memory")
+    if name == "memory":
+        return MemoryBackend(config.get(f"{setting}_SIZE", DEFAULT_SIZE))
+    if name == "redis":
+        return RedisBackend(config.get(f"{setting}_URL", "redis://localhost:6379/0"), prefix=prefix)
+    if name == "none":
+        return NullBackend()
+    raise ValueError(f"Unknown {setting}_BACKEND: {name}")
+
+
+def make_cache(config, logger=None):
+    """Build the account cache described by the app configuration"""
+    return AccountCache(
+        make_backend(config),
+        ttl=config.get("ACCOUNT_CACHE_TTL", DEFAULT_TTL),
+        logger=logger,
+        tombstone_ttl=config.get("ACCOUNT_CACHE_TOMBSTONE_TTL", DEFAULT_TOMBSTONE_TTL),
+        replica_ttl=config.get("ACCOUNT_CACHE_REPLICA_TTL", DEFAULT_REPLICA_TTL),
+    )
+
+
+def get_cache():
+    """Return the account cache of the current app, creating it on first use"""
+    cache = current_app.extensions.get("account_cache")
+    if cache is None:
+        cache = make_cache(current_app.config, current_app.logger)
+        cache = current_app.extensions.setdefault("account_cache", cache)
+    return cache
@@ -0,0 +1,50 @@
+"""Management Commands
+
+Registered on every app by create_app():
+
+    flask --app service db-create     # create the tables and search index
+    flask --app service db-optimize   # ANALYZE, VACUUM and optimize
+    flask --app service db-reindex    # rebuild the search index
+
+db-create is the only place the schema is created. Run it once per
+deployment (the Kubernetes manifest does so in an init container), not
+on every worker start.
+"""
+
+import click
+from flask.cli import with_appcontext
+
+from service import database, db
+from service.models import rebuild_search_index
+
+
+@click.command("db-create")
+@with_appcontext
+def db_create():
+    """Create database tables"""
+    db.create_all()
+    click.echo("Database tables created successfully!")
+
+
+@click.command("db-optimize")
+@click.option("--vacuum/--no-vacuum", default=True, help="Also compact the database file")
+@with_appcontext
+def db_optimize(vacuum):
+    """Analyze, vacuum and optimize the database"""
+    for statement in database.optimize(db.engine, vacuum=vacuum):
+        click.echo(f"Ran {statement}")
+    click.echo("Database optimized successfully!")
+
+
+@click.command("db-reindex")
+@with_appcontext
+def db_reindex():
+    """Rebuild the account search index"""
+    rebuild_search_index()
+    click.echo("Search index rebuilt successfully!")
+
+
+def init_app(app):
+    """Add the database commands to the flask CLI of app"""
+    for command in (db_create, db_optimize, db_reindex):
+        app.cli.add_command(command)
@@ -0,0 +1,190 @@
+"""Response Compression
+
+Compresses responses with gzip, or brotli when the Brotli package is
+installed, according to the client's Accept-Encoding header.
+
+Bodies smaller than COMPRESS_MIN_SIZE are sent as they are, since the
+compression framing would outweigh the savings. Streamed responses (the
+NDJSON account list and the export) are compressed as they are produced
+and flushed once every COMPRESS_FLUSH_SIZE bytes of input, so clients
+keep receiving rows without a flush per row: every flush ends the
+current compression block, and one per line made compressed streams two
+to three times larger.
+
+Configuration (all optional):
+    COMPRESS_MIN_SIZE        smallest body in bytes worth compressing
+    COMPRESS_LEVEL           gzip level, 1 (fast) to 9 (small)
+    COMPRESS_BROTLI_QUALITY  brotli quality, 0 (fast) to 11 (small)
+    COMPRESS_MIMETYPES       content types that are compressed
+    COMPRESS_FLUSH_SIZE      bytes of a streamed body compressed between flushes
+"""
+
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+DEFAULT_MIN_SIZE = 500
+DEFAULT_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+DEFAULT_FLUSH_SIZE = 16384
+DEFAULT_MIMETYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/html",
+    "text/plain",
+    "text/csv",
+)
+
+
+class GzipStream:
+    """Incremental gzip encoder"""
+
+    def __init__(self, level):
+        # wbits=31 writes the gzip header and trailer around the deflate stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        """Compress a chunk, returning whatever output is ready"""
+        return self._compressor.compress(data)
+
+    def flush(self):
+        """Return everything compressed so far, so it can be sent right away"""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """Return the end of the stream"""
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliStream:
+    """Incremental brotli encoder"""
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        """Compress a chunk, returning whatever output is ready"""
+        return self._compressor.process(data)
+
+    def flush(self):
+        """Return everything compressed so far, so it can be sent right away"""
+        return self._compressor.flush()
+
+    def finish(self):
+        """Return the end of the stream"""
+        return self._compressor.finish()
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best encoding the client accepts, or None
+
+    brotli wins over gzip when the client rates them equally.
+    """
+    offers = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_quality = None, 0
+    for encoding in offers:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _add_vary(response):
+    """Tell caches that the body depends on Accept-Encoding"""
+    if "accept-encoding" not in {value.lower() for value in response.vary}:
+        response.vary.add("Accept-Encoding")
+
+
+def _weaken_etag(response):
+    """Make a strong ETag weak, since the encoded bytes differ from the original"""
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _compressed_stream(chunks, encoder, flush_size=DEFAULT_FLUSH_SIZE):
+    """Compress an iterable of chunks as it is consumed
+
+    The encoder is flushed once at least flush_size bytes went in since the
+    last flush, rather than after every chunk.
+    """
+    try:
+        pending = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if not chunk:
+                continue
+            data = encoder.compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_size:
+                data += encoder.flush()
+                pending = 0
+            if data:
+                yield data
+        yield encoder.finish()
+    finally:
+        # Closing the original iterable ends stream_with_context and the query behind it
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def response_config():
+    """Read the compression settings of the current app"""
+    config = current_app.config
+    return {
+        "min_size": config.get("COMPRESS_MIN_SIZE", DEFAULT_MIN_SIZE),
+        "level": config.get("COMPRESS_LEVEL", DEFAULT_LEVEL),
+        "brotli_quality": config.get("COMPRESS_BROTLI_QUALITY", DEFAULT_BROTLI_QUALITY),
+        "mimetypes": config.get("COMPRESS_MIMETYPES", DEFAULT_MIMETYPES),
+        "flush_size": config.get("COMPRESS_FLUSH_SIZE", DEFAULT_FLUSH_SIZE),
+    }
+
+
+def compress_response(response):
+    """after_request hook that compresses eligible responses"""
+    config = response_config()
+    if response.mimetype not in config["mimetypes"]:
+        return response
+    _add_vary(response)
+
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if "Content-Encoding" in response.headers or "no-transform" in response.headers.get("Cache-Control", ""):
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if encoding == "br":
+        encoder = BrotliStream(config["brotli_quality"])
+    else:
+        encoder = GzipStream(config["level"])
+
+    if response.is_streamed:
+        response.response = _compressed_stream(response.response, encoder, config["flush_size"])
+        response.direct_passthrough = False
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < config["min_size"]:
+            return response
+        compressed = encoder.compress(data) + encoder.finish()
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+
+    response.headers["Content-Encoding"] = encoding
+    _weaken_etag(response)
+    return response
+
+
+def init_app(app):
+    """Compress the responses of app"""
+    app.after_request(compress_response)
@@ -0,0 +1,213 @@
+"""Database Configuration
+
+Builds the SQLAlchemy connection settings from the environment, so the
+same image can run against the default SQLite file or the PostgreSQL
+service described in deploy/deployment.yaml.
+
+Environment variables (all optional):
+    DATABASE_URI                full SQLAlchemy URI, takes precedence
+    DATABASE_HOST, DATABASE_PORT, DATABASE_NAME,
+    DATABASE_USER, DATABASE_PASSWORD
+                                parts of a PostgreSQL URI
+    DATABASE_POOL_SIZE          connections kept open per worker
+    DATABASE_MAX_OVERFLOW       extra connections allowed under load
+    DATABASE_POOL_TIMEOUT       seconds to wait for a free connection
+    DATABASE_POOL_RECYCLE       seconds before a connection is replaced
+    DATABASE_POOL_PRE_PING      test connections before handing them out
+    DATABASE_STATEMENT_TIMEOUT  PostgreSQL statement timeout in ms (0 = off)
+    DATABASE_REPLICA_URIS       comma separated read replica URIs
+    DATABASE_REPLICA_BALANCE    round_robin or least_connections
+    DATABASE_READ_YOUR_WRITES   seconds reads stay on the primary after a write
+
+See service/replicas.py for how reads are routed to the replicas.
+
+SQLite connections are tuned with the pragmas in SQLITE_PRAGMAS (or the
+SQLITE_PRAGMAS app setting): WAL lets readers run alongside a writer, and
+busy_timeout makes concurrent workers wait for the write lock instead of
+failing.
+"""
+
+import os
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url, URL
+
+DEFAULT_DATABASE_URI = "sqlite:///accounts.db"
+
+# Setting name, parser and default for each pool setting
+POOL_SETTINGS = {
+    "DATABASE_POOL_SIZE": (int, 5),
+    "DATABASE_MAX_OVERFLOW": (int, 10),
+    "DATABASE_POOL_TIMEOUT": (int, 30),
+    "DATABASE_POOL_RECYCLE": (int, 1800),
+    "DATABASE_POOL_PRE_PING": (lambda value: value.lower() in ("1", "true", "yes"), True),
+    "DATABASE_STATEMENT_TIMEOUT": (int, 0),
+}
+
+
+def split_uris(value):
+    """Split a comma separated list of URIs"""
+    return tuple(uri.strip() for uri in value.split(",") if uri.strip())
+
+
+# Setting name, parser and default for the read replica settings
+REPLICA_SETTINGS = {
+    "DATABASE_REPLICA_URIS": (split_uris, ()),
+    "DATABASE_REPLICA_BALANCE": (str, "round_robin"),
+    "DATABASE_READ_YOUR_WRITES": (float, 5),
+}
+
+# Applied to every new SQLite connection, in this order
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -65536,  # negative means KiB, so 64 MiB
+    "mmap_size": 268435456,  # 256 MiB
+    "temp_store": "MEMORY",
+}
+
+# Asyncio drivers used in place of the default sync ones
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+# Engines created by this process, disposed in children after a fork
+_engines = weakref.WeakSet()
+
+
+def database_uri(environ=None):
+    """Return the database URI described by the environment"""
+    environ = os.environ if environ is None else environ
+    uri = environ.get("DATABASE_URI")
+    if uri:
+        # Heroku-style URIs use a scheme SQLAlchemy no longer accepts
+        if uri.startswith("postgres://"):
+            uri = "postgresql://" + uri[len("postgres://"):]
+        return uri
+
+    host = environ.get("DATABASE_HOST")
+    if host:
+        return URL.create(
+            "postgresql",
+            username=environ.get("DATABASE_USER"),
+            password=environ.get("DATABASE_PASSWORD"),
+            host=host,
+            port=int(environ["DATABASE_PORT"]) if environ.get("DATABASE_PORT") else None,
+            database=environ.get("DATABASE_NAME", "accounts"),
+        ).render_as_string(hide_password=False)
+
+    return DEFAULT_DATABASE_URI
+
+
+def settings_from_env(environ=None):
+    """Return the database settings for app.config from the environment"""
+    environ = os.environ if environ is None else environ
+    settings = {"SQLALCHEMY_DATABASE_URI": database_uri(environ)}
+    for name, (parse, default) in {**POOL_SETTINGS, **REPLICA_SETTINGS}.items():
+        value = environ.get(name)
+        settings[name] = default if value in (None, "") else parse(value)
+    return settings
+
+
+def engine_options(config):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from the app configuration"""
+    options = {
+        "pool_pre_ping": config.get("DATABASE_POOL_PRE_PING", True),
+        "pool_recycle": config.get("DATABASE_POOL_RECYCLE", 1800),
+    }
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        # SQLite has no server-side pool to size or statement timeout to set
+        return options
+
+    options["pool_size"] = config.get("DATABASE_POOL_SIZE", 5)
+    options["max_overflow"] = config.get("DATABASE_MAX_OVERFLOW", 10)
+    options["pool_timeout"] = config.get("DATABASE_POOL_TIMEOUT", 30)
+    timeout = config.get("DATABASE_STATEMENT_TIMEOUT", 0)
+    if timeout and url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+def async_database_uri(uri):
+    """Return the URI with its driver swapped for the asyncio equivalent
+
+    Used by the ASGI app: sqlite becomes sqlite+aiosqlite and postgresql
+    becomes postgresql+asyncpg. URIs that already name another driver are
+    returned unchanged.
+    """
+    url = make_url(uri)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    return uri if driver is None else url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def async_engine_options(config):
+    """Build create_async_engine() options from the app configuration"""
+    options = engine_options(config)
+    timeout = config.get("DATABASE_STATEMENT_TIMEOUT", 0)
+    if "connect_args" in options and timeout:
+        # asyncpg takes server settings directly instead of a libpq options string
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(timeout)}}
+    return options
+
+
+def apply_sqlite_pragmas(engine, pragmas=None):
+    """Run the tuning pragmas on every connection an SQLite engine opens"""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    event.listen(engine, "connect", set_pragmas)
+
+
+def optimize(engine, vacuum=True):
+    """Refresh planner statistics and compact the database
+
+    Runs outside a transaction because VACUUM cannot run inside one.
+    Returns the statements that were executed.
+    """
+    if engine.dialect.name == "sqlite":
+        statements = ["ANALYZE", "PRAGMA optimize", "PRAGMA wal_checkpoint(TRUNCATE)"]
+        if vacuum:
+            statements.insert(1, "VACUUM")
+    elif engine.dialect.name == "postgresql":
+        statements = ["VACUUM ANALYZE" if vacuum else "ANALYZE"]
+    else:
+        statements = ["ANALYZE"]
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    return statements
+
+
+def track_engine(engine):
+    """Remember an engine so forked children drop its inherited connections"""
+    _engines.add(engine)
+
+
+def _dispose_after_fork():
+    """Drop pooled connections inherited from the parent process
+
+    With gunicorn --preload the app, and therefore its pools, is created
+    in the master. Sharing those sockets between workers corrupts them, so
+    each child starts with an empty pool. close=False leaves the parent's
+    connections untouched.
+    """
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
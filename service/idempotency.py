@@ -0,0 +1,205 @@
+"""Idempotency Keys
+
+Clients that retry a POST send the same Idempotency-Key header with
+every attempt. The first attempt runs the handler; its status, body and
+content type are kept in a bounded TTL store, and every retry with that
+key gets the stored response back without running the handler, so a
+replay never touches the accounts table.
+
+A retry that arrives while the first attempt is still running waits for
+it (up to IDEMPOTENCY_WAIT seconds, then 409 with Retry-After) instead of
+racing it. Reusing a key for a different request is answered with 422.
+Server errors are not stored, so the next retry runs the handler again.
+
+The Flask routes opt in with @idempotent. The ASGI app runs the same
+protocol on its own store, built by make_store() from the same settings.
+
+Configuration (all optional):
+    IDEMPOTENCY_BACKEND   "memory" (default), "redis" or "none"; use redis
+                          when several workers must see the same keys
+    IDEMPOTENCY_SIZE      maximum keys kept by the memory backend
+    IDEMPOTENCY_URL       redis://host:port/db, defaults to ACCOUNT_CACHE_URL
+    IDEMPOTENCY_TTL       seconds a response is replayed (default one day)
+    IDEMPOTENCY_LOCK_TTL  seconds a key stays claimed by a running request,
+                          which bounds the wait if its worker dies
+    IDEMPOTENCY_WAIT      seconds a retry waits for the running request
+"""
+
+import functools
+import hashlib
+import math
+import time
+
+from flask import current_app, jsonify, make_response, request
+
+from service.cache import CacheError, DEFAULT_SIZE, make_backend
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+KEY_REUSED = f"{HEADER} was already used for a different request"
+IN_PROGRESS = f"A request with this {HEADER} is still in progress"
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_LOCK_TTL = 30
+DEFAULT_WAIT = 10
+
+# Seconds between looks at a key claimed by another request
+POLL_INTERVAL = 0.02
+
+
+class IdempotencyStore:
+    """Responses by idempotency key, on top of a cache backend
+
+    Backend failures are logged and the request runs as if it carried no
+    key, so an unreachable store costs the dedup but not the request.
+    """
+
+    def __init__(self, backend, ttl=DEFAULT_TTL, lock_ttl=DEFAULT_LOCK_TTL, wait=DEFAULT_WAIT, logger=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait = wait
+        self.logger = logger
+
+    def _failed(self, error):
+        if self.logger:
+            self.logger.warning(f"Idempotency store unavailable: {error}")
+
+    def claim(self, key, fingerprint):
+        """Mark key as in flight; return True if no other request holds it"""
+        try:
+            return self.backend.add(key, {"fingerprint": fingerprint}, self.lock_ttl)
+        except CacheError as error:
+            self._failed(error)
+            return True
+
+    def get(self, key):
+        """Return the entry stored under key, or None"""
+        try:
+            return self.backend.get(key)
+        except CacheError as error:
+            self._failed(error)
+            return None
+
+    def complete(self, key, fingerprint, status, mimetype, body):
+        """Store the response of the request that claimed key"""
+        entry = {"fingerprint": fingerprint, "status": status, "mimetype": mimetype, "body": body}
+        try:
+            self.backend.set(key, entry, self.ttl)
+        except CacheError as error:
+            self._failed(error)
+
+    def release(self, key):
+        """Give up a claimed key so the next retry runs the handler"""
+        try:
+            self.backend.delete(key)
+        except CacheError as error:
+            self._failed(error)
+
+
+def make_store(config, logger=None):
+    """Build the idempotency store described by the app configuration"""
+    backend_config = {
+        "IDEMPOTENCY_BACKEND": config.get("IDEMPOTENCY_BACKEND", "memory"),
+        "IDEMPOTENCY_SIZE": config.get("IDEMPOTENCY_SIZE", DEFAULT_SIZE),
+        "IDEMPOTENCY_URL": config.get(
+            "IDEMPOTENCY_URL", config.get("ACCOUNT_CACHE_URL", "redis://localhost:6379/0")
+        ),
+    }
+    return IdempotencyStore(
+        make_backend(backend_config, "IDEMPOTENCY", prefix="idempotency:"),
+        ttl=config.get("IDEMPOTENCY_TTL", DEFAULT_TTL),
+        lock_ttl=config.get("IDEMPOTENCY_LOCK_TTL", DEFAULT_LOCK_TTL),
+        wait=config.get("IDEMPOTENCY_WAIT", DEFAULT_WAIT),
+        logger=logger,
+    )
+
+
+def get_store():
+    """Return the idempotency store of the current app, creating it on first use"""
+    store = current_app.extensions.get("idempotency")
+    if store is None:
+        store = make_store(current_app.config, current_app.logger)
+        store = current_app.extensions.setdefault("idempotency", store)
+    return store
+
+
+def check_key(key):
+    """Raise ValueError unless key is a usable Idempotency-Key value"""
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+
+
+def store_key(method, path, key):
+    """Scope a client's key to the route it was sent to"""
+    return f"{method} {path} {key}"
+
+
+def fingerprint(method, path, query_string, body):
+    """Hash what makes two requests the same: method, path, query and body"""
+    digest = hashlib.sha256()
+    for part in (method, path, query_string, body):
+        digest.update(part if isinstance(part, bytes) else part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _replay(entry):
+    response = current_app.response_class(entry["body"], status=entry["status"], mimetype=entry["mimetype"])
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _conflict(status, message, retry_after=None):
+    response = jsonify({"error": message})
+    response.status_code = status
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response of a request repeated with the same Idempotency-Key"""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        try:
+            check_key(key)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        store = get_store()
+        key = store_key(request.method, request.path, key)
+        digest = fingerprint(request.method, request.path, request.query_string, request.get_data())
+        deadline = time.monotonic() + store.wait
+        while not store.claim(key, digest):
+            entry = store.get(key)
+            if entry is None:
+                # Released or expired since the claim failed: try again
+                continue
+            if entry["fingerprint"] != digest:
+                return _conflict(422, KEY_REUSED)
+            if "status" in entry:
+                return _replay(entry)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return _conflict(409, IN_PROGRESS, 1)
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            store.release(key)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            store.release(key)
+        else:
+            store.complete(key, digest, response.status_code, response.mimetype, response.get_data(as_text=True))
+        return response
+
+    return wrapper
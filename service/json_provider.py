@@ -0,0 +1,91 @@
+"""JSON Provider
+
+A Flask JSON provider that encodes responses with orjson when it is
+installed, and otherwise behaves exactly like Flask's default provider.
+
+The output matches the default provider byte for byte for everything
+but floats: keys are sorted, separators are compact, and values orjson
+would encode differently are handed to Flask's own encoder instead.
+Dates go through Flask's ``default``. Documents containing non-ASCII
+text are re-encoded with the stdlib so they keep their \\uXXXX escapes.
+Anything orjson rejects, such as integers wider than 64 bits, falls back
+in the same way.
+
+Floats decode to the same values but are not always spelled the same:
+orjson writes exponents without padding or a plus sign (1e-7 and 1e16
+where json.dumps writes 1e-07 and 1e+16), and NaN and infinite floats,
+which json.dumps writes as invalid JSON tokens, are encoded as null.
+Account documents hold no floats, so their output is byte-identical.
+
+Configuration (optional):
+    JSON_PROVIDER  "auto" (default, orjson when installed), "orjson" or "json"
+"""
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that serializes through orjson where it can"""
+
+    def dumps_bytes(self, obj):
+        """Encode obj compactly as UTF-8 bytes"""
+        data = fast_dumps(obj, sort_keys=self.sort_keys, default=self.default)
+        if data is None or (self.ensure_ascii and not data.isascii()):
+            data = super().dumps(obj, separators=(",", ":")).encode()
+        return data
+
+    def dumps(self, obj, **kwargs):
+        """Serialize obj to a str, using orjson when compact output is asked for
+
+        orjson only writes compact JSON, so calls with the stdlib's default
+        separators, or any other option, are left to the stdlib.
+        """
+        if kwargs == {"separators": (",", ":")}:
+            return self.dumps_bytes(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        """Deserialize JSON, using orjson unless decoder options are given"""
+        if kwargs:
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # Let the stdlib raise the error type Flask expects
+            return super().loads(s)
+
+    def response(self, *args, **kwargs):
+        """Build a JSON response without a str round trip"""
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+def fast_dumps(obj, sort_keys=True, default=None):
+    """Encode obj with orjson, or return None if orjson cannot match json.dumps"""
+    if orjson is None:
+        return None
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    try:
+        return orjson.dumps(obj, default=default, option=option)
+    except TypeError:
+        return None
+
+
+def init_app(app):
+    """Install the JSON provider selected by the JSON_PROVIDER setting"""
+    choice = app.config.get("JSON_PROVIDER", "auto")
+    if choice not in ("auto", "orjson", "json"):
+        raise ValueError(f"Unknown JSON_PROVIDER: {choice}")
+    if choice == "orjson" and orjson is None:
+        raise RuntimeError("JSON_PROVIDER is orjson but orjson is not installed")
+    if choice != "json" and orjson is not None:
+        app.json = OrjsonProvider(app)
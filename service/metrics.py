@@ -0,0 +1,122 @@
+"""Prometheus Metrics
+
+Records per-endpoint request counts, status codes, latency histograms and
+in-flight requests, plus database pool checkouts and the time each
+request spends in the database, and serves them at /metrics.
+
+Under gunicorn every worker is a separate process, so the metrics use
+prometheus_client's multiprocess mode: each worker writes its values to
+files in PROMETHEUS_MULTIPROC_DIR and /metrics adds them up. The variable
+must be set before prometheus_client is imported, which gunicorn.conf.py
+takes care of. Without it the metrics cover the current process only.
+"""
+
+import os
+import time
+
+from flask import g, has_request_context, request, Response
+from prometheus_client import (
+    CollectorRegistry, CONTENT_TYPE_LATEST, Counter, Gauge, generate_latest, Histogram, multiprocess, REGISTRY
+)
+from sqlalchemy import event
+
+# Label used for requests that did not match any route
+UNMATCHED_ENDPOINT = "unmatched"
+
+DB_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by endpoint, method and status", ["endpoint", "method", "status"]
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request", ["endpoint", "method"]
+)
+IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled", ["endpoint", "method"], multiprocess_mode="livesum"
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds", "Time a request spent running SQL statements", ["endpoint"],
+    buckets=DB_TIME_BUCKETS,
+)
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool")
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "Connections currently checked out", multiprocess_mode="livesum")
+
+
+def _endpoint():
+    return request.endpoint or UNMATCHED_ENDPOINT
+
+
+def _before_request():
+    if request.endpoint == "metrics":
+        return
+    g.metrics_started = time.perf_counter()
+    g.metrics_db_time = 0.0
+    g.metrics_in_progress = True
+    IN_PROGRESS.labels(_endpoint(), request.method).inc()
+
+
+def _after_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+    endpoint = _endpoint()
+    LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+    REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    DB_TIME.labels(endpoint).observe(g.get("metrics_db_time", 0.0))
+    return response
+
+
+def _teardown_request(error=None):
+    # Runs even when the request failed, and only once a streamed body is finished
+    if g.pop("metrics_in_progress", False):
+        IN_PROGRESS.labels(_endpoint(), request.method).dec()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None and has_request_context() and "metrics_db_time" in g:
+        g.metrics_db_time += time.perf_counter() - started
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKOUTS.inc()
+    POOL_IN_USE.inc()
+
+
+def _checkin(dbapi_connection, connection_record):
+    POOL_IN_USE.dec()
+
+
+def instrument_engine(engine):
+    """Time the statements and count the pool checkouts of an engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.pool, "checkout", _checkout)
+    event.listen(engine.pool, "checkin", _checkin)
+
+
+def registry():
+    """Return the registry to export, merging the worker files in multiprocess mode"""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+    if not directory:
+        return REGISTRY
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged, path=directory)
+    return merged
+
+
+def metrics():
+    """Expose the metrics in the Prometheus text format"""
+    return Response(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Instrument the requests of app and add the /metrics endpoint"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
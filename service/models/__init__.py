@@ -1,5 +1,6 @@
 """Models package"""
 
 from service.models.account import Account
+from service.models.search import rebuild_search_index, search_rows
 
-__all__ = ["Account"]
+__all__ = ["Account", "rebuild_search_index", "search_rows"]
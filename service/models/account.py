@@ -1,22 +1,108 @@
 """Account Model"""
 
+import hashlib
 from datetime import datetime
 
+from flask import current_app
+
 from service import db
+from service.cache import get_cache
+from service.replicas import reading_replicas
 
 
 class Account(db.Model):
     """Account class"""
 
     __tablename__ = "accounts"
+    __table_args__ = (
+        # Partial index over live rows: serves keyset scans and covers the
+        # (id, version) scan behind collection ETags, skipping soft-deleted
+        # rows for free
+        db.Index(
+            "ix_accounts_live_id_version",
+            "id",
+            "version",
+            sqlite_where=db.text("deleted_at IS NULL"),
+            postgresql_where=db.text("deleted_at IS NULL"),
+        ),
+        # Indexes behind the list filters. disabled is matched by equality,
+        # so (disabled, id) also returns its rows in keyset order. name and
+        # date_joined are matched by range, so their rows come out in the
+        # order of that column and are sorted by id afterwards
+        db.Index(
+            "ix_accounts_live_name",
+            "name",
+            sqlite_where=db.text("deleted_at IS NULL"),
+            postgresql_where=db.text("deleted_at IS NULL"),
+        ),
+        db.Index(
+            "ix_accounts_live_disabled_id",
+            "disabled",
+            "id",
+            sqlite_where=db.text("deleted_at IS NULL"),
+            postgresql_where=db.text("deleted_at IS NULL"),
+        ),
+        db.Index(
+            "ix_accounts_live_date_joined_id",
+            "date_joined",
+            "id",
+            sqlite_where=db.text("deleted_at IS NULL"),
+            postgresql_where=db.text("deleted_at IS NULL"),
+        ),
+        # Emails are unique among live accounts only, so a soft-deleted
+        # account does not hold on to its address
+        db.Index(
+            "ix_accounts_live_email",
+            "email",
+            unique=True,
+            sqlite_where=db.text("deleted_at IS NULL"),
+            postgresql_where=db.text("deleted_at IS NULL"),
+        ),
+        # Never hand out the id of a deleted row again: ETags are built from
+        # id and version, so a reused id would match the old account's tags
+        {"sqlite_autoincrement": True},
+    )
+    # Read the bumped version back with RETURNING instead of a second SELECT
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Fields returned by serialize(), in order
+    SERIALIZED_FIELDS = ("id", "name", "email", "phone_number", "address", "disabled", "date_joined")
+
+    # Fields a client may set through deserialize()
+    WRITABLE_FIELDS = ("name", "email", "phone_number", "address", "disabled")
+
+    # JSON type each writable field must have; only name and email may not be null
+    FIELD_TYPES = {"name": str, "email": str, "phone_number": str, "address": str, "disabled": bool}
+
+    # Filters understood by filter_criteria()
+    FILTERS = ("email", "name_prefix", "disabled", "joined_after", "joined_before")
+
+    # Largest number of values bound into a single IN (...) clause
+    IN_CLAUSE_CHUNK = 500
+
+    # Dialects with INSERT ... ON CONFLICT, which upsert() is built on
+    UPSERT_DIALECTS = ("postgresql", "sqlite")
+
+    # Name of the unique email index on PostgreSQL
+    EMAIL_CONSTRAINTS = ("ix_accounts_live_email",)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
-    email = db.Column(db.String(120), nullable=False, unique=True)
+    email = db.Column(db.String(120), nullable=False)
     phone_number = db.Column(db.String(32))
     address = db.Column(db.String(200))  # Added this field
     disabled = db.Column(db.Boolean, default=False)
     date_joined = db.Column(db.DateTime, default=datetime.utcnow)
+    # Row version, bumped by every UPDATE and used for ETags
+    version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=1,
+        server_default="1",
+        onupdate=db.literal_column("version + 1"),
+    )
+    # Set instead of removing the row when ACCOUNT_SOFT_DELETE is enabled
+    deleted_at = db.Column(db.DateTime)
 
     def __repr__(self):
         return f"<Account {self.name}>"
@@ -33,9 +119,51 @@ class Account(db.Model):
             "date_joined": self.date_joined.isoformat() if self.date_joined else None,
         }
 
+    @classmethod
+    def serialized_columns(cls, fields=None):
+        """Return the columns behind serialize(), for read-only row queries
+
+        With a list of fields only those columns are selected, plus id,
+        which always comes first because paging needs it.
+        """
+        if fields is None:
+            return [getattr(cls, field) for field in cls.SERIALIZED_FIELDS]
+        return [cls.id] + [getattr(cls, field) for field in fields if field != "id"]
+
+    @classmethod
+    def serialize_row(cls, row, fields=None):
+        """Serialize a row selected with serialized_columns()
+
+        Produces the same dict as serialize(), restricted to fields when
+        given, without building an ORM instance. Extra columns in the row
+        are ignored.
+        """
+        if fields is None:
+            record = dict(zip(cls.SERIALIZED_FIELDS, row))
+        else:
+            mapping = row._mapping
+            record = {field: mapping[field] for field in fields}
+        if record.get("date_joined") is not None:
+            record["date_joined"] = record["date_joined"].isoformat()
+        return record
+
+    @property
+    def etag(self):
+        """Strong entity tag for the current version of this account"""
+        return self.make_etag(self.id, self.version)
+
+    @staticmethod
+    def make_etag(account_id, version):
+        """Build the entity tag for an account id and row version"""
+        return f"{account_id}-{version}"
+
     def deserialize(self, data):
         """Deserialize from dict"""
         try:
+            for field in ("name", "email"):
+                if data[field] is None:
+                    raise ValueError(f"{field} cannot be null")
+            self.check_types(data)
             self.name = data["name"]
             self.email = data["email"]
             self.phone_number = data.get("phone_number")
@@ -44,21 +172,388 @@ class Account(db.Model):
         except KeyError as error:
             raise ValueError(f"Missing required field: {error}")
 
+    @classmethod
+    def check_types(cls, data):
+        """Raise ValueError if a writable field in data has the wrong JSON type
+
+        The database driver would otherwise reject the value (or quietly
+        convert it) when the statement runs, long after validation.
+        """
+        for field, expected in cls.FIELD_TYPES.items():
+            value = data.get(field)
+            if value is not None and not isinstance(value, expected):
+                raise ValueError(f"{field} must be {'true or false' if expected is bool else 'a string'}")
+
+    @classmethod
+    def is_duplicate_email(cls, error):
+        """Return True if an IntegrityError comes from the unique email constraint
+
+        Other integrity errors (a NULL in a required column, say) are not
+        duplicates and must not be reported as one.
+        """
+        orig = error.orig
+        # psycopg2 reports the constraint in diag, asyncpg on the exception it wraps
+        diag = getattr(orig, "diag", None)
+        constraint = getattr(diag, "constraint_name", None) or getattr(orig.__cause__, "constraint_name", None)
+        if constraint is not None:
+            return constraint in cls.EMAIL_CONSTRAINTS
+        # SQLite only names the columns: "UNIQUE constraint failed: accounts.email"
+        message = str(orig)
+        return message.startswith("UNIQUE constraint failed") and f"{cls.__tablename__}.email" in message
+
+    def writable_values(self):
+        """Return the client-settable columns as a dict for bulk statements"""
+        return {field: getattr(self, field) for field in self.WRITABLE_FIELDS}
+
+    @classmethod
+    def live(cls):
+        """Criterion that excludes soft-deleted accounts"""
+        return cls.deleted_at.is_(None)
+
+    @staticmethod
+    def soft_delete_enabled():
+        """Return True if deletes should only stamp deleted_at"""
+        return current_app.config.get("ACCOUNT_SOFT_DELETE", False)
+
     @classmethod
     def all(cls):
         """Return all accounts"""
-        return cls.query.all()
+        return cls.query.filter(cls.live()).all()
+
+    @classmethod
+    def iter_rows(cls, batch_size=500, filters=None, fields=None):
+        """Yield matching accounts in id order as plain rows for serialize_row()
+
+        The rows are read through a server-side cursor batch_size at a
+        time, so only one batch is held in memory however large the table
+        grows. fields limits the columns read.
+        """
+        stmt = cls.build_query(*cls.serialized_columns(fields), filters=filters)
+        stmt = stmt.execution_options(yield_per=batch_size)
+        yield from db.session.execute(stmt)
+
+    @classmethod
+    def iter_row_batches(cls, batch_size=500, filters=None, fields=None, after=None):
+        """Like iter_rows(), but yield one list of rows per batch fetched
+
+        Rows with an id greater than after are read, so an interrupted
+        scan resumes from the last id it produced.
+        """
+        stmt = cls.build_query(*cls.serialized_columns(fields), filters=filters, after=after)
+        stmt = stmt.execution_options(yield_per=batch_size)
+        yield from db.session.execute(stmt).partitions()
+
+    @classmethod
+    def filter_criteria(cls, filters):
+        """Turn a dict of list filters into WHERE clauses
+
+        Every filter maps onto an indexed column. name_prefix is written as
+        a range (name >= prefix AND name < next prefix) rather than LIKE so
+        that a plain btree index serves it on any backend.
+        """
+        criteria = []
+        if filters.get("email") is not None:
+            criteria.append(cls.email == filters["email"])
+        if filters.get("name_prefix"):
+            prefix = filters["name_prefix"]
+            criteria.append(cls.name >= prefix)
+            if ord(prefix[-1]) < 0x10FFFF:
+                criteria.append(cls.name < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        if filters.get("disabled") is not None:
+            criteria.append(cls.disabled == filters["disabled"])
+        if filters.get("joined_after") is not None:
+            criteria.append(cls.date_joined >= filters["joined_after"])
+        if filters.get("joined_before") is not None:
+            criteria.append(cls.date_joined < filters["joined_before"])
+        return criteria
+
+    @classmethod
+    def build_query(cls, *columns, filters=None, after=None, limit=None):
+        """Compose a SELECT over live accounts in id order
+
+        Combines the list filters with a keyset window (id > after, at most
+        limit rows). page_rows(), iter_rows(), iter_row_batches() and
+        collection_etag() are all built on it.
+        """
+        stmt = db.select(*columns).where(cls.live(), *cls.filter_criteria(filters or {}))
+        if after is not None:
+            stmt = stmt.where(cls.id > after)
+        stmt = stmt.order_by(cls.id)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    @classmethod
+    def page_rows(cls, after=None, limit=100, filters=None, fields=None):
+        """Return up to limit accounts with an id greater than after, as plain rows
+
+        Uses a range scan on the primary key index, so the cost of a page
+        does not depend on how far into the table it starts. The rows skip
+        the ORM identity map and attribute instrumentation, which dominate
+        the cost of listing many accounts. fields limits the columns read.
+        """
+        stmt = cls.build_query(*cls.serialized_columns(fields), filters=filters, after=after, limit=limit)
+        return db.session.execute(stmt).all()
+
+    @classmethod
+    def collection_etag(cls, after=None, limit=None, filters=None):
+        """Return an entity tag for a list of accounts without loading them
+
+        The tag hashes the query (filters and window bounds) with the
+        (id, version) pair of every row in the window, so it changes with
+        the exact set of rows and their versions; aggregates such as a
+        count and sums can coincide for different sets. The pairs are read
+        from the (id, version) index alone.
+        """
+        rows = db.session.execute(cls.collection_etag_stmt(after, limit, filters))
+        return cls.make_collection_etag(rows, after, limit, filters)
+
+    @classmethod
+    def collection_etag_stmt(cls, after=None, limit=None, filters=None):
+        """Build the (id, version) scan behind collection_etag()"""
+        return cls.build_query(cls.id, cls.version, filters=filters, after=after, limit=limit)
+
+    @staticmethod
+    def make_collection_etag(rows, after=None, limit=None, filters=None):
+        """Hash the query and the (id, version) rows into a list entity tag"""
+        query = sorted((filters or {}).items())
+        digest = hashlib.blake2b(f"{query}:{after}:{limit}".encode(), digest_size=8)
+        for account_id, version in rows:
+            digest.update(f";{account_id}-{version}".encode())
+        return digest.hexdigest()
+
+    @classmethod
+    def existing_emails(cls, emails):
+        """Return the subset of emails that already belong to a live account"""
+        emails = list(emails)
+        found = set()
+        for start in range(0, len(emails), cls.IN_CLAUSE_CHUNK):
+            chunk = emails[start:start + cls.IN_CLAUSE_CHUNK]
+            found.update(db.session.scalars(db.select(cls.email).where(cls.email.in_(chunk), cls.live())))
+        return found
+
+    @classmethod
+    def ids_by_email(cls, emails):
+        """Return {email: id} for the live accounts that have one of emails"""
+        emails = list(emails)
+        ids = {}
+        for start in range(0, len(emails), cls.IN_CLAUSE_CHUNK):
+            chunk = emails[start:start + cls.IN_CLAUSE_CHUNK]
+            stmt = db.select(cls.email, cls.id).where(cls.email.in_(chunk), cls.live())
+            ids.update(db.session.execute(stmt).all())
+        return ids
+
+    @classmethod
+    def create_many(cls, records):
+        """Insert many accounts in one transaction and return their new ids
+
+        The rows are sent as one executemany. RETURNING with ordered ids
+        would make SQLAlchemy fall back to one INSERT per row on SQLite, so
+        the ids are read back by email instead, which is unique among live
+        accounts. They come back in the same order as records.
+        """
+        if not records:
+            return []
+        db.session.execute(db.insert(cls), records)
+        ids = cls.ids_by_email(record["email"] for record in records)
+        db.session.commit()
+        return [ids[record["email"]] for record in records]
+
+    @classmethod
+    def upsert(cls, values):
+        """Insert an account, or update the one that already has its email
+
+        Runs as a single INSERT ... ON CONFLICT (email) DO UPDATE ...
+        RETURNING statement. The caller is responsible for committing.
+        """
+        stmt = cls.upsert_stmt(values, db.session.get_bind().dialect.name)
+        return db.session.scalars(stmt).one()
+
+    @classmethod
+    def upsert_unsupported(cls, dialect):
+        """Return why upsert() cannot run on dialect, or None if it can"""
+        if dialect in cls.UPSERT_DIALECTS:
+            return None
+        return f"on_conflict=update is not supported on {dialect}"
+
+    @classmethod
+    def upsert_stmt(cls, values, dialect):
+        """Build the INSERT ... ON CONFLICT statement behind upsert()"""
+        # Only the dialect in use is imported
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            raise ValueError(cls.upsert_unsupported(dialect))
+
+        stmt = insert(cls).values(**values)
+        changes = {field: stmt.excluded[field] for field in values if field != "email"}
+        changes["version"] = cls.version + 1
+        # The conflict target is the partial unique index over live accounts
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.email], index_where=cls.live(), set_=changes
+        )
+        return stmt.returning(cls).execution_options(populate_existing=True)
+
+    @classmethod
+    def patch(cls, account_id, changes):
+        """Apply a partial update with one UPDATE ... RETURNING statement
+
+        Returns the updated account, or None when no row has that id.
+        The caller is responsible for committing.
+        """
+        return db.session.scalars(cls.patch_stmt(account_id, changes)).one_or_none()
+
+    @classmethod
+    def patch_stmt(cls, account_id, changes):
+        """Build the UPDATE ... RETURNING statement behind patch()"""
+        return (
+            db.update(cls)
+            .where(cls.id == account_id, cls.live())
+            .values(**changes)
+            .returning(cls)
+            .execution_options(populate_existing=True)
+        )
+
+    @classmethod
+    def _execute_where(cls, stmt, ids=None, filters=None):
+        """Run a set-based statement against ids and/or filters
+
+        Large id lists are split into IN (...) chunks that all run in one
+        transaction. Returns the number of affected rows.
+        """
+        stmt = stmt.where(cls.live(), *cls.filter_criteria(filters or {}))
+        stmt = stmt.execution_options(synchronize_session=False)
+        if ids is None:
+            count = db.session.execute(stmt).rowcount
+        else:
+            ids = list(ids)
+            count = 0
+            for start in range(0, len(ids), cls.IN_CLAUSE_CHUNK):
+                chunk = ids[start:start + cls.IN_CLAUSE_CHUNK]
+                count += db.session.execute(stmt.where(cls.id.in_(chunk))).rowcount
+        db.session.commit()
+
+        # A filter can match any row, so only an id list allows a targeted invalidation
+        if ids is None:
+            get_cache().clear()
+        else:
+            get_cache().invalidate(*ids)
+        return count
+
+    @classmethod
+    def update_many(cls, values, ids=None, filters=None):
+        """Apply values to the matching accounts with UPDATE ... WHERE"""
+        return cls._execute_where(db.update(cls).values(**values), ids, filters)
+
+    @classmethod
+    def delete_many(cls, ids=None, filters=None):
+        """Remove the matching accounts with DELETE ... WHERE
+
+        In soft-delete mode the rows are stamped with deleted_at instead.
+        """
+        return cls._execute_where(cls.delete_stmt(cls.soft_delete_enabled()), ids, filters)
+
+    @classmethod
+    def delete_stmt(cls, soft=False):
+        """Build an unfiltered DELETE, or the soft-delete UPDATE that replaces it"""
+        if soft:
+            return db.update(cls).values(deleted_at=datetime.utcnow())
+        return db.delete(cls)
+
+    @classmethod
+    def remove(cls, account_id):
+        """Delete an account by id without loading it first
+
+        Issues a single DELETE (or soft-delete UPDATE) and returns the number
+        of rows affected, which is 0 if the account did not exist.
+        """
+        return cls.delete_many(ids=[account_id])
 
     @classmethod
     def find(cls, account_id):
         """Find account by id"""
-        return cls.query.get(account_id)
+        return db.session.scalar(db.select(cls).where(cls.id == account_id, cls.live()))
+
+    @classmethod
+    def find_cached(cls, account_id, etag=None):
+        """Return {"data": ..., "etag": ...} for an account, reading through the cache
+
+        A cached entry is only served after a version lookup confirms it
+        (pass etag when the caller already has it), so a write made by
+        another worker, whose invalidation never reached this process's
+        cache, is never hidden behind a stale entry. A miss skips the
+        lookup, since the row read carries the version.
+
+        In a replica-safe request the row is read from a replica and cached
+        for the shorter replica TTL, marked as such. A client inside its
+        read-your-writes window reads the primary and skips those entries.
+        """
+        cache = get_cache()
+        from_replica = reading_replicas()
+        cached = cache.get(account_id)
+        if cached is not None and etag is None:
+            etag = cls.current_etag(account_id)
+            if etag is None:
+                return None
+        entry = cls.fresh_entry(cached, etag, from_replica)
+        if entry is None:
+            row = db.session.execute(cls.entry_stmt(account_id)).one_or_none()
+            if row is None:
+                return None
+            entry = cls.make_entry(row, from_replica)
+            if cached is not None:
+                # Fills only take a free slot, so drop the outdated entry first
+                cache.discard(account_id)
+            cache.set(account_id, entry, ttl=cache.replica_ttl if from_replica else None)
+        return entry
+
+    @classmethod
+    def entry_stmt(cls, account_id):
+        """Build the SELECT behind a cache entry: the serialized columns and the version"""
+        return db.select(*cls.serialized_columns(), cls.version).where(cls.id == account_id, cls.live())
+
+    @classmethod
+    def make_entry(cls, row, from_replica=False):
+        """Build the cache entry for a row selected with entry_stmt()"""
+        entry = {"data": cls.serialize_row(row), "etag": cls.make_etag(row.id, row.version)}
+        if from_replica:
+            entry["replica"] = True
+        return entry
+
+    @staticmethod
+    def fresh_entry(entry, etag, from_replica=False):
+        """Return a cached entry if it holds the version tagged etag, else None
+
+        An entry read from a replica is only used by requests that may read
+        from replicas themselves.
+        """
+        if entry is None or entry["etag"] != etag or (entry.get("replica") and not from_replica):
+            return None
+        return entry
+
+    @classmethod
+    def version_stmt(cls, account_id):
+        """Build the primary key lookup of an account's row version"""
+        return db.select(cls.version).where(cls.id == account_id, cls.live())
+
+    @classmethod
+    def current_etag(cls, account_id):
+        """Return the entity tag of an account without loading the row
+
+        A primary key lookup of the version column alone, which is
+        answered from the (id, version) index. Returns None if the account
+        does not exist.
+        """
+        version = db.session.scalar(cls.version_stmt(account_id))
+        return None if version is None else cls.make_etag(account_id, version)
 
     def update(self):
         """Update account in database"""
         db.session.commit()
+        get_cache().invalidate(self.id)
 
     def delete(self):
         """Delete account from database"""
-        db.session.delete(self)
-        db.session.commit()
+        self.remove(self.id)
@@ -0,0 +1,151 @@
+"""Account Search Index
+
+Prefix / full-text search over account name and address.
+
+On SQLite the index is an FTS5 table with external content (the accounts
+table itself). On PostgreSQL it is a pg_trgm GIN index on the name and
+address. Both backends match every word of the query on its own: FTS5
+as a prefix query, PostgreSQL with one ILIKE condition per word. In both
+cases the database keeps the index in sync: SQLite through triggers and
+PostgreSQL through the expression index. Every write path is covered,
+including the set-based bulk statements and upserts.
+"""
+
+import re
+
+from sqlalchemy import column, DDL, event, table
+
+from service import db
+from service.models.account import Account
+
+FTS_TABLE = "accounts_fts"
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, address, content='accounts', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON accounts BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, address) VALUES (new.id, new.name, new.address);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON accounts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address)
+        VALUES ('delete', old.id, old.name, old.address);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, address ON accounts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, address)
+        VALUES ('delete', old.id, old.name, old.address);
+        INSERT INTO {FTS_TABLE}(rowid, name, address) VALUES (new.id, new.name, new.address);
+    END""",
+]
+
+# The query below must use exactly this expression for the index to apply
+PG_DOCUMENT = "(name || ' ' || coalesce(address, ''))"
+
+POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_accounts_search_trgm ON accounts "
+    f"USING gin ({PG_DOCUMENT} gin_trgm_ops) WHERE deleted_at IS NULL",
+]
+
+for statement in SQLITE_DDL:
+    event.listen(Account.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRESQL_DDL:
+    event.listen(Account.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(
+    Account.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+
+def _words(text):
+    """Split free text into the words that must all match"""
+    return re.findall(r"\w+", text)
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query that prefix-matches every word"""
+    return " ".join(f'"{word}"*' for word in _words(text))
+
+
+def _like_pattern(text):
+    """Escape LIKE wildcards so the text is matched literally"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_stmt(text, *columns):
+    """Build a ranked SELECT of live accounts matching text
+
+    Returns None when the text contains nothing to search for.
+    """
+    columns = columns or (Account,)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        query = _fts_query(text)
+        if not query:
+            return None
+        return (
+            db.select(*columns)
+            .join(fts, fts.c.rowid == Account.id)
+            .where(db.literal_column(FTS_TABLE).op("MATCH")(query), Account.live())
+            .order_by(fts.c.rank, Account.id)
+        )
+
+    # Like the FTS5 query, every word must match on its own, in any order
+    words = _words(text)
+    if not words:
+        return None
+    if dialect == "postgresql":
+        document = db.literal_column(PG_DOCUMENT)
+        return (
+            db.select(*columns)
+            .where(*[document.ilike(_like_pattern(word), escape="\\") for word in words], Account.live())
+            .order_by(db.func.word_similarity(text.strip(), document).desc(), Account.id)
+        )
+
+    # Other backends have no search index, so fall back to a LIKE scan
+    return (
+        db.select(*columns)
+        .where(
+            *[
+                db.or_(
+                    Account.name.ilike(_like_pattern(word), escape="\\"),
+                    Account.address.ilike(_like_pattern(word), escape="\\"),
+                )
+                for word in words
+            ],
+            Account.live(),
+        )
+        .order_by(Account.id)
+    )
+
+
+def search_rows(text, limit=20, offset=0, fields=None):
+    """Return one page of accounts matching text, best matches first
+
+    The rows are plain rows for Account.serialize_row(); fields limits
+    the columns read.
+    """
+    stmt = search_stmt(text, *Account.serialized_columns(fields))
+    if stmt is None:
+        return []
+    return db.session.execute(stmt.limit(limit).offset(offset)).all()
+
+
+def rebuild_search_index():
+    """Create the search index if needed and refill it from the accounts table
+
+    Needed once for databases created before the index existed.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        for statement in POSTGRESQL_DDL:
+            db.session.execute(db.text(statement))
+    db.session.commit()
@@ -0,0 +1,181 @@
+"""SQL Profiling
+
+SQLAlchemy event hooks that watch the statements each request runs:
+
+- every statement is counted and timed per request; with
+  SQL_PROFILE_HEADERS enabled (or in debug mode) the totals are sent
+  back in X-DB-Queries and X-DB-Time (milliseconds) response headers
+- statements slower than SQL_SLOW_QUERY_MS are logged with the shape of
+  their parameters (types, never values)
+- a statement repeated SQL_REPEAT_THRESHOLD times or more within one
+  request is logged as a possible N+1 query, unless it already works on
+  many rows at once (an executemany, or a chunk of a long IN (...) list)
+
+Logged SQL has long lists of placeholders collapsed to their count.
+
+Headers are set before a streamed body is produced, so for streamed
+responses they only cover the statements run up to that point.
+
+query_budget() is a test helper that fails when a block of code runs more
+statements than allowed.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_QUERY_MS = 200
+DEFAULT_REPEAT_THRESHOLD = 3
+
+# A parenthesized list of more than a few placeholders: ?, %(name)s or $1
+_PLACEHOLDER = r"\s*(?:\?|%\(\w+\)s|\$\d+)\s*"
+_PLACEHOLDER_LIST = re.compile(rf"\((?:{_PLACEHOLDER},){{3,}}{_PLACEHOLDER}\)")
+
+
+class QueryProfile:
+    """Statements run while handling one request"""
+
+    def __init__(self):
+        self.statements = []
+        self.batched = set()
+        self.duration = 0.0
+
+    def record(self, statement, duration, batched=False):
+        """Add a finished statement, noting whether it works on a batch of rows"""
+        self.statements.append(statement)
+        if batched:
+            self.batched.add(statement)
+        self.duration += duration
+
+    def repeated(self, threshold):
+        """Return (statement, count) for statements run at least threshold times
+
+        Batched statements are left out: running one per chunk of a large
+        input is the opposite of an N+1 query.
+        """
+        return [
+            (sql, count)
+            for sql, count in Counter(self.statements).items()
+            if count >= threshold and sql not in self.batched
+        ]
+
+
+def is_batch(context, executemany=False):
+    """Return True for an executemany or a statement with an expanding IN (...) list"""
+    if executemany:
+        return True
+    compiled = getattr(context, "compiled", None)
+    binds = getattr(compiled, "binds", None) or {}
+    return any(bind.expanding for bind in binds.values())
+
+
+def compact_sql(statement):
+    """Collapse long placeholder lists, such as the IN (...) of a chunk, for the log"""
+    return _PLACEHOLDER_LIST.sub(lambda match: f"(... {match.group().count(',') + 1} parameters)", statement)
+
+
+def parameter_shape(parameters, executemany=False):
+    """Describe bound parameters by type only, so no values reach the log"""
+    if executemany:
+        parameters = list(parameters)
+        first = parameter_shape(parameters[0]) if parameters else "[]"
+        return f"{len(parameters)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _log():
+    return current_app.logger if has_app_context() else logger
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profile_started = time.perf_counter()
+
+
+def instrument_engine(engine, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+    """Time every statement of engine, logging the slow ones"""
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profile_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if has_request_context() and "sql_profile" in g:
+            g.sql_profile.record(statement, duration, is_batch(context, executemany))
+        if slow_query_ms is not None and duration * 1000 >= slow_query_ms:
+            _log().warning(
+                f"Slow query ({duration * 1000:.1f} ms): {compact_sql(statement)} "
+                f"parameters {parameter_shape(parameters, executemany)}"
+            )
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def _before_request():
+    g.sql_profile = QueryProfile()
+
+
+def _after_request(response):
+    profile = g.get("sql_profile")
+    if profile is None:
+        return response
+
+    threshold = current_app.config.get("SQL_REPEAT_THRESHOLD", DEFAULT_REPEAT_THRESHOLD)
+    for statement, count in profile.repeated(threshold):
+        current_app.logger.warning(
+            f"Possible N+1 query in {request.method} {request.url_rule or request.path}: "
+            f"run {count} times: {compact_sql(statement)}"
+        )
+
+    if current_app.config.get("SQL_PROFILE_HEADERS", current_app.debug):
+        response.headers["X-DB-Queries"] = str(len(profile.statements))
+        response.headers["X-DB-Time"] = f"{profile.duration * 1000:.3f}"
+    return response
+
+
+def init_app(app):
+    """Profile the statements of every request of app"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+@contextmanager
+def capture_queries(engine):
+    """Collect the SQL text of every statement engine runs inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def query_budget(engine, budget):
+    """Fail with AssertionError if the block runs more than budget statements
+
+    Meant for tests:
+
+        with query_budget(engine, 2):
+            client.get("/accounts?limit=10")
+    """
+    with capture_queries(engine) as statements:
+        yield statements
+    if len(statements) > budget:
+        listing = "\n".join(f"  {statement}" for statement in statements)
+        raise AssertionError(f"{len(statements)} queries exceed the budget of {budget}:\n{listing}")
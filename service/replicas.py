@@ -0,0 +1,167 @@
+"""Read Replicas
+
+Sends the reads of replica-safe GET handlers to read-only replicas of the
+primary database, and everything else to the primary.
+
+Settings (app config, or the environment through settings_from_env):
+    DATABASE_REPLICA_URIS       replica URIs (comma separated in the environment)
+    DATABASE_REPLICA_BALANCE    "round_robin" (default) or "least_connections"
+    DATABASE_READ_YOUR_WRITES   seconds a client keeps reading from the primary
+                                after a write (default 5, 0 turns it off)
+
+Replica engines are built with the same engine options as the primary
+and kept in app.extensions["replicas"], outside Flask-SQLAlchemy's binds
+so the models' metadata stays bound to the primary alone. A statement
+goes to a replica only when all of these hold:
+
+- the handler is decorated with @replica_safe and the request is a GET
+- the client has not written within the read-your-writes window, which
+  is tracked with a cookie set on every successful write request
+- it is a plain SELECT: not FOR UPDATE, not part of a flush, and not
+  marked with the use_primary execution option
+
+Writes, flushes, CLI commands and undecorated handlers always use the
+primary. A request sticks to the replica picked for its first read, so
+its queries see one consistent snapshot. Account cache entries filled
+from a replica are marked and kept for ACCOUNT_CACHE_REPLICA_TTL; reads
+inside the read-your-writes window skip them and go to the primary.
+"""
+
+import functools
+import itertools
+import math
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+
+from service import database
+
+COOKIE_NAME = "db_primary_until"
+DEFAULT_READ_YOUR_WRITES = 5
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def _checked_out(engine):
+    """Connections an engine has handed out, 0 for pools that do not count"""
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return checkedout() if checkedout else 0
+
+
+class RoundRobin:
+    """Takes the replicas in turn"""
+
+    def __init__(self):
+        self._turns = itertools.count()
+
+    def choose(self, engines):
+        return engines[next(self._turns) % len(engines)]
+
+
+class LeastConnections(RoundRobin):
+    """Takes the replica with the fewest connections in use, rotating on ties"""
+
+    def choose(self, engines):
+        start = next(self._turns) % len(engines)
+        rotated = engines[start:] + engines[:start]
+        return min(rotated, key=_checked_out)
+
+
+BALANCERS = {"round_robin": RoundRobin, "least_connections": LeastConnections}
+
+
+class Replicas:
+    """The replica engines of an app and how to pick one"""
+
+    def __init__(self, engines, balance="round_robin", read_your_writes=DEFAULT_READ_YOUR_WRITES):
+        if balance not in BALANCERS:
+            raise ValueError(f"Unknown replica balance: {balance}")
+        self.engines = list(engines)
+        self.balancer = BALANCERS[balance]()
+        self.read_your_writes = read_your_writes
+
+    def choose(self):
+        """Pick the engine of one replica"""
+        return self.balancer.choose(self.engines)
+
+
+class RoutingSession(Session):
+    """Session that sends the plain SELECTs of replica-safe requests to a replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _replica_allowed(clause):
+            if "db_replica" not in g:
+                g.db_replica = current_app.extensions["replicas"].choose()
+            return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reading_replicas():
+    """Return True if the reads of the current request may go to a replica"""
+    return has_request_context() and bool(g.get("db_use_replicas"))
+
+
+def _replica_allowed(clause):
+    if not reading_replicas():
+        return False
+    if not getattr(clause, "is_select", False) or getattr(clause, "_for_update_arg", None) is not None:
+        return False
+    return not clause.get_execution_options().get("use_primary", False)
+
+
+def _wrote_recently():
+    try:
+        return float(request.cookies.get(COOKIE_NAME, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def replica_safe(view):
+    """Let the reads of a GET handler be served by a replica"""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions.get("replicas")
+        if replicas and replicas.engines and request.method in SAFE_METHODS and not _wrote_recently():
+            g.db_use_replicas = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _after_request(response):
+    """Keep a client that just wrote on the primary for the read-your-writes window"""
+    window = current_app.extensions["replicas"].read_your_writes
+    if window and request.method not in SAFE_METHODS and response.status_code < 400:
+        response.set_cookie(
+            COOKIE_NAME, f"{time.time() + window:.3f}", max_age=math.ceil(window), httponly=True, samesite="Lax"
+        )
+    return response
+
+
+def configure(app):
+    """Create an engine for each replica in DATABASE_REPLICA_URIS
+
+    The engines connect on first use. Returns them, so create_app() can
+    instrument them like the primary.
+    """
+    uris = app.config.get("DATABASE_REPLICA_URIS") or ()
+    if isinstance(uris, str):
+        uris = database.split_uris(uris)
+    engines = [
+        create_engine(uri, **database.engine_options(dict(app.config, SQLALCHEMY_DATABASE_URI=uri)))
+        for uri in uris
+    ]
+    app.extensions["replicas"] = Replicas(
+        engines,
+        app.config.get("DATABASE_REPLICA_BALANCE", "round_robin"),
+        app.config.get("DATABASE_READ_YOUR_WRITES", DEFAULT_READ_YOUR_WRITES),
+    )
+    return engines
+
+
+def init_app(app):
+    """Set the read-your-writes cookie when the app has replicas"""
+    if app.extensions["replicas"].engines:
+        app.after_request(_after_request)
@@ -1,54 +1,609 @@
 """Account Routes"""
 
-from flask import abort, Blueprint, jsonify, request
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime
+
+from flask import (
+    abort, Blueprint, current_app, jsonify, request, Response, stream_with_context, url_for
+)
+from sqlalchemy.exc import IntegrityError
+
 from service import db
-from service.models import Account
+from service.cache import get_cache
+from service.models import Account, search_rows
+from service.admission import route_class
+from service.idempotency import idempotent
+from service.replicas import replica_safe
 
 # Create a Blueprint
 accounts_bp = Blueprint('accounts', __name__)
 
+# Page sizes for keyset pagination on GET /accounts
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_SEARCH_SIZE = 20
+MAX_SEARCH_OFFSET = 10000
+
+# Rows fetched per round trip when streaming the account list
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Rows fetched per round trip, and written per chunk, by GET /accounts/export
+EXPORT_BATCH_SIZE = 2000
+EXPORT_MIMETYPES = {"csv": "text/csv", "ndjson": NDJSON_MIMETYPE}
+
+DUPLICATE_EMAIL = "Account with this email already exists"
+
+# Largest batch accepted by POST /accounts/bulk
+MAX_BULK_ITEMS = 50000
+
+
+def _encode_cursor(account_id):
+    """Encode an account id as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(f"id:{account_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """Decode a pagination cursor back into an account id"""
+    if cursor is None:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, _, value = base64.urlsafe_b64decode(padded).decode().partition(":")
+        if prefix != "id":
+            raise ValueError
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor") from None
+
+
+def _wants_stream():
+    """Return True if the client asked for a streamed NDJSON list"""
+    if request.args.get("stream", "").lower() in ("1", "true"):
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def _stream_accounts(filters, fields=None):
+    """Stream every matching account as one JSON document per line
+
+    Each batch of rows fetched is written as one chunk, like the export.
+    """
+    batches = Account.iter_row_batches(batch_size=STREAM_BATCH_SIZE, filters=filters, fields=fields)
+    chunks = _export_ndjson(batches, fields, current_app.json.dumps)
+    return Response(stream_with_context(chunks), mimetype=NDJSON_MIMETYPE)
+
+
+def _not_modified(etag):
+    """Build an empty 304 response carrying the current ETag"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def _parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    """Validate the limit query parameter"""
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer") from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def _parse_offset(value):
+    """Validate the offset query parameter of search"""
+    if value is None:
+        return 0
+    try:
+        offset = int(value)
+    except ValueError:
+        raise ValueError("offset must be a non-negative integer") from None
+    if offset < 0:
+        raise ValueError("offset must be a non-negative integer")
+    if offset > MAX_SEARCH_OFFSET:
+        raise ValueError(f"offset must be at most {MAX_SEARCH_OFFSET}")
+    return offset
+
+
+def _parse_fields(value):
+    """Validate the fields query parameter
+
+    Returns the requested fields in serialization order, or None when the
+    parameter is absent and every field should be returned.
+    """
+    if value is None:
+        return None
+    requested = {field.strip() for field in value.split(",") if field.strip()}
+    if not requested:
+        raise ValueError("fields must name at least one field")
+    unknown = requested - set(Account.SERIALIZED_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field: {', '.join(sorted(unknown))}")
+    return tuple(field for field in Account.SERIALIZED_FIELDS if field in requested)
+
+
+def _fields_etag(etag, fields):
+    """Give each sparse fieldset of a resource its own entity tag"""
+    if fields is None:
+        return etag
+    digest = hashlib.blake2b(",".join(fields).encode(), digest_size=4)
+    return f"{etag}.{digest.hexdigest()}"
+
+
+def _parse_filters(source):
+    """Read the list filters out of query args or a JSON object"""
+    filters = {}
+    for key in ("email", "name_prefix"):
+        if source.get(key) is not None:
+            if not isinstance(source[key], str):
+                raise ValueError(f"{key} must be a string")
+            filters[key] = source[key]
+    if source.get("disabled") is not None:
+        filters["disabled"] = _parse_bool(source["disabled"], "disabled")
+    for key in ("joined_after", "joined_before"):
+        if source.get(key) is not None:
+            try:
+                filters[key] = datetime.fromisoformat(source[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be an ISO 8601 date") from None
+    return filters
+
+
+def _integrity_error(error, duplicate_status=400):
+    """Roll back and answer an IntegrityError
+
+    Only a violation of the unique email constraint is a duplicate; any
+    other constraint failure is reported as invalid data.
+    """
+    db.session.rollback()
+    if Account.is_duplicate_email(error):
+        return jsonify({"error": DUPLICATE_EMAIL}), duplicate_status
+    current_app.logger.warning(f"Account rejected by a database constraint: {error.orig}")
+    return jsonify({"error": "Account data violates a database constraint"}), 400
+
+
 @accounts_bp.route("/accounts", methods=["POST"])
+@idempotent
 def create_account():
-    """Create a new account"""
+    """Create a new account
+
+    Duplicate emails are detected by the unique index on Account.email,
+    so a create costs a single INSERT. With ?on_conflict=update the
+    account that already has the email is updated instead. A retry with
+    the same Idempotency-Key gets the first response back.
+    """
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "No data provided"}), 400
 
-        # Check if account with email already exists
-        existing = Account.query.filter_by(email=data.get("email")).first()
-        if existing:
-            return jsonify({"error": "Account with this email already exists"}), 400
+        on_conflict = request.args.get("on_conflict", "error")
+        if on_conflict not in ("error", "update"):
+            return jsonify({"error": "on_conflict must be 'error' or 'update'"}), 400
+        if on_conflict == "update":
+            unsupported = Account.upsert_unsupported(db.session.get_bind().dialect.name)
+            if unsupported:
+                return jsonify({"error": unsupported}), 400
 
         account = Account()
         account.deserialize(data)
-        db.session.add(account)
+        if on_conflict == "update":
+            account = Account.upsert(account.writable_values())
+            status = 200
+        else:
+            db.session.add(account)
+            db.session.flush()
+            status = 201
+
+        # Serialize before committing so the row is not reloaded afterwards
+        payload = account.serialize()
         db.session.commit()
+        if on_conflict == "update":
+            # A fresh insert has nothing cached; an upsert may have changed a cached account
+            get_cache().invalidate(payload["id"])
 
-        return jsonify(account.serialize()), 201
+        return jsonify(payload), status
 
+    except IntegrityError as e:
+        return _integrity_error(e)
     except ValueError as e:
         # Handle validation errors from deserialize()
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         # Handle any other errors
-        from flask import current_app
+        db.session.rollback()
         current_app.logger.error(f"Error creating account: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+
+def _bulk_items():
+    """Read a bulk request body as a list of items
+
+    Accepts either a JSON array or an NDJSON body with one object per line.
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        try:
+            return [
+                json.loads(line)
+                for line in request.get_data(as_text=True).splitlines()
+                if line.strip()
+            ]
+        except json.JSONDecodeError:
+            raise ValueError("Invalid NDJSON body") from None
+
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValueError("Request body must be a JSON array of accounts")
+    return items
+
+
+@accounts_bp.route("/accounts/bulk", methods=["POST"])
+def bulk_create_accounts():
+    """Create many accounts in a single transaction"""
+    try:
+        items = _bulk_items()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not items:
+        return jsonify({"error": "No data provided"}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({"error": f"At most {MAX_BULK_ITEMS} accounts per request"}), 413
+
+    results = [None] * len(items)
+    pending = {}
+    for index, item in enumerate(items):
+        account = Account()
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Each account must be a JSON object")
+            account.deserialize(item)
+        except ValueError as e:
+            results[index] = {"index": index, "status": 400, "error": str(e)}
+            continue
+        if account.email in pending:
+            results[index] = {"index": index, "status": 400, "error": "Duplicate email in request"}
+            continue
+        pending[account.email] = (index, account.writable_values())
+
+    try:
+        for email in Account.existing_emails(pending):
+            index, _ = pending.pop(email)
+            results[index] = {"index": index, "status": 400, "error": DUPLICATE_EMAIL}
+
+        ids = Account.create_many([values for _, values in pending.values()])
+    except IntegrityError as e:
+        return _integrity_error(e, duplicate_status=409)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error creating accounts in bulk: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    for (index, _), account_id in zip(pending.values(), ids):
+        results[index] = {"index": index, "status": 201, "id": account_id}
+
+    status = 201 if len(ids) == len(items) else 207
+    return jsonify({"created": len(ids), "results": results}), status
+
+
+def _parse_bool(value, name):
+    """Parse a boolean from JSON or a query string"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "1"):
+        return True
+    if isinstance(value, str) and value.lower() in ("false", "0"):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def _validate_changes(changes):
+    """Check a dict of partial updates against the writable fields"""
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError("changes must be a non-empty JSON object")
+    unknown = set(changes) - set(Account.WRITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field: {', '.join(sorted(unknown))}")
+    for field in ("name", "email"):
+        if field in changes and changes[field] is None:
+            raise ValueError(f"{field} cannot be null")
+    Account.check_types(changes)
+    return changes
+
+
+def _bulk_selection(data):
+    """Read the ids or filter that select the rows of a bulk operation"""
+    ids = data.get("ids")
+    filters = data.get("filter")
+    if filters is None and ids is None:
+        filters = _parse_filters(request.args)
+
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ValueError("ids must be a list of integers")
+        if len(ids) > MAX_BULK_ITEMS:
+            raise ValueError(f"At most {MAX_BULK_ITEMS} ids per request")
+    if filters is not None:
+        if not isinstance(filters, dict):
+            raise ValueError("filter must be a JSON object")
+        unknown = set(filters) - set(Account.FILTERS)
+        if unknown:
+            raise ValueError(f"Unsupported filter: {', '.join(sorted(unknown))}")
+        filters = _parse_filters(filters)
+    if not ids and not filters:
+        raise ValueError("Provide ids or a filter to select accounts")
+    return ids, filters
+
+
+@accounts_bp.route("/accounts/bulk", methods=["PATCH"])
+def bulk_update_accounts():
+    """Update many accounts with one set-based UPDATE"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "No data provided"}), 400
+
+    try:
+        ids, filters = _bulk_selection(data)
+        changes = _validate_changes(data.get("changes"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        updated = Account.update_many(changes, ids=ids, filters=filters)
+    except IntegrityError as e:
+        return _integrity_error(e)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error updating accounts in bulk: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    return jsonify({"updated": updated}), 200
+
+
+@accounts_bp.route("/accounts/bulk", methods=["DELETE"])
+def bulk_delete_accounts():
+    """Delete many accounts with one set-based DELETE"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+
+    try:
+        ids, filters = _bulk_selection(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        deleted = Account.delete_many(ids=ids, filters=filters)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error deleting accounts in bulk: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    return jsonify({"deleted": deleted}), 200
+
+
 @accounts_bp.route("/accounts", methods=["GET"])
+@replica_safe
+@route_class("list")
 def list_accounts():
-    """List all accounts"""
-    accounts = Account.all()
-    return jsonify([account.serialize() for account in accounts]), 200
+    """List accounts, optionally filtered, one page at a time when limit/after are given
+
+    Supported filters: email, name_prefix, disabled, joined_after and
+    joined_before (ISO 8601). Each one is served by an index. fields (a
+    comma-separated list) limits both the columns read and the fields
+    returned.
+    """
+    try:
+        filters = _parse_filters(request.args)
+        fields = _parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if _wants_stream():
+        return _stream_accounts(filters, fields)
+
+    paged = "limit" in request.args or "after" in request.args
+    try:
+        limit = _parse_limit(request.args.get("limit")) if paged else None
+        after = _decode_cursor(request.args.get("after"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # The tag covers the extra row fetched below, so a new next page changes it too
+    etag = Account.collection_etag(
+        after=after, limit=limit + 1 if paged else None, filters=filters
+    )
+    etag = _fields_etag(etag, fields)
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+
+    if not paged:
+        rows = Account.page_rows(limit=None, filters=filters, fields=fields)
+        response = jsonify([Account.serialize_row(row, fields) for row in rows])
+        response.set_etag(etag)
+        return response, 200
+
+    # Fetch one extra row to find out whether there is a next page
+    rows = Account.page_rows(after=after, limit=limit + 1, filters=filters, fields=fields)
+    response = jsonify([Account.serialize_row(row, fields) for row in rows[:limit]])
+    response.set_etag(etag)
+    if len(rows) > limit:
+        next_url = url_for(
+            "accounts.list_accounts",
+            limit=limit,
+            after=_encode_cursor(rows[limit - 1].id),
+            **{key: request.args[key] for key in Account.FILTERS + ("fields",) if key in request.args},
+        )
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response, 200
+
+@accounts_bp.route("/accounts/search", methods=["GET"])
+@replica_safe
+@route_class("list")
+def search_accounts_route():
+    """Search accounts by name or address prefix, best matches first
+
+    Results are paged with limit and offset, and a Link header points to
+    the next page. fields limits the columns read and returned.
+    """
+    text = request.args.get("q", "")
+    try:
+        fields = _parse_fields(request.args.get("fields"))
+        limit = _parse_limit(request.args.get("limit"), default=DEFAULT_SEARCH_SIZE)
+        offset = _parse_offset(request.args.get("offset"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not text.strip():
+        return jsonify({"error": "q is required"}), 400
+
+    # Fetch one extra row to find out whether there is a next page
+    rows = search_rows(text, limit=limit + 1, offset=offset, fields=fields)
+    response = jsonify([Account.serialize_row(row, fields) for row in rows[:limit]])
+    if len(rows) > limit:
+        next_url = url_for(
+            "accounts.search_accounts_route",
+            q=text,
+            limit=limit,
+            offset=offset + limit,
+            **({"fields": request.args["fields"]} if fields else {}),
+        )
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response, 200
+
+
+def _export_csv(batches, fields):
+    """Yield a header line, then one CSV chunk per batch of rows"""
+    columns = fields or Account.SERIALIZED_FIELDS
+    date_index = columns.index("date_joined") if "date_joined" in columns else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        if date_index is None:
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                values = list(row)
+                if values[date_index] is not None:
+                    values[date_index] = values[date_index].isoformat()
+                writer.writerow(values)
+        yield buffer.getvalue()
+
+
+def _export_ndjson(batches, fields, dumps):
+    """Yield one chunk of JSON lines per batch of rows"""
+    for rows in batches:
+        yield "".join([dumps(Account.serialize_row(row, fields)) + "\n" for row in rows])
+
+
+def _parse_export_after(args):
+    """Return the id to resume an export after, from after or after_id
+
+    after is the opaque cursor GET /accounts uses. Export rows always carry
+    their raw id, so after_id takes the last id received as a convenience.
+    """
+    if "after" in args and "after_id" in args:
+        raise ValueError("Use either after or after_id, not both")
+    if "after" in args:
+        return _decode_cursor(args["after"])
+    value = args.get("after_id")
+    if value is None:
+        return None
+    try:
+        after = int(value)
+    except ValueError:
+        raise ValueError("after_id must be an integer") from None
+    if after < 0:
+        raise ValueError("after_id must not be negative")
+    return after
+
+
+@accounts_bp.route("/accounts/export", methods=["GET"])
+@replica_safe
+@route_class("list")
+def export_accounts():
+    """Stream every matching account as CSV (default) or NDJSON, in id order
+
+    Rows are read through a server-side cursor EXPORT_BATCH_SIZE at a time
+    and each batch is written as one chunk, so memory stays flat however
+    large the table is. Takes the list filters and fields; id is always
+    exported. An export resumes after the account given by the same after
+    cursor as the list, or by after_id, the last raw id received.
+    """
+    export_format = request.args.get("format", "csv")
+    if export_format not in EXPORT_MIMETYPES:
+        return jsonify({"error": "format must be 'csv' or 'ndjson'"}), 400
+    try:
+        filters = _parse_filters(request.args)
+        fields = _parse_fields(request.args.get("fields"))
+        after = _parse_export_after(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if fields is not None and "id" not in fields:
+        fields = ("id",) + fields
+
+    batches = Account.iter_row_batches(
+        batch_size=EXPORT_BATCH_SIZE, filters=filters, fields=fields, after=after
+    )
+    if export_format == "csv":
+        chunks = _export_csv(batches, fields)
+    else:
+        chunks = _export_ndjson(batches, fields, current_app.json.dumps)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_MIMETYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="accounts.{export_format}"'},
+    )
+
 
 @accounts_bp.route("/accounts/<int:account_id>", methods=["GET"])
+@replica_safe
 def read_account(account_id):
-    """Read an account by id"""
-    account = Account.find(account_id)
-    if not account:
+    """Read an account by id
+
+    Sends a strong ETag. A matching If-None-Match is answered with 304
+    after a version lookup, without building the body. Cached bodies are
+    only used once a version lookup confirms them. fields picks the
+    returned fields out of the cached document.
+    """
+    try:
+        fields = _parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    etag = None
+    if request.if_none_match:
+        etag = Account.current_etag(account_id)
+        if etag is None:
+            abort(404, description=f"Account with id {account_id} not found")
+        if request.if_none_match.contains_weak(_fields_etag(etag, fields)):
+            return _not_modified(_fields_etag(etag, fields))
+
+    entry = Account.find_cached(account_id, etag=etag)
+    if entry is None:
         abort(404, description=f"Account with id {account_id} not found")
-    return jsonify(account.serialize()), 200
+    data = entry["data"]
+    if fields is not None:
+        data = {field: data[field] for field in fields}
+    response = jsonify(data)
+    response.set_etag(_fields_etag(entry["etag"], fields))
+    return response, 200
+
+
+@accounts_bp.route("/accounts/cache/stats", methods=["GET"])
+def account_cache_stats():
+    """Report the account cache counters"""
+    return jsonify(get_cache().stats()), 200
 
 @accounts_bp.route("/accounts/<int:account_id>", methods=["PUT"])
 def update_account(account_id):
@@ -67,6 +622,8 @@ def update_account(account_id):
 
         return jsonify(account.serialize()), 200
 
+    except IntegrityError as e:
+        return _integrity_error(e)
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
@@ -74,12 +631,44 @@ def update_account(account_id):
         current_app.logger.error(f"Error updating account: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@accounts_bp.route("/accounts/<int:account_id>", methods=["PATCH"])
+def patch_account(account_id):
+    """Partially update an account with a single UPDATE statement"""
+    try:
+        changes = _validate_changes(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        account = Account.patch(account_id, changes)
+        if account is not None:
+            payload = account.serialize()
+            etag = account.etag
+        db.session.commit()
+    except IntegrityError as e:
+        return _integrity_error(e)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error patching account: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    if account is None:
+        abort(404, description=f"Account with id {account_id} not found")
+    get_cache().invalidate(account_id)
+
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response, 200
+
+
 @accounts_bp.route("/accounts/<int:account_id>", methods=["DELETE"])
 def delete_account(account_id):
-    """Delete an account"""
-    account = Account.find(account_id)
-    if account:
-        account.delete()
+    """Delete an account
+
+    Runs a single DELETE by id, and still answers 204 when there was
+    nothing to delete.
+    """
+    Account.remove(account_id)
     return "", 204
 
 
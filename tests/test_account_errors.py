@@ -5,6 +5,7 @@ from service import create_app
 import os
 import sys
 import unittest
+from unittest.mock import patch
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -89,3 +90,29 @@ class TestAccountErrorHandling(unittest.TestCase):
         response2 = self.client.post("/accounts", json=data2)
         self.assertEqual(response2.status_code, 400)
         self.assertIn("already exists", response2.get_json()["error"].lower())
+
+    def test_null_name_or_email(self):
+        """Test that null required fields are a validation error, not a duplicate"""
+        for data in ({"name": None, "email": "q@example.com"}, {"name": "Q", "email": None}):
+            response = self.client.post("/accounts", json=data)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("cannot be null", response.get_json()["error"])
+
+        response = self.client.post("/accounts/bulk", json=[
+            {"name": None, "email": "q@example.com"},
+            {"name": "Good", "email": "good@example.com"},
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.get_json()["results"]
+        self.assertEqual([result["status"] for result in results], [400, 201])
+        self.assertIn("cannot be null", results[0]["error"])
+
+    def test_other_constraint_is_not_a_duplicate(self):
+        """Test that an integrity error other than the email index is reported as such"""
+        def deserialize(account, data):
+            account.email = data["email"]
+
+        with patch.object(Account, "deserialize", deserialize):
+            response = self.client.post("/accounts", json={"email": "q@example.com"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "Account data violates a database constraint")
@@ -0,0 +1,175 @@
+"""Tests for admission control and load shedding"""
+
+from service import admission, create_app, db
+from prometheus_client import REGISTRY
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class AdmissionTestCase(unittest.TestCase):
+    """Base class with an app built from the admission settings in config"""
+
+    config = {}
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        }
+        test_config.update(self.config)
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def get(self, path="/accounts/1", client="10.0.0.1", **kwargs):
+        return self.client.get(path, environ_base={"REMOTE_ADDR": client}, **kwargs)
+
+
+class TestDisabledByDefault(AdmissionTestCase):
+    """Test that nothing is shed without configuration"""
+
+    def test_no_limits(self):
+        """Test many requests from one client all get through"""
+        self.assertFalse(self.app.extensions["admission"].enabled)
+        statuses = {self.get().status_code for _ in range(50)}
+        self.assertEqual(statuses, {404})
+
+
+class TestClientRate(AdmissionTestCase):
+    """Test the per-client token bucket"""
+
+    config = {"ADMISSION_CLIENT_RATE": 0.5, "ADMISSION_CLIENT_BURST": 2}
+
+    def test_client_is_limited(self):
+        """Test 429 with Retry-After once a client has spent its burst"""
+        self.assertEqual([self.get().status_code for _ in range(2)], [404, 404])
+        response = self.get()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.get_json(), {"error": "Too many requests"})
+        self.assertEqual(response.headers["Retry-After"], "2")
+
+        # Other clients have their own bucket
+        self.assertEqual(self.get(client="10.0.0.2").status_code, 404)
+
+    def test_probes_are_exempt(self):
+        """Test that health and metrics never run out of tokens"""
+        for _ in range(5):
+            self.get()
+        for path in ("/health", "/", "/metrics"):
+            self.assertEqual(self.get(path).status_code, 200)
+
+    def test_shed_requests_are_counted(self):
+        """Test that rejections show up in the request metrics"""
+        labels = {"endpoint": "accounts.read_account", "method": "GET", "status": "429"}
+        before = REGISTRY.get_sample_value("http_requests_total", labels) or 0
+        for _ in range(3):
+            self.get()
+        self.assertEqual(REGISTRY.get_sample_value("http_requests_total", labels), before + 1)
+
+
+class TestClientHeader(AdmissionTestCase):
+    """Test telling clients apart by a proxy header"""
+
+    config = {"ADMISSION_CLIENT_RATE": 1, "ADMISSION_CLIENT_HEADER": "X-Forwarded-For"}
+
+    def test_forwarded_client(self):
+        """Test that the first X-Forwarded-For hop is the client"""
+        self.assertEqual(self.get(headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.9"}).status_code, 404)
+        self.assertEqual(self.get(headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.8"}).status_code, 429)
+        self.assertEqual(self.get(headers={"X-Forwarded-For": "2.2.2.2, 10.0.0.9"}).status_code, 404)
+
+
+class TestGlobalRate(AdmissionTestCase):
+    """Test the global token bucket"""
+
+    config = {"ADMISSION_GLOBAL_RATE": 1, "ADMISSION_GLOBAL_BURST": 3}
+
+    def test_global_limit(self):
+        """Test 503 once all clients together spent the burst"""
+        statuses = [self.get(client=f"10.0.0.{i}").status_code for i in range(4)]
+        self.assertEqual(statuses, [404, 404, 404, 503])
+        self.assertEqual(self.get().headers["Retry-After"], "1")
+
+
+class TestConcurrencyLimits(AdmissionTestCase):
+    """Test the in-flight limit per route class"""
+
+    config = {"ADMISSION_MAX_LISTS": 1, "ADMISSION_MAX_WRITES": 1, "ADMISSION_RETRY_AFTER": 3}
+
+    def test_stream_holds_its_slot(self):
+        """Test that a list stream blocks the next list until it is finished"""
+        for i in range(3):
+            self.client.post("/accounts", json={"name": "Stream", "email": f"s{i}@example.com"})
+        stream = self.get("/accounts?stream=true", buffered=False)
+        self.assertEqual(stream.status_code, 200)
+
+        response = self.get("/accounts?limit=10")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "3")
+        self.assertIn("list", response.get_json()["error"])
+
+        # Reads and writes have their own limits
+        self.assertEqual(self.get("/accounts/999").status_code, 404)
+        self.assertEqual(self.client.post("/accounts", json={"name": "A", "email": "a@example.com"}).status_code, 201)
+
+        stream.close()
+        self.assertEqual(self.get("/accounts?limit=10").status_code, 200)
+
+    def test_route_classes(self):
+        """Test how requests are classified"""
+        with self.app.test_request_context("/accounts/search?q=x"):
+            self.assertEqual(admission._route_class(), "list")
+        with self.app.test_request_context("/accounts/1", method="PATCH"):
+            self.assertEqual(admission._route_class(), "write")
+        with self.app.test_request_context("/accounts/1"):
+            self.assertEqual(admission._route_class(), "read")
+
+    def test_unknown_route_class(self):
+        """Test that a misspelt route class fails at import"""
+        with self.assertRaises(ValueError):
+            admission.route_class("lists")
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test the refill arithmetic"""
+
+    def test_refill(self):
+        """Test that tokens come back at the configured rate, up to the burst"""
+        with patch("service.admission.time.monotonic", return_value=100.0) as clock:
+            bucket = admission.TokenBucket(rate=2, burst=2)
+            self.assertEqual([bucket.take(), bucket.take()], [0, 0])
+            self.assertAlmostEqual(bucket.take(), 0.5)
+
+            clock.return_value = 100.25
+            self.assertAlmostEqual(bucket.take(), 0.25)
+            clock.return_value = 110.0
+            self.assertEqual([bucket.take(), bucket.take()], [0, 0])
+            self.assertGreater(bucket.take(), 0)
+
+    def test_clients_are_bounded(self):
+        """Test that the least recently seen client bucket is dropped"""
+        buckets = admission.ClientBuckets(rate=1, max_clients=2)
+        for client in ("a", "b", "a", "c"):
+            buckets.take(client)
+        self.assertEqual(list(buckets._buckets), ["a", "c"])
+
+    def test_settings_from_env(self):
+        """Test that the settings are read and typed"""
+        settings = admission.settings_from_env({"ADMISSION_CLIENT_RATE": "2.5", "ADMISSION_MAX_LISTS": "4"})
+        self.assertEqual(settings["ADMISSION_CLIENT_RATE"], 2.5)
+        self.assertEqual(settings["ADMISSION_MAX_LISTS"], 4)
+        self.assertEqual(settings["ADMISSION_GLOBAL_RATE"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
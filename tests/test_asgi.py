@@ -0,0 +1,240 @@
+"""Tests for the ASGI variant of the account routes"""
+
+from service import create_app, database, idempotency
+from service.asgi import create_asgi_app
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestAsgiApp(unittest.TestCase):
+    """Drive the ASGI callable directly, the way uvicorn would"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.uri = f"sqlite:///{os.path.join(self.directory, 'asgi.db')}"
+        self.loop = asyncio.new_event_loop()
+        self.app = create_asgi_app({"SQLALCHEMY_DATABASE_URI": self.uri})
+        self.loop.run_until_complete(self.app.create_all())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.app.engine.dispose())
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def request(self, method, url, body=None, headers=None):
+        """Send one request and return (status, headers, body bytes)"""
+        parts = urlsplit(url)
+        payload = json.dumps(body).encode() if body is not None else b""
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": parts.path,
+            "query_string": parts.query.encode(),
+            "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        }
+        messages = [{"type": "http.request", "body": payload, "more_body": False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        self.loop.run_until_complete(self.app(scope, receive, send))
+        start = sent[0]
+        response_headers = {k.decode(): v.decode() for k, v in start["headers"]}
+        data = b"".join(message.get("body", b"") for message in sent[1:])
+        return start["status"], response_headers, data
+
+    def create(self, name, email):
+        status, _, data = self.request("POST", "/accounts", {"name": name, "email": email})
+        self.assertEqual(status, 201)
+        return json.loads(data)
+
+    def test_create_and_read(self):
+        """Test that created accounts can be read back with an ETag"""
+        account = self.create("Async", "async@example.com")
+        status, headers, data = self.request("GET", f"/accounts/{account['id']}")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(data), account)
+        self.assertEqual(headers["etag"], f'"{account["id"]}-1"')
+
+        status, _, _ = self.request(
+            "GET", f"/accounts/{account['id']}", headers={"If-None-Match": headers["etag"]}
+        )
+        self.assertEqual(status, 304)
+
+    def test_matches_wsgi_output(self):
+        """Test that both apps serve byte-identical documents from one database"""
+        account = self.create("Same", "same@example.com")
+        flask_app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": self.uri})
+        urls = (
+            f"/accounts/{account['id']}",
+            f"/accounts/{account['id']}?fields=email",
+            "/accounts?limit=5",
+            "/accounts?fields=id,name",
+            "/accounts?stream=1",
+        )
+        for url in urls:
+            expected = flask_app.test_client().get(url).data
+            self.assertEqual(self.request("GET", url)[2], expected, url)
+
+    def test_duplicate_email(self):
+        """Test that a duplicate email is rejected with 400"""
+        self.create("One", "dup@example.com")
+        status, _, data = self.request("POST", "/accounts", {"name": "Two", "email": "dup@example.com"})
+        self.assertEqual(status, 400)
+        self.assertIn("already exists", json.loads(data)["error"])
+
+    def test_upsert(self):
+        """Test that ?on_conflict=update updates the existing account"""
+        account = self.create("Old", "up@example.com")
+        status, _, data = self.request(
+            "POST", "/accounts?on_conflict=update", {"name": "New", "email": "up@example.com"}
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(data)["id"], account["id"])
+
+    def test_idempotency_key(self):
+        """Test that a retried create is replayed instead of creating a duplicate"""
+        body = {"name": "Retry", "email": "retry@example.com"}
+        headers = {"Idempotency-Key": "key-1"}
+        first = self.request("POST", "/accounts", body, headers)
+        self.assertEqual(first[0], 201)
+        self.assertNotIn("idempotent-replayed", first[1])
+
+        status, response_headers, data = self.request("POST", "/accounts", body, headers)
+        self.assertEqual(status, 201)
+        self.assertEqual(data, first[2])
+        self.assertEqual(response_headers["idempotent-replayed"], "true")
+        self.assertEqual(response_headers["content-type"], "application/json")
+        self.assertEqual(len(json.loads(self.request("GET", "/accounts")[2])), 1)
+
+        other = {"name": "Other", "email": "other@example.com"}
+        self.assertEqual(self.request("POST", "/accounts", other, headers)[0], 422)
+        self.assertEqual(self.request("POST", "/accounts", body, {"Idempotency-Key": ""})[0], 400)
+
+    def test_idempotency_replays_client_errors(self):
+        """Test that a rejected create is stored and replayed like the WSGI app does"""
+        headers = {"Idempotency-Key": "key-2"}
+        first = self.request("POST", "/accounts", {"name": "No email"}, headers)
+        self.assertEqual(first[0], 400)
+        second = self.request("POST", "/accounts", {"name": "No email"}, headers)
+        self.assertEqual((second[0], second[2]), (400, first[2]))
+        self.assertEqual(second[1]["idempotent-replayed"], "true")
+
+    def test_idempotency_key_in_progress(self):
+        """Test 409 with Retry-After while another request holds the key"""
+        body = {"name": "Busy", "email": "busy@example.com"}
+        payload = json.dumps(body).encode()
+        digest = idempotency.fingerprint("POST", "/accounts", b"", payload)
+        self.app.idempotency.claim(idempotency.store_key("POST", "/accounts", "key-3"), digest)
+        self.app.idempotency.wait = 0.05
+        status, headers, _ = self.request("POST", "/accounts", body, {"Idempotency-Key": "key-3"})
+        self.assertEqual(status, 409)
+        self.assertEqual(headers["retry-after"], "1")
+
+    def test_list_pages_and_stream(self):
+        """Test keyset pages, filters and the NDJSON stream"""
+        for i in range(3):
+            self.create(f"User {i}", f"user{i}@example.com")
+
+        status, headers, data = self.request("GET", "/accounts?limit=2&name_prefix=User")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(json.loads(data)), 2)
+        link = headers["link"]
+        status, headers, data = self.request("GET", link[1:link.index(">")])
+        self.assertEqual([a["name"] for a in json.loads(data)], ["User 2"])
+        self.assertNotIn("link", headers)
+
+        status, headers, _ = self.request("GET", "/accounts", headers={"If-None-Match": headers["etag"]})
+        self.assertEqual(status, 200)
+
+        status, headers, data = self.request("GET", "/accounts?stream=1")
+        self.assertEqual(headers["content-type"], "application/x-ndjson")
+        self.assertEqual(len(data.decode().splitlines()), 3)
+
+    def test_list_etag(self):
+        """Test that an unchanged list is answered with 304"""
+        self.create("Tagged", "tagged@example.com")
+        _, headers, _ = self.request("GET", "/accounts")
+        status, _, _ = self.request("GET", "/accounts", headers={"If-None-Match": headers["etag"]})
+        self.assertEqual(status, 304)
+
+    def test_update_patch_delete(self):
+        """Test PUT, PATCH and DELETE, including the cache invalidation"""
+        account = self.create("Edit", "edit@example.com")
+        url = f"/accounts/{account['id']}"
+        self.request("GET", url)
+
+        status, _, data = self.request("PUT", url, {"name": "Put", "email": "edit@example.com"})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(self.request("GET", url)[2])["name"], "Put")
+
+        status, headers, data = self.request("PATCH", url, {"disabled": True})
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(data)["disabled"])
+        self.assertEqual(headers["etag"], f'"{account["id"]}-3"')
+
+        self.assertEqual(self.request("DELETE", url)[0], 204)
+        self.assertEqual(self.request("GET", url)[0], 404)
+        self.assertEqual(self.request("PATCH", url, {"disabled": False})[0], 404)
+
+    def test_errors(self):
+        """Test validation, unknown routes and unsupported methods"""
+        self.assertEqual(self.request("POST", "/accounts", {"name": "No email"})[0], 400)
+        self.assertEqual(self.request("GET", "/accounts?disabled=maybe")[0], 400)
+        self.assertEqual(self.request("PATCH", "/accounts/1", {"id": 5})[0], 400)
+        self.assertEqual(self.request("GET", "/nothing")[0], 404)
+        status, headers, _ = self.request("POST", "/accounts/1")
+        self.assertEqual(status, 405)
+        self.assertIn("GET", headers["allow"])
+
+    def test_lifespan(self):
+        """Test the startup and shutdown handshake"""
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        self.loop.run_until_complete(self.app({"type": "lifespan"}, receive, send))
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+
+
+class TestAsyncDatabaseUri(unittest.TestCase):
+    """Test the driver mapping used by the async engine"""
+
+    def test_async_drivers(self):
+        """Test that default drivers are swapped for asyncio ones"""
+        self.assertEqual(database.async_database_uri("sqlite:///accounts.db"), "sqlite+aiosqlite:///accounts.db")
+        self.assertEqual(
+            database.async_database_uri("postgresql://u:p@db/accounts"), "postgresql+asyncpg://u:p@db/accounts"
+        )
+        self.assertEqual(
+            database.async_database_uri("postgresql+asyncpg://db/x"), "postgresql+asyncpg://db/x"
+        )
+
+    def test_statement_timeout(self):
+        """Test that asyncpg receives the statement timeout as a server setting"""
+        config = database.settings_from_env({
+            "DATABASE_URI": "postgresql://u:p@db/accounts", "DATABASE_STATEMENT_TIMEOUT": "5000"
+        })
+        options = database.async_engine_options(config)
+        self.assertEqual(options["connect_args"], {"server_settings": {"statement_timeout": "5000"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
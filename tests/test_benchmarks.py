@@ -0,0 +1,96 @@
+"""Tests for the benchmark runner"""
+
+from benchmarks import runner, startup
+from benchmarks.__main__ import main
+from service import create_app, db
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+    """Test the workload, statistics and baseline comparison"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(runner.percentile(values, 50), 50)
+        self.assertEqual(runner.percentile(values, 95), 95)
+        self.assertEqual(runner.percentile(values, 99), 99)
+        self.assertEqual(runner.percentile([7], 99), 7)
+        self.assertIsNone(runner.percentile([], 50))
+
+    def test_run_in_process(self):
+        """Test a small mixed run against the test client"""
+        app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+        with app.app_context():
+            db.create_all()
+        client = runner.InProcessClient(app)
+        results = runner.run_benchmark(client, mix="mixed", requests=200, accounts=50, warmup=5)
+        self.assertEqual(results["overall"]["requests"], 200)
+        self.assertEqual(results["overall"]["errors"], 0)
+        self.assertEqual(
+            sum(result["requests"] for name, result in results.items() if name != "overall"), 200
+        )
+        for key in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+            self.assertIsNotNone(results["overall"][key])
+        self.assertLessEqual(results["overall"]["p50_ms"], results["overall"]["p99_ms"])
+
+    def test_compare(self):
+        """Test that slower p95 or lower throughput beyond the threshold is flagged"""
+        baseline = {"read": {"p95_ms": 10.0, "throughput": 100.0}}
+        self.assertEqual(runner.compare({"read": {"p95_ms": 10.5, "throughput": 95.0}}, baseline), [])
+        regressions = runner.compare({"read": {"p95_ms": 12.0, "throughput": 80.0}}, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertEqual(runner.compare({"list": {"p95_ms": 50.0, "throughput": 1.0}}, baseline), [])
+
+    def test_cli_output_and_baseline(self):
+        """Test that the CLI writes results and compares them with a baseline"""
+        output = os.path.join(self.directory, "results.json")
+        args = ["--accounts", "20", "--requests", "50", "--warmup", "0", "--mix", "read"]
+        with redirect_stdout(StringIO()):
+            self.assertEqual(main(args + ["--output", output]), 0)
+        with open(output, encoding="utf-8") as handle:
+            document = json.load(handle)
+        self.assertEqual(document["meta"]["target"], "in-process")
+        self.assertIn("overall", document["results"])
+
+        # Make the baseline impossibly fast so the next run regresses
+        for result in document["results"].values():
+            result["p95_ms"] = 0.0001
+        with open(output, "w", encoding="utf-8") as handle:
+            json.dump(document, handle)
+        with redirect_stdout(StringIO()) as printed:
+            self.assertEqual(main(args + ["--baseline", output]), 1)
+        self.assertIn("Regressions", printed.getvalue())
+
+    def test_startup(self):
+        """Test the import-to-first-request timings of fresh processes"""
+        directory, database_uri = runner.temporary_database()
+        self.addCleanup(shutil.rmtree, directory)
+        runner.create_schema(database_uri)
+
+        results = startup.measure_startup(database_uri, runs=2)
+        self.assertEqual(list(results), list(startup.PHASES))
+        for phase in startup.PHASES:
+            self.assertEqual(results[phase]["requests"], 2)
+            self.assertEqual(results[phase]["errors"], 0)
+            self.assertGreater(results[phase]["p50_ms"], 0)
+        self.assertGreaterEqual(results["total"]["p50_ms"], results["import"]["p50_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
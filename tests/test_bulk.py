@@ -0,0 +1,206 @@
+"""Tests for the bulk account routes"""
+
+from service import create_app
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestBulkCreate(unittest.TestCase):
+    """Test POST /accounts/bulk"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def test_bulk_create_json_array(self):
+        """Test creating several accounts from a JSON array"""
+        data = [{"name": f"User {i}", "email": f"user{i}@example.com"} for i in range(3)]
+        response = self.client.post("/accounts/bulk", json=data)
+        self.assertEqual(response.status_code, 201)
+        body = response.get_json()
+        self.assertEqual(body["created"], 3)
+        self.assertEqual([result["status"] for result in body["results"]], [201, 201, 201])
+
+        listed = self.client.get("/accounts").get_json()
+        self.assertEqual(
+            {account["id"] for account in listed},
+            {result["id"] for result in body["results"]},
+        )
+
+    def test_bulk_create_ndjson(self):
+        """Test creating accounts from an NDJSON body"""
+        lines = "\n".join(
+            json.dumps({"name": f"User {i}", "email": f"user{i}@example.com"}) for i in range(2)
+        )
+        response = self.client.post(
+            "/accounts/bulk", data=lines, content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()["created"], 2)
+
+    def test_bulk_create_partial_failure(self):
+        """Test per-item statuses for invalid and duplicate accounts"""
+        self.client.post("/accounts", json={"name": "Existing", "email": "taken@example.com"})
+        data = [
+            {"name": "Good", "email": "good@example.com"},
+            {"name": "Missing email"},
+            {"name": "Taken", "email": "taken@example.com"},
+            {"name": "Repeat", "email": "good@example.com"},
+            "not an object",
+        ]
+        response = self.client.post("/accounts/bulk", json=data)
+        self.assertEqual(response.status_code, 207)
+        results = response.get_json()["results"]
+        self.assertEqual([result["status"] for result in results], [201, 400, 400, 400, 400])
+        self.assertIn("already exists", results[2]["error"])
+        self.assertIn("Duplicate", results[3]["error"])
+        self.assertEqual(len(self.client.get("/accounts").get_json()), 2)
+
+    def test_bulk_create_wrong_types(self):
+        """Test that an item with a wrongly typed field fails on its own"""
+        data = [
+            {"name": "Good", "email": "good@example.com"},
+            {"name": "List", "email": ["b@example.com"]},
+            {"name": "Flag", "email": "flag@example.com", "disabled": "yes"},
+            {"name": "Phone", "email": "phone@example.com", "phone_number": 5551234},
+            {"name": {"x": 1}, "email": "name@example.com"},
+        ]
+        response = self.client.post("/accounts/bulk", json=data)
+        self.assertEqual(response.status_code, 207)
+        results = response.get_json()["results"]
+        self.assertEqual([result["status"] for result in results], [201, 400, 400, 400, 400])
+        self.assertEqual(results[1]["error"], "email must be a string")
+        self.assertEqual(results[2]["error"], "disabled must be true or false")
+        self.assertEqual(len(self.client.get("/accounts").get_json()), 1)
+
+    def test_bulk_create_invalid_body(self):
+        """Test that non-array bodies are rejected"""
+        response = self.client.post("/accounts/bulk", json={"name": "Not a list"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/accounts/bulk", json=[])
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/accounts/bulk", data="{broken", content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TestBulkUpdateDelete(unittest.TestCase):
+    """Test PATCH and DELETE /accounts/bulk"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+        data = [{"name": f"User {i}", "email": f"user{i}@example.com"} for i in range(4)]
+        response = self.client.post("/accounts/bulk", json=data)
+        self.ids = [result["id"] for result in response.get_json()["results"]]
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _disabled_ids(self):
+        return sorted(a["id"] for a in self.client.get("/accounts").get_json() if a["disabled"])
+
+    def test_bulk_update_by_ids(self):
+        """Test disabling a list of accounts"""
+        response = self.client.patch(
+            "/accounts/bulk", json={"ids": self.ids[:2], "changes": {"disabled": True}}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["updated"], 2)
+        self.assertEqual(self._disabled_ids(), self.ids[:2])
+
+    def test_bulk_update_by_filter(self):
+        """Test updating every account that matches a filter"""
+        self.client.patch("/accounts/bulk", json={"ids": self.ids[:3], "changes": {"disabled": True}})
+        response = self.client.patch(
+            "/accounts/bulk",
+            json={"filter": {"disabled": True}, "changes": {"address": "Archived"}},
+        )
+        self.assertEqual(response.get_json()["updated"], 3)
+        addresses = [a["address"] for a in self.client.get("/accounts").get_json()]
+        self.assertEqual(addresses.count("Archived"), 3)
+
+    def test_bulk_update_validation(self):
+        """Test that bad selections and changes are rejected"""
+        bad_requests = [
+            {"changes": {"disabled": True}},
+            {"ids": self.ids, "changes": {}},
+            {"ids": self.ids, "changes": {"id": 99}},
+            {"ids": self.ids, "changes": {"name": None}},
+            {"ids": self.ids, "changes": {"name": {"x": 1}}},
+            {"ids": self.ids, "changes": {"email": 5}},
+            {"ids": "1,2", "changes": {"disabled": True}},
+            {"filter": {"phone_number": "1"}, "changes": {"disabled": True}},
+        ]
+        for data in bad_requests:
+            response = self.client.patch("/accounts/bulk", json=data)
+            self.assertEqual(response.status_code, 400, data)
+
+    def test_bulk_update_duplicate_email(self):
+        """Test that a bulk update violating the unique email returns 400"""
+        response = self.client.patch(
+            "/accounts/bulk", json={"ids": self.ids[:2], "changes": {"email": "same@example.com"}}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_delete_by_ids(self):
+        """Test deleting a list of accounts, ignoring unknown ids"""
+        response = self.client.delete("/accounts/bulk", json={"ids": self.ids[:2] + [999]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["deleted"], 2)
+        remaining = [a["id"] for a in self.client.get("/accounts").get_json()]
+        self.assertEqual(remaining, self.ids[2:])
+
+    def test_bulk_delete_by_query_filter(self):
+        """Test purging disabled accounts with a query string filter"""
+        self.client.patch("/accounts/bulk", json={"ids": self.ids[:1], "changes": {"disabled": True}})
+        response = self.client.delete("/accounts/bulk?disabled=true")
+        self.assertEqual(response.get_json()["deleted"], 1)
+        self.assertEqual(len(self.client.get("/accounts").get_json()), 3)
+
+    def test_bulk_delete_requires_selection(self):
+        """Test that a bulk delete without ids or filter is refused"""
+        response = self.client.delete("/accounts/bulk")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.client.get("/accounts").get_json()), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
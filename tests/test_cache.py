@@ -0,0 +1,359 @@
+"""Tests for the account cache"""
+
+from service import create_app
+from service.cache import AccountCache, MemoryBackend, RedisBackend
+import fnmatch
+import os
+import shutil
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Serve the handful of Redis commands the cache backend uses"""
+
+    def _read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == b"GET":
+                reply = self._bulk(store.get(args[1]))
+            elif command == b"SET":
+                if b"NX" in args[3:] and args[1] in store:
+                    reply = self._bulk(None)
+                else:
+                    store[args[1]] = args[2]
+                    reply = b"+OK\r\n"
+            elif command == b"DEL":
+                removed = sum(1 for key in args[1:] if store.pop(key, None) is not None)
+                reply = b":%d\r\n" % removed
+            elif command == b"SCAN":
+                pattern = args[3].decode()
+                keys = [key for key in store if fnmatch.fnmatch(key.decode(), pattern)]
+                reply = b"*2\r\n" + self._bulk(b"0") + b"*%d\r\n" % len(keys)
+                reply += b"".join(self._bulk(key) for key in keys)
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class TestMemoryBackend(unittest.TestCase):
+    """Test the in-process LRU backend"""
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        backend = MemoryBackend(max_size=2)
+        backend.set(1, "one", 60)
+        backend.set(2, "two", 60)
+        backend.get(1)
+        backend.set(3, "three", 60)
+        self.assertEqual(backend.get(1), "one")
+        self.assertIsNone(backend.get(2))
+        self.assertEqual(backend.evictions, 1)
+        self.assertEqual(len(backend), 2)
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are treated as misses"""
+        backend = MemoryBackend()
+        backend.set(1, "one", 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(backend.get(1))
+        self.assertEqual(backend.evictions, 1)
+
+    def test_add_only_if_absent(self):
+        """Test that add does not overwrite a live entry but replaces an expired one"""
+        backend = MemoryBackend()
+        self.assertTrue(backend.add(1, "one", 0.01))
+        self.assertFalse(backend.add(1, "uno", 60))
+        self.assertEqual(backend.get(1), "one")
+        time.sleep(0.02)
+        self.assertTrue(backend.add(1, "uno", 60))
+        self.assertEqual(backend.get(1), "uno")
+
+
+class TestRedisBackend(unittest.TestCase):
+    """Test the Redis protocol backend against a local stand-in"""
+
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), FakeRedisHandler)
+        self.server.daemon_threads = True
+        self.server.store = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.backend = RedisBackend(f"redis://{host}:{port}/0")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_round_trip(self):
+        """Test storing, reading and deleting an entry"""
+        self.backend.set(7, {"id": 7, "name": "Seven"}, 60)
+        self.assertEqual(self.backend.get(7), {"id": 7, "name": "Seven"})
+        self.backend.delete(7)
+        self.assertIsNone(self.backend.get(7))
+
+    def test_add_only_if_absent(self):
+        """Test that add is SET ... NX"""
+        self.assertTrue(self.backend.add(7, {"id": 7}, 60))
+        self.assertFalse(self.backend.add(7, {"id": 8}, 60))
+        self.assertEqual(self.backend.get(7), {"id": 7})
+
+    def test_clear_only_removes_prefixed_keys(self):
+        """Test that clear leaves keys outside the prefix alone"""
+        self.server.store[b"other:1"] = b"keep"
+        self.backend.set(1, {"id": 1}, 60)
+        self.backend.clear()
+        self.assertEqual(list(self.server.store), [b"other:1"])
+
+    def test_set_many_is_one_round_trip(self):
+        """Test that tombstones for many accounts are pipelined"""
+        self.backend.set(1, {"id": 1}, 60)
+        with patch.object(self.backend, "_connection", wraps=self.backend._connection) as connection:
+            self.backend.set_many([1, 2, 3], {"tombstone": True}, 60)
+        self.assertEqual(connection.call_count, 1)
+        self.assertEqual([self.backend.get(key) for key in (1, 2, 3)], [{"tombstone": True}] * 3)
+
+    def test_unreachable_server_is_a_miss(self):
+        """Test that connection failures count as errors, not exceptions"""
+        cache = AccountCache(RedisBackend("redis://127.0.0.1:1/0"))
+        self.assertIsNone(cache.get(1))
+        cache.set(1, {"id": 1})
+        self.assertEqual(cache.stats()["errors"], 2)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+
+class TestInvalidationRace(unittest.TestCase):
+    """Test that an invalidation wins over a fill read before the write"""
+
+    def setUp(self):
+        self.cache = AccountCache(MemoryBackend(), tombstone_ttl=0.05)
+
+    def test_fill_after_invalidate_is_dropped(self):
+        """Test that a tombstone blocks the fill until it expires"""
+        self.cache.invalidate(1)
+        self.assertFalse(self.cache.set(1, {"etag": "1-1"}))
+        self.assertIsNone(self.cache.get(1))
+        time.sleep(0.06)
+        self.assertTrue(self.cache.set(1, {"etag": "1-2"}))
+        self.assertEqual(self.cache.get(1), {"etag": "1-2"})
+
+    def test_invalidate_replaces_entry(self):
+        """Test that invalidating a cached account turns it into a miss"""
+        self.cache.set(1, {"etag": "1-1"})
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_fill_does_not_overwrite(self):
+        """Test that a slower fill does not replace a newer one"""
+        self.assertTrue(self.cache.set(1, {"etag": "1-2"}))
+        self.assertFalse(self.cache.set(1, {"etag": "1-1"}))
+        self.assertEqual(self.cache.get(1), {"etag": "1-2"})
+
+    def test_clear_blocks_every_fill(self):
+        """Test that a filtered bulk write keeps old rows out of the cache"""
+        self.cache.set(1, {"etag": "1-1"})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(1))
+        self.assertFalse(self.cache.set(2, {"etag": "2-1"}))
+        time.sleep(0.06)
+        self.assertTrue(self.cache.set(2, {"etag": "2-1"}))
+
+
+class TestAccountCacheRoutes(unittest.TestCase):
+    """Test that the routes read through and invalidate the cache"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+        response = self.client.post("/accounts", json={"name": "Cached", "email": "cached@example.com"})
+        self.account_id = response.get_json()["id"]
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _stats(self):
+        return self.client.get("/accounts/cache/stats").get_json()
+
+    def test_second_read_is_a_hit(self):
+        """Test that repeated reads are served from the cache"""
+        self.client.get(f"/accounts/{self.account_id}")
+        self.client.get(f"/accounts/{self.account_id}")
+        stats = self._stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["backend"], "MemoryBackend")
+
+    def test_update_invalidates(self):
+        """Test that a PUT is visible to the next read"""
+        self.client.get(f"/accounts/{self.account_id}")
+        self.client.put(
+            f"/accounts/{self.account_id}", json={"name": "Changed", "email": "cached@example.com"}
+        )
+        data = self.client.get(f"/accounts/{self.account_id}").get_json()
+        self.assertEqual(data["name"], "Changed")
+
+    def test_delete_invalidates(self):
+        """Test that a deleted account is not served from the cache"""
+        self.client.get(f"/accounts/{self.account_id}")
+        self.client.delete(f"/accounts/{self.account_id}")
+        response = self.client.get(f"/accounts/{self.account_id}")
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_update_invalidates(self):
+        """Test that set-based updates drop the affected entries"""
+        self.client.get(f"/accounts/{self.account_id}")
+        self.client.patch("/accounts/bulk", json={"filter": {"disabled": False}, "changes": {"disabled": True}})
+        data = self.client.get(f"/accounts/{self.account_id}").get_json()
+        self.assertTrue(data["disabled"])
+
+    def test_upsert_invalidates(self):
+        """Test that an upsert of an existing email refreshes the cached account"""
+        self.client.get(f"/accounts/{self.account_id}")
+        self.client.post(
+            "/accounts?on_conflict=update", json={"name": "Upserted", "email": "cached@example.com"}
+        )
+        data = self.client.get(f"/accounts/{self.account_id}").get_json()
+        self.assertEqual(data["name"], "Upserted")
+
+    def test_cache_disabled(self):
+        """Test that the none backend never reports hits"""
+        self.app.config["ACCOUNT_CACHE_BACKEND"] = "none"
+        self.app.extensions.pop("account_cache", None)
+        self.client.get(f"/accounts/{self.account_id}")
+        self.client.get(f"/accounts/{self.account_id}")
+        self.assertEqual(self._stats()["hits"], 0)
+
+
+class TestFillRacingWrite(unittest.TestCase):
+    """Test a read whose cache fill lands after a concurrent write"""
+
+    def setUp(self):
+        # A database file, so the writer thread gets a connection of its own
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app({
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.directory}/accounts.db",
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+        response = self.client.post("/accounts", json={"name": "Cached", "email": "cached@example.com"})
+        self.account_id = response.get_json()["id"]
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_fill_after_write_is_dropped(self):
+        """Test that a read that loaded the row before a PATCH does not cache it"""
+        fill = AccountCache.set
+
+        def write_then_fill(cache, account_id, entry, ttl=None):
+            # The write commits between the reader's SELECT and its cache fill
+            writer = threading.Thread(
+                target=self.app.test_client().patch,
+                args=(f"/accounts/{account_id}",),
+                kwargs={"json": {"name": "Written"}},
+            )
+            writer.start()
+            writer.join()
+            return fill(cache, account_id, entry, ttl)
+
+        with patch.object(AccountCache, "set", write_then_fill):
+            stale = self.client.get(f"/accounts/{self.account_id}")
+        self.assertEqual(stale.get_json()["name"], "Cached")
+
+        response = self.client.get(f"/accounts/{self.account_id}", headers={"If-None-Match": stale.headers["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["name"], "Written")
+
+
+class TestSeveralWorkers(unittest.TestCase):
+    """Test two app instances, each with its own memory cache, on one database"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.directory}/accounts.db",
+        }
+        self.apps = [create_app(dict(config)), create_app(dict(config))]
+        self.first, self.second = [app.test_client() for app in self.apps]
+        with self.apps[0].app_context():
+            from service import db
+
+            db.create_all()
+        response = self.first.post("/accounts", json={"name": "Cached", "email": "cached@example.com"})
+        self.account_id = response.get_json()["id"]
+
+    def tearDown(self):
+        from service import db
+
+        for app in self.apps:
+            with app.app_context():
+                db.session.remove()
+                db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_write_through_other_worker(self):
+        """Test that a worker does not serve its cached copy after another worker's write"""
+        stale = self.first.get(f"/accounts/{self.account_id}")
+        self.assertEqual(stale.get_json()["name"], "Cached")
+        self.assertEqual(self.second.patch(f"/accounts/{self.account_id}", json={"name": "Written"}).status_code, 200)
+
+        response = self.first.get(f"/accounts/{self.account_id}", headers={"If-None-Match": stale.headers["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["name"], "Written")
+        self.assertEqual(self.first.get(f"/accounts/{self.account_id}").get_json()["name"], "Written")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""Tests for response compression"""
+
+from service import compression, create_app
+import gzip
+import os
+import sys
+import unittest
+import zlib
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestCompression(unittest.TestCase):
+    """Test gzip and brotli negotiation on the account routes"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+        self.client.post("/accounts/bulk", json=[
+            {"name": f"User {i}", "email": f"user{i}@example.com", "address": f"{i} Main Street"}
+            for i in range(50)
+        ])
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def test_gzip_list(self):
+        """Test that a large list is gzipped and decodes to the plain body"""
+        plain = self.client.get("/accounts")
+        response = self.client.get("/accounts", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertEqual(int(response.headers["Content-Length"]), len(response.data))
+
+    def test_compressed_etag_is_weak(self):
+        """Test that the ETag becomes weak and still validates"""
+        response = self.client.get("/accounts", headers={"Accept-Encoding": "gzip"})
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        response = self.client.get("/accounts", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_body_not_compressed(self):
+        """Test that bodies below COMPRESS_MIN_SIZE are sent as they are"""
+        self.client.patch("/accounts/1", json={"address": "x" * 400})
+        self.app.config["COMPRESS_MIN_SIZE"] = 1000
+        response = self.client.get("/accounts/1", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(response.get_json()["id"], 1)
+
+        self.app.config["COMPRESS_MIN_SIZE"] = 100
+        response = self.client.get("/accounts/1", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    def test_incompressible_body_sent_plain(self):
+        """Test that a body is sent as it is when compression would not shrink it"""
+        self.app.config["COMPRESS_MIN_SIZE"] = 0
+        response = self.client.get("/accounts/1?fields=id", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_no_accept_encoding(self):
+        """Test that clients that do not ask for compression get plain bodies"""
+        for headers in ({}, {"Accept-Encoding": "identity"}, {"Accept-Encoding": "gzip;q=0"}):
+            response = self.client.get("/accounts", headers=headers)
+            self.assertNotIn("Content-Encoding", response.headers, headers)
+
+    @unittest.skipUnless(compression.brotli, "Brotli is not installed")
+    def test_brotli_preferred(self):
+        """Test that brotli wins when the client accepts both equally"""
+        plain = self.client.get("/accounts")
+        response = self.client.get("/accounts", headers={"Accept-Encoding": "gzip, deflate, br"})
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertEqual(compression.brotli.decompress(response.data), plain.data)
+
+        response = self.client.get("/accounts", headers={"Accept-Encoding": "gzip, br;q=0.5"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    @patch("service.routes.STREAM_BATCH_SIZE", 10)
+    def test_stream_compressed_incrementally(self):
+        """Test that every flushed chunk can be decoded as soon as it arrives"""
+        self.app.config["COMPRESS_FLUSH_SIZE"] = 1
+        plain = self.client.get("/accounts?stream=1").data
+        response = self.client.get(
+            "/accounts?stream=1", headers={"Accept-Encoding": "gzip"}, buffered=False
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response.headers)
+
+        decoder = zlib.decompressobj(31)
+        chunks = list(response.response)
+        response.close()
+        first = decoder.decompress(chunks[0])
+        self.assertTrue(first.endswith(b"\n"))
+        body = first + b"".join(decoder.decompress(chunk) for chunk in chunks[1:]) + decoder.flush()
+        self.assertTrue(decoder.eof)
+        self.assertEqual(body, plain)
+
+    def test_stream_flushes_by_size(self):
+        """Test that a stream is not flushed per chunk, so small chunks compress like large ones"""
+        plain = self.client.get("/accounts?stream=1").data
+        decoders = {"gzip": gzip.decompress}
+        if compression.brotli is not None:
+            decoders["br"] = compression.brotli.decompress
+        for encoding, decompress in decoders.items():
+            with patch("service.routes.STREAM_BATCH_SIZE", 1):
+                streamed = self.client.get("/accounts?stream=1", headers={"Accept-Encoding": encoding}).data
+            with patch("service.routes.STREAM_BATCH_SIZE", 1000):
+                batched = self.client.get("/accounts?stream=1", headers={"Accept-Encoding": encoding}).data
+            self.assertEqual(decompress(streamed), plain)
+            self.assertEqual(len(streamed), len(batched), encoding)
+
+    def test_security_app_compresses(self):
+        """Test that the Talisman and CORS app compresses too, keeping their headers"""
+        from service.app import create_app as create_secure_app
+
+        app = create_secure_app({"TESTING": True})
+
+        @app.route("/large")
+        def large():
+            return {"items": ["compressible"] * 100}
+
+        response = app.test_client().get(
+            "/large", headers={"Accept-Encoding": "gzip", "Origin": "https://example.com"}
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Content-Security-Policy", response.headers)
+        self.assertIn("Access-Control-Allow-Origin", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Tests for the select-free and soft delete paths"""
+
+from service import create_app
+from sqlalchemy import event
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class DeleteTestCase(unittest.TestCase):
+    """Shared setup for delete tests"""
+
+    SOFT_DELETE = False
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            "ACCOUNT_SOFT_DELETE": self.SOFT_DELETE,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+            self.engine = db.engine
+
+        response = self.client.post("/accounts", json={"name": "Doomed", "email": "doomed@example.com"})
+        self.account_id = response.get_json()["id"]
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _raw_rows(self):
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql("SELECT id, deleted_at FROM accounts").all()
+
+
+class TestHardDelete(DeleteTestCase):
+    """Test the default delete mode"""
+
+    def test_delete_is_one_statement(self):
+        """Test that deleting an account does not load it first"""
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(self.engine, "before_cursor_execute", before_execute)
+        try:
+            response = self.client.delete(f"/accounts/{self.account_id}")
+        finally:
+            event.remove(self.engine, "before_cursor_execute", before_execute)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("DELETE"))
+        self.assertEqual(self._raw_rows(), [])
+
+    def test_delete_is_idempotent(self):
+        """Test that deleting twice still returns 204"""
+        self.assertEqual(self.client.delete(f"/accounts/{self.account_id}").status_code, 204)
+        self.assertEqual(self.client.delete(f"/accounts/{self.account_id}").status_code, 204)
+
+
+class TestSoftDelete(DeleteTestCase):
+    """Test ACCOUNT_SOFT_DELETE mode"""
+
+    SOFT_DELETE = True
+
+    def test_soft_delete_keeps_row(self):
+        """Test that the row is stamped rather than removed"""
+        response = self.client.delete(f"/accounts/{self.account_id}")
+        self.assertEqual(response.status_code, 204)
+        rows = self._raw_rows()
+        self.assertEqual(len(rows), 1)
+        self.assertIsNotNone(rows[0][1])
+
+    def test_soft_deleted_account_is_hidden(self):
+        """Test that reads, lists and updates skip soft-deleted accounts"""
+        self.client.get(f"/accounts/{self.account_id}")
+        self.client.delete(f"/accounts/{self.account_id}")
+        self.assertEqual(self.client.get(f"/accounts/{self.account_id}").status_code, 404)
+        self.assertEqual(self.client.get("/accounts").get_json(), [])
+        self.assertEqual(self.client.get("/accounts?limit=10").get_json(), [])
+        self.assertEqual(self.client.get("/accounts?stream=1").data, b"")
+        response = self.client.patch(f"/accounts/{self.account_id}", json={"disabled": True})
+        self.assertEqual(response.status_code, 404)
+
+    def test_soft_delete_is_idempotent(self):
+        """Test that deleting again leaves the first timestamp alone"""
+        self.client.delete(f"/accounts/{self.account_id}")
+        first = self._raw_rows()[0][1]
+        self.assertEqual(self.client.delete(f"/accounts/{self.account_id}").status_code, 204)
+        self.assertEqual(self._raw_rows()[0][1], first)
+
+    def test_soft_bulk_delete(self):
+        """Test that bulk deletes stamp rows in soft-delete mode"""
+        response = self.client.delete("/accounts/bulk", json={"ids": [self.account_id]})
+        self.assertEqual(response.get_json()["deleted"], 1)
+        self.assertEqual(len(self._raw_rows()), 1)
+        self.assertEqual(self.client.get("/accounts").get_json(), [])
+
+    def test_deleted_email_can_be_reused(self):
+        """Test that a soft-deleted account does not reserve its email"""
+        self.client.delete(f"/accounts/{self.account_id}")
+        response = self.client.post("/accounts", json={"name": "New", "email": "doomed@example.com"})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotEqual(response.get_json()["id"], self.account_id)
+        self.assertEqual(len(self.client.get("/accounts?email=doomed@example.com").get_json()), 1)
+
+        response = self.client.post("/accounts/bulk", json=[{"name": "Bulk", "email": "doomed@example.com"}])
+        self.assertEqual(response.get_json()["results"][0]["status"], 400)
+
+    def test_upsert_skips_soft_deleted_account(self):
+        """Test that upserting a soft-deleted email creates a new account"""
+        self.client.delete(f"/accounts/{self.account_id}")
+        response = self.client.post(
+            "/accounts?on_conflict=update", json={"name": "Back", "email": "doomed@example.com"}
+        )
+        self.assertNotEqual(response.get_json()["id"], self.account_id)
+        self.assertEqual(self.client.get(f"/accounts/{self.account_id}").status_code, 404)
+        response = self.client.post(
+            "/accounts?on_conflict=update", json={"name": "Again", "email": "doomed@example.com"}
+        )
+        self.assertEqual(response.get_json()["name"], "Again")
+        self.assertEqual(len(self._raw_rows()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
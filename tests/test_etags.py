@@ -0,0 +1,141 @@
+"""Tests for ETag / If-None-Match handling on the account routes"""
+
+from service import create_app
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestAccountETags(unittest.TestCase):
+    """Test conditional GETs for single accounts and lists"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+        response = self.client.post("/accounts", json={"name": "Polled", "email": "polled@example.com"})
+        self.account_id = response.get_json()["id"]
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def test_read_returns_strong_etag(self):
+        """Test that reading an account sends a strong ETag"""
+        response = self.client.get(f"/accounts/{self.account_id}")
+        etag, weak = response.get_etag()
+        self.assertTrue(etag)
+        self.assertFalse(weak)
+
+    def test_read_not_modified(self):
+        """Test that a matching If-None-Match returns an empty 304"""
+        etag = self.client.get(f"/accounts/{self.account_id}").headers["ETag"]
+        self.app.extensions["account_cache"].clear()
+        response = self.client.get(f"/accounts/{self.account_id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_read_etag_changes_after_update(self):
+        """Test that updating an account invalidates its ETag"""
+        etag = self.client.get(f"/accounts/{self.account_id}").headers["ETag"]
+        self.client.put(
+            f"/accounts/{self.account_id}", json={"name": "Changed", "email": "polled@example.com"}
+        )
+        response = self.client.get(f"/accounts/{self.account_id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.get_json()["name"], "Changed")
+
+    def test_read_etag_changes_after_bulk_update(self):
+        """Test that set-based updates bump the row version too"""
+        etag = self.client.get(f"/accounts/{self.account_id}").headers["ETag"]
+        self.client.patch("/accounts/bulk", json={"ids": [self.account_id], "changes": {"disabled": True}})
+        response = self.client.get(f"/accounts/{self.account_id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_read_missing_account_with_if_none_match(self):
+        """Test that conditional reads of unknown accounts still return 404"""
+        response = self.client.get("/accounts/999", headers={"If-None-Match": '"1-1"'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_not_modified(self):
+        """Test that an unchanged list answers 304"""
+        etag = self.client.get("/accounts").headers["ETag"]
+        response = self.client.get("/accounts", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_tracks_changes(self):
+        """Test that inserts, updates and deletes all change the list ETag"""
+        tags = [self.client.get("/accounts").headers["ETag"]]
+        self.client.post("/accounts", json={"name": "Other", "email": "other@example.com"})
+        tags.append(self.client.get("/accounts").headers["ETag"])
+        self.client.put(
+            f"/accounts/{self.account_id}", json={"name": "Changed", "email": "polled@example.com"}
+        )
+        tags.append(self.client.get("/accounts").headers["ETag"])
+        self.client.delete(f"/accounts/{self.account_id}")
+        tags.append(self.client.get("/accounts").headers["ETag"])
+        self.assertEqual(len(set(tags)), 4)
+
+    def test_etags_survive_delete_and_recreate(self):
+        """Test that a new account never gets the id, and so the ETags, of a deleted one"""
+        second = self.client.post("/accounts", json={"name": "Second", "email": "second@example.com"})
+        second_id = second.get_json()["id"]
+        read_etag = self.client.get(f"/accounts/{second_id}").headers["ETag"]
+        list_etag = self.client.get("/accounts").headers["ETag"]
+
+        self.client.delete(f"/accounts/{second_id}")
+        other = self.client.post("/accounts", json={"name": "Other", "email": "other@example.com"})
+        self.assertNotEqual(other.get_json()["id"], second_id)
+
+        response = self.client.get(f"/accounts/{second_id}", headers={"If-None-Match": read_etag})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/accounts", headers={"If-None-Match": list_etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([account["name"] for account in response.get_json()], ["Polled", "Other"])
+
+    def test_filtered_list_etag_tracks_membership(self):
+        """Test that a filtered list with the same count and id sum but other rows is not a 304"""
+        for i in range(2, 6):
+            data = {"name": f"User {i}", "email": f"user{i}@example.com", "disabled": i == 3}
+            self.client.post("/accounts", json=data)
+        self.client.patch("/accounts/5", json={"disabled": True})
+        before = self.client.get("/accounts?disabled=true")
+        self.assertEqual([account["id"] for account in before.get_json()], [3, 5])
+
+        self.client.patch("/accounts/2", json={"disabled": True})
+        self.client.delete("/accounts/3")
+        self.client.delete("/accounts/5")
+        self.client.post("/accounts", json={"name": "User 6", "email": "user6@example.com", "disabled": True})
+
+        response = self.client.get("/accounts?disabled=true", headers={"If-None-Match": before.headers["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([account["id"] for account in response.get_json()], [2, 6])
+
+    def test_paged_list_etag(self):
+        """Test that paged lists carry their own ETag"""
+        self.client.post("/accounts", json={"name": "Other", "email": "other@example.com"})
+        first = self.client.get("/accounts?limit=1")
+        response = self.client.get("/accounts?limit=1", headers={"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(first.headers["ETag"], self.client.get("/accounts?limit=2").headers["ETag"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Tests for the streamed CSV/NDJSON account export"""
+
+from service import create_app, db
+from service.profiling import capture_queries
+import csv
+import io
+import json
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestAccountExport(unittest.TestCase):
+    """Test GET /accounts/export"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+        for i in range(5):
+            self.client.post("/accounts", json={
+                "name": f"User {i}",
+                "email": f"user{i}@example.com",
+                "disabled": i % 2 == 1,
+            })
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def export_csv(self, query=""):
+        response = self.client.get(f"/accounts/export?format=csv{query}")
+        self.assertEqual(response.status_code, 200)
+        return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+    def export_ndjson(self, query=""):
+        response = self.client.get(f"/accounts/export?format=ndjson{query}")
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_csv(self):
+        """Test a CSV download with a header line and every account in id order"""
+        response = self.client.get("/accounts/export")
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.headers["Content-Disposition"], 'attachment; filename="accounts.csv"')
+
+        rows = self.export_csv()
+        accounts = self.client.get("/accounts").get_json()
+        self.assertEqual([row["email"] for row in rows], [account["email"] for account in accounts])
+        self.assertEqual(rows[0]["id"], str(accounts[0]["id"]))
+        self.assertEqual(rows[0]["date_joined"], accounts[0]["date_joined"])
+
+    def test_ndjson(self):
+        """Test that NDJSON records match the JSON list"""
+        response = self.client.get("/accounts/export?format=ndjson")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(self.export_ndjson(), self.client.get("/accounts").get_json())
+
+    def test_filters_and_fields(self):
+        """Test that filters apply and id is always exported"""
+        rows = self.export_csv("&disabled=true&fields=email")
+        self.assertEqual([list(row) for row in rows], [["id", "email"]] * 2)
+        self.assertEqual([row["email"] for row in rows], ["user1@example.com", "user3@example.com"])
+        self.assertEqual(self.export_ndjson("&name_prefix=User%204&fields=name"), [{"id": 5, "name": "User 4"}])
+
+    def test_resume_after_id(self):
+        """Test that after_id resumes an interrupted export"""
+        first = self.export_ndjson()
+        rest = self.export_ndjson(f"&after_id={first[1]['id']}")
+        self.assertEqual(rest, first[2:])
+        self.assertEqual(self.export_csv(f"&after_id={first[-1]['id']}"), [])
+
+    def test_resume_after_cursor(self):
+        """Test that the list's after cursor resumes an export too"""
+        page = self.client.get("/accounts?limit=2")
+        cursor = page.headers["Link"].split("after=")[1].split(">")[0]
+        self.assertEqual(self.export_ndjson(f"&after={cursor}"), self.export_ndjson()[2:])
+
+    def test_deleted_accounts_are_skipped(self):
+        """Test that soft-deleted accounts are not exported"""
+        self.client.delete("/accounts/1")
+        self.assertNotIn(1, [record["id"] for record in self.export_ndjson()])
+
+    def test_bad_parameters(self):
+        """Test 400 for an unknown format, cursor, after_id or field"""
+        for query in (
+            "format=xml", "after_id=abc", "after_id=-1", "after=bogus!", "after=MQ&after_id=1",
+            "fields=password", "disabled=maybe",
+        ):
+            response = self.client.get(f"/accounts/export?{query}")
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("error", response.get_json())
+
+    @patch("service.routes.EXPORT_BATCH_SIZE", 2)
+    def test_one_chunk_per_batch(self):
+        """Test that rows are written a batch at a time from a single query"""
+        with self.app.app_context(), capture_queries(db.engine) as queries:
+            response = self.client.get("/accounts/export?format=ndjson", buffered=False)
+            chunks = list(response.response)
+            response.close()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [2, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests for sparse fieldsets (?fields=) on the read routes"""
+
+from service import create_app
+from sqlalchemy import event
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestSparseFieldsets(unittest.TestCase):
+    """Test that fields= trims both the SELECT and the response"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+            self.engine = db.engine
+
+        for name in ("Ada Lovelace", "Alan Turing", "Grace Hopper"):
+            self.client.post(
+                "/accounts",
+                json={"name": name, "email": f"{name.split()[0].lower()}@example.com", "address": "1 Main St"},
+            )
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _selects(self, url):
+        """Return the response and the SELECT statements it ran"""
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("SELECT"):
+                statements.append(statement)
+
+        event.listen(self.engine, "before_cursor_execute", before_execute)
+        try:
+            response = self.client.get(url)
+        finally:
+            event.remove(self.engine, "before_cursor_execute", before_execute)
+        return response, statements
+
+    def test_list_fields(self):
+        """Test that only the requested fields are selected and returned"""
+        response, statements = self._selects("/accounts?fields=email")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.get_json(),
+            [{"email": "ada@example.com"}, {"email": "alan@example.com"}, {"email": "grace@example.com"}],
+        )
+        select = statements[-1]
+        self.assertIn("accounts.email", select)
+        self.assertNotIn("accounts.address", select)
+        self.assertNotIn("accounts.name", select)
+
+    def test_fields_survive_paging(self):
+        """Test that the next link keeps the fieldset"""
+        response = self.client.get("/accounts?fields=id,email&limit=2")
+        self.assertEqual(set(response.get_json()[0]), {"id", "email"})
+        link = response.headers["Link"]
+        self.assertIn("fields=id", link)
+        response = self.client.get(link[1:link.index(">")])
+        self.assertEqual(response.get_json(), [{"id": 3, "email": "grace@example.com"}])
+
+    def test_stream_fields(self):
+        """Test that the NDJSON stream honours fields"""
+        response = self.client.get("/accounts?stream=1&fields=name")
+        self.assertEqual(response.get_data(as_text=True).splitlines()[0], '{"name": "Ada Lovelace"}')
+
+    def test_read_fields(self):
+        """Test fields on a single account and its separate ETag"""
+        full = self.client.get("/accounts/1")
+        sparse = self.client.get("/accounts/1?fields=email,name")
+        self.assertEqual(sparse.get_json(), {"email": "ada@example.com", "name": "Ada Lovelace"})
+        self.assertNotEqual(full.headers["ETag"], sparse.headers["ETag"])
+
+        response = self.client.get("/accounts/1?fields=email,name", headers={"If-None-Match": sparse.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get("/accounts/1", headers={"If-None-Match": sparse.headers["ETag"]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_fields(self):
+        """Test that search results honour fields"""
+        response, statements = self._selects("/accounts/search?q=grace&fields=id")
+        self.assertEqual(response.get_json(), [{"id": 3}])
+        self.assertNotIn("accounts.email", statements[-1])
+
+    def test_invalid_fields(self):
+        """Test that unknown or empty fieldsets return 400"""
+        for url in ["/accounts?fields=password", "/accounts/1?fields=version", "/accounts/search?q=a&fields=,"]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+
+
+if __name__ == "__main__":
+    unittest.main()
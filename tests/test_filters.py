@@ -0,0 +1,124 @@
+"""Tests for server-side filtering on GET /accounts"""
+
+from service import create_app
+from service.models import Account
+from datetime import datetime, timedelta
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestAccountFilters(unittest.TestCase):
+    """Test the list filters and the query builder behind them"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+            now = datetime.utcnow()
+            db.session.execute(
+                db.insert(Account),
+                [
+                    {"name": "Alice", "email": "alice@example.com", "date_joined": now - timedelta(days=30)},
+                    {"name": "Alan", "email": "alan@example.com", "disabled": True, "date_joined": now},
+                    {"name": "Bob", "email": "bob@example.com", "disabled": True, "date_joined": now},
+                    {"name": "Albert", "email": "albert@example.com", "date_joined": now},
+                ],
+            )
+            db.session.commit()
+        self.cutoff = (now - timedelta(days=1)).isoformat()
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _names(self, query):
+        response = self.client.get(f"/accounts?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [account["name"] for account in response.get_json()]
+
+    def test_filter_by_email(self):
+        """Test exact email lookup"""
+        self.assertEqual(self._names("email=bob@example.com"), ["Bob"])
+
+    def test_filter_by_name_prefix(self):
+        """Test name prefix matching"""
+        self.assertEqual(self._names("name_prefix=Al"), ["Alice", "Alan", "Albert"])
+        self.assertEqual(self._names("name_prefix=Ala"), ["Alan"])
+
+    def test_filter_by_disabled(self):
+        """Test filtering on the disabled flag"""
+        self.assertEqual(self._names("disabled=true"), ["Alan", "Bob"])
+        self.assertEqual(self._names("disabled=false"), ["Alice", "Albert"])
+
+    def test_filter_by_join_date(self):
+        """Test the joined_after and joined_before range"""
+        self.assertEqual(self._names(f"joined_before={self.cutoff}"), ["Alice"])
+        self.assertEqual(self._names(f"joined_after={self.cutoff}"), ["Alan", "Bob", "Albert"])
+
+    def test_combined_filters_with_paging(self):
+        """Test that filters compose and survive the next link"""
+        response = self.client.get("/accounts?name_prefix=Al&disabled=false&limit=1")
+        self.assertEqual([a["name"] for a in response.get_json()], ["Alice"])
+        link = response.headers["Link"]
+        response = self.client.get(link[1:link.index(">")])
+        self.assertEqual([a["name"] for a in response.get_json()], ["Albert"])
+        self.assertNotIn("Link", response.headers)
+
+    def test_filters_apply_to_stream(self):
+        """Test that the NDJSON stream honours filters"""
+        response = self.client.get("/accounts?stream=1&disabled=true")
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 2)
+
+    def test_filters_change_etag(self):
+        """Test that different filters produce different list ETags"""
+        first = self.client.get("/accounts?disabled=true").headers["ETag"]
+        second = self.client.get("/accounts?disabled=false").headers["ETag"]
+        self.assertNotEqual(first, second)
+
+    def test_invalid_filters(self):
+        """Test that malformed filter values return 400"""
+        for query in ["disabled=maybe", "joined_after=yesterday"]:
+            response = self.client.get(f"/accounts?{query}")
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_bulk_operations_accept_new_filters(self):
+        """Test that bulk updates can select rows with the list filters"""
+        response = self.client.patch(
+            "/accounts/bulk", json={"filter": {"name_prefix": "Al"}, "changes": {"address": "Al St"}}
+        )
+        self.assertEqual(response.get_json()["updated"], 3)
+
+    def test_filter_queries_use_indexes(self):
+        """Test that each filter is answered by an index rather than a table scan"""
+        with self.app.app_context():
+            from service import db
+
+            for filters in [
+                {"email": "a@example.com"},
+                {"name_prefix": "Al"},
+                {"disabled": True},
+                {"joined_after": datetime(2020, 1, 1)},
+            ]:
+                stmt = Account.build_query(Account, filters=filters, limit=10)
+                sql = str(stmt.compile(db.engine, compile_kwargs={"literal_binds": True}))
+                plan = " ".join(row[3] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+                self.assertIn("USING INDEX", plan, filters)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+"""Tests for Idempotency-Key handling on POST /accounts"""
+
+from service import create_app, db
+from service.idempotency import HEADER, REPLAYED_HEADER
+from service.models import Account
+from service.profiling import capture_queries
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ACCOUNT = {"name": "Retry", "email": "retry@example.com"}
+
+
+class IdempotencyTestCase(unittest.TestCase):
+    """Base class with an app on a database file several threads can share"""
+
+    config = {}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.directory}/accounts.db",
+            "ACCOUNT_CACHE_BACKEND": "none",
+        }
+        test_config.update(self.config)
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def post(self, key="key-1", json=ACCOUNT, client=None, **kwargs):
+        headers = {HEADER: key} if key is not None else {}
+        return (client or self.client).post("/accounts", json=json, headers=headers, **kwargs)
+
+    def count(self):
+        with self.app.app_context():
+            return db.session.scalar(db.select(db.func.count()).select_from(Account))
+
+
+class TestReplay(IdempotencyTestCase):
+    """Test that a retried create is answered from the store"""
+
+    def test_retry_is_replayed(self):
+        """Test that a retry gets the first response without a query"""
+        first = self.post()
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn(REPLAYED_HEADER, first.headers)
+
+        with self.app.app_context(), capture_queries(db.engine) as queries:
+            second = self.post()
+        self.assertEqual(queries, [])
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertEqual(second.headers[REPLAYED_HEADER], "true")
+        self.assertEqual(second.mimetype, "application/json")
+        self.assertEqual(self.count(), 1)
+
+    def test_client_errors_are_replayed(self):
+        """Test that a rejected create is replayed as well"""
+        self.post(key=None)
+        first = self.post()
+        self.assertEqual(first.status_code, 400)
+        second = self.post()
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertEqual(second.headers[REPLAYED_HEADER], "true")
+
+    def test_other_key_creates_again(self):
+        """Test that keys are independent"""
+        self.assertEqual(self.post(key="a", json={"name": "A", "email": "a@example.com"}).status_code, 201)
+        self.assertEqual(self.post(key="b", json={"name": "B", "email": "b@example.com"}).status_code, 201)
+        self.assertEqual(self.count(), 2)
+
+    def test_without_key(self):
+        """Test that requests without the header are not deduplicated"""
+        self.assertEqual(self.post(key=None).status_code, 201)
+        response = self.post(key=None)
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(REPLAYED_HEADER, response.headers)
+
+    def test_key_reused_for_other_request(self):
+        """Test 422 when a key comes back with a different body or query"""
+        self.post()
+        response = self.post(json={"name": "Other", "email": "other@example.com"})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.post(query_string={"on_conflict": "update"}).status_code, 422)
+        self.assertEqual(self.count(), 1)
+
+    def test_invalid_key(self):
+        """Test that empty and oversized keys are rejected"""
+        self.assertEqual(self.post(key="").status_code, 400)
+        self.assertEqual(self.post(key="k" * 256).status_code, 400)
+        self.assertEqual(self.count(), 0)
+
+    def test_server_errors_are_not_stored(self):
+        """Test that a retry after a 500 runs the handler again"""
+        with patch.object(Account, "serialize", side_effect=RuntimeError("boom")):
+            self.assertEqual(self.post().status_code, 500)
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(REPLAYED_HEADER, response.headers)
+
+
+class BlockedCreateTestCase(IdempotencyTestCase):
+    """Base class for retries that arrive while the first request is still running"""
+
+    def start_blocked_create(self):
+        """Start a create that blocks inside the handler until released"""
+        started, self.release = threading.Event(), threading.Event()
+        deserialize = Account.deserialize
+
+        def slow_deserialize(account, data):
+            started.set()
+            self.release.wait(5)
+            return deserialize(account, data)
+
+        patcher = patch.object(Account, "deserialize", slow_deserialize)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        responses = []
+        thread = threading.Thread(target=lambda: responses.append(self.post(client=self.app.test_client())))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        return thread, responses
+
+
+class TestConcurrentRetries(BlockedCreateTestCase):
+    """Test retries that wait for the first request"""
+
+    config = {"IDEMPOTENCY_WAIT": 5}
+
+    def test_retry_waits_for_first(self):
+        """Test that a concurrent retry waits and gets the first response"""
+        thread, first = self.start_blocked_create()
+        second = []
+        waiter = threading.Thread(target=lambda: second.append(self.post(client=self.app.test_client())))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+
+        self.release.set()
+        thread.join(5)
+        waiter.join(5)
+        self.assertEqual(first[0].status_code, 201)
+        self.assertEqual(second[0].status_code, 201)
+        self.assertEqual(second[0].get_json(), first[0].get_json())
+        self.assertEqual(second[0].headers[REPLAYED_HEADER], "true")
+        self.assertEqual(self.count(), 1)
+
+
+class TestWaitTimeout(BlockedCreateTestCase):
+    """Test IDEMPOTENCY_WAIT running out"""
+
+    config = {"IDEMPOTENCY_WAIT": 0.05}
+
+    def test_retry_times_out(self):
+        """Test 409 with Retry-After while the first request is still running"""
+        thread, first = self.start_blocked_create()
+        response = self.post()
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(first[0].status_code, 201)
+
+
+class TestStoreDisabled(IdempotencyTestCase):
+    """Test IDEMPOTENCY_BACKEND = none"""
+
+    config = {"IDEMPOTENCY_BACKEND": "none"}
+
+    def test_keys_are_ignored(self):
+        """Test that retries run the handler when nothing is stored"""
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(self.post().status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
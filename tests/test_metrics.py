@@ -0,0 +1,141 @@
+"""Tests for the Prometheus metrics"""
+
+from service import create_app, metrics
+from prometheus_client import REGISTRY
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a child process: a worker that serves a few requests
+WORKER_SCRIPT = """
+from service import create_app, db
+app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+for _ in range(3):
+    client.get("/accounts")
+"""
+
+
+def sample(name, **labels):
+    """Return the current value of a sample, treating a missing one as 0"""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(unittest.TestCase):
+    """Test the request and database instrumentation"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def test_request_metrics(self):
+        """Test counts, status codes and latency per endpoint"""
+        labels = {"endpoint": "accounts.read_account", "method": "GET"}
+        before_404 = sample("http_requests_total", status="404", **labels)
+        before_count = sample("http_request_duration_seconds_count", **labels)
+
+        self.client.get("/accounts/999")
+        self.client.get("/no/such/route")
+
+        self.assertEqual(sample("http_requests_total", status="404", **labels), before_404 + 1)
+        self.assertEqual(sample("http_request_duration_seconds_count", **labels), before_count + 1)
+        self.assertGreaterEqual(
+            sample("http_requests_total", endpoint="unmatched", method="GET", status="404"), 1
+        )
+        self.assertEqual(sample("http_requests_in_progress", **labels), 0)
+
+    def test_database_metrics(self):
+        """Test DB time per request and pool checkouts"""
+        checkouts = sample("db_pool_checkouts_total")
+        db_count = sample("db_time_per_request_seconds_count", endpoint="accounts.create_account")
+        db_sum = sample("db_time_per_request_seconds_sum", endpoint="accounts.create_account")
+
+        self.client.post("/accounts", json={"name": "Metric", "email": "metric@example.com"})
+
+        self.assertGreater(sample("db_pool_checkouts_total"), checkouts)
+        self.assertEqual(
+            sample("db_time_per_request_seconds_count", endpoint="accounts.create_account"), db_count + 1
+        )
+        self.assertGreater(sample("db_time_per_request_seconds_sum", endpoint="accounts.create_account"), db_sum)
+        self.assertEqual(sample("db_pool_connections_in_use"), 0)
+
+    def test_metrics_endpoint(self):
+        """Test the Prometheus text output"""
+        self.client.get("/accounts")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        body = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{endpoint="accounts.list_accounts",method="GET",status="200"}', body)
+        self.assertIn("http_request_duration_seconds_bucket", body)
+        self.assertNotIn('endpoint="metrics"', body)
+
+
+class TestMultiprocessMetrics(unittest.TestCase):
+    """Test that /metrics adds up the values of several worker processes"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_workers_are_aggregated(self):
+        """Test the sum over two separate worker processes"""
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=self.directory, PYTHONPATH=ROOT)
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", WORKER_SCRIPT], cwd=ROOT, env=env, check=True)
+
+        with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": self.directory}):
+            registry = metrics.registry()
+        value = registry.get_sample_value(
+            "http_requests_total", {"endpoint": "accounts.list_accounts", "method": "GET", "status": "200"}
+        )
+        self.assertEqual(value, 6)
+
+    def test_gunicorn_config(self):
+        """Test the gunicorn hooks that manage the metrics directory"""
+        directory = os.path.join(self.directory, "prom")
+        with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}):
+            config = runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))
+            self.assertTrue(os.path.isdir(directory))
+            open(os.path.join(directory, "counter_1.db"), "w").close()
+            config["on_starting"](None)
+            self.assertEqual(os.listdir(directory), [])
+
+        worker = type("Worker", (), {"pid": 1234})()
+        with patch("prometheus_client.multiprocess.mark_process_dead") as mark_process_dead:
+            config["child_exit"](None, worker)
+        mark_process_dead.assert_called_once_with(1234)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests for keyset pagination on GET /accounts"""
+
+from service import create_app
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestAccountPagination(unittest.TestCase):
+    """Test the limit/after parameters of the list route"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+        for i in range(5):
+            self.client.post(
+                "/accounts", json={"name": f"User {i}", "email": f"user{i}@example.com"}
+            )
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def test_first_page_has_next_link(self):
+        """Test that a partial page returns a next link"""
+        response = self.client.get("/accounts?limit=2")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([account["email"] for account in data], ["user0@example.com", "user1@example.com"])
+        self.assertIn('rel="next"', response.headers["Link"])
+
+    def test_follow_next_links(self):
+        """Test that following next links visits every account once"""
+        url = "/accounts?limit=2"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(account["id"] for account in response.get_json())
+            link = response.headers.get("Link")
+            url = link[1:link.index(">")] if link else None
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_last_page_has_no_next_link(self):
+        """Test that the final page does not advertise a next page"""
+        response = self.client.get("/accounts?limit=5")
+        self.assertEqual(len(response.get_json()), 5)
+        self.assertNotIn("Link", response.headers)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor returns 400"""
+        response = self.client.get("/accounts?after=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.get_json())
+
+    def test_invalid_limit(self):
+        """Test that out of range limits return 400"""
+        for value in ["0", "-1", "abc", "100000"]:
+            response = self.client.get(f"/accounts?limit={value}")
+            self.assertEqual(response.status_code, 400)
+
+    def test_unpaged_list_unchanged(self):
+        """Test that the list without parameters still returns every account"""
+        response = self.client.get("/accounts")
+        self.assertEqual(len(response.get_json()), 5)
+        self.assertNotIn("Link", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
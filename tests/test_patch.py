@@ -0,0 +1,103 @@
+"""Tests for PATCH /accounts/<id>"""
+
+from service import create_app
+from sqlalchemy import event
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestPatchAccount(unittest.TestCase):
+    """Test partial updates of a single account"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+            self.engine = db.engine
+
+        response = self.client.post(
+            "/accounts", json={"name": "Patchy", "email": "patchy@example.com", "phone_number": "555"}
+        )
+        self.account = response.get_json()
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def test_patch_single_field(self):
+        """Test that only the given field changes"""
+        response = self.client.patch(f"/accounts/{self.account['id']}", json={"disabled": True})
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertTrue(data["disabled"])
+        self.assertEqual(data["name"], "Patchy")
+        self.assertEqual(data["phone_number"], "555")
+        self.assertEqual(data["date_joined"], self.account["date_joined"])
+
+    def test_patch_is_one_statement(self):
+        """Test that a patch runs a single UPDATE ... RETURNING"""
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(self.engine, "before_cursor_execute", before_execute)
+        try:
+            self.client.patch(f"/accounts/{self.account['id']}", json={"disabled": True})
+        finally:
+            event.remove(self.engine, "before_cursor_execute", before_execute)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("UPDATE"))
+        self.assertIn("RETURNING", statements[0])
+
+    def test_patch_updates_etag_and_cache(self):
+        """Test that the patched account is visible to later reads"""
+        etag = self.client.get(f"/accounts/{self.account['id']}").headers["ETag"]
+        response = self.client.patch(f"/accounts/{self.account['id']}", json={"name": "Renamed"})
+        self.assertNotEqual(response.headers["ETag"], etag)
+        read = self.client.get(f"/accounts/{self.account['id']}")
+        self.assertEqual(read.get_json()["name"], "Renamed")
+        self.assertEqual(read.headers["ETag"], response.headers["ETag"])
+
+    def test_patch_not_found(self):
+        """Test that patching an unknown id returns 404"""
+        response = self.client.patch("/accounts/999", json={"disabled": True})
+        self.assertEqual(response.status_code, 404)
+
+    def test_patch_validation(self):
+        """Test that empty, unknown, null and wrongly typed changes are rejected"""
+        for data in [
+            {}, {"id": 5}, {"email": None}, {"disabled": "maybe"}, {"disabled": "true"},
+            {"name": {"x": 1}}, {"email": 5}, {"phone_number": ["555"]}, {"address": 12},
+        ]:
+            response = self.client.patch(f"/accounts/{self.account['id']}", json=data)
+            self.assertEqual(response.status_code, 400, data)
+        self.assertEqual(self.client.get(f"/accounts/{self.account['id']}").get_json(), self.account)
+
+    def test_patch_duplicate_email(self):
+        """Test that taking another account's email returns 400"""
+        self.client.post("/accounts", json={"name": "Other", "email": "other@example.com"})
+        response = self.client.patch(
+            f"/accounts/{self.account['id']}", json={"email": "other@example.com"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already exists", response.get_json()["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+"""Tests for the SQL profiling hooks and the per-route query budgets"""
+
+from service import create_app, db, profiling
+from service.profiling import capture_queries, query_budget
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Most statements each route may run, as (method, path, body, budget).
+# Paths are formatted with the id of an existing account.
+QUERY_BUDGETS = [
+    ("POST", "/accounts", {"name": "New", "email": "new@example.com"}, 1),
+    # Existing-email check, one executemany INSERT and the id lookup
+    ("POST", "/accounts/bulk", [{"name": f"Bulk {i}", "email": f"bulk{i}@example.com"} for i in range(50)], 3),
+    ("GET", "/accounts?limit=10", None, 2),
+    ("GET", "/accounts", None, 2),
+    ("GET", "/accounts/search?q=Budget", None, 1),
+    ("GET", "/accounts/{id}", None, 1),
+    ("PUT", "/accounts/{id}", {"name": "Put", "email": "budget@example.com"}, 3),
+    ("PATCH", "/accounts/{id}", {"name": "Patched"}, 1),
+    ("PATCH", "/accounts/bulk", {"filter": {"name_prefix": "Bud"}, "changes": {"disabled": True}}, 1),
+    ("DELETE", "/accounts/{id}", None, 1),
+    ("DELETE", "/accounts/bulk", {"ids": [1, 2, 3]}, 1),
+]
+
+
+class ProfilingTestCase(unittest.TestCase):
+    """Base class with an app on an in-memory database"""
+
+    config = {}
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            "SQL_PROFILE_HEADERS": True,
+        }
+        test_config.update(self.config)
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            self.engine = db.engine
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def create_account(self, email="budget@example.com"):
+        response = self.client.post("/accounts", json={"name": "Budget", "email": email})
+        return response.get_json()["id"]
+
+
+class TestQueryBudgets(ProfilingTestCase):
+    """Test that no route runs more statements than its budget"""
+
+    def test_route_budgets(self):
+        """Test every route in QUERY_BUDGETS"""
+        for method, path, body, budget in QUERY_BUDGETS:
+            with self.subTest(method=method, path=path):
+                account_id = self.create_account()
+                with query_budget(self.engine, budget):
+                    response = self.client.open(path.format(id=account_id), method=method, json=body)
+                    response.get_data()
+                self.assertLess(response.status_code, 300)
+                self.client.delete(f"/accounts/{account_id}")
+
+    def test_cached_read_skips_database(self):
+        """Test that a second read only looks up the version before using the cache"""
+        account_id = self.create_account()
+        self.client.get(f"/accounts/{account_id}")
+        with capture_queries(self.engine) as queries:
+            self.client.get(f"/accounts/{account_id}")
+        self.assertEqual(len(queries), 1)
+        self.assertIn("SELECT accounts.version", queries[0])
+
+    def test_budget_exceeded(self):
+        """Test the failure lists the statements that ran"""
+        with self.assertRaises(AssertionError) as context:
+            with query_budget(self.engine, 1):
+                self.client.get("/accounts?limit=10")
+        self.assertIn("2 queries exceed the budget of 1", str(context.exception))
+        self.assertIn("SELECT", str(context.exception))
+
+
+class TestProfilingHooks(ProfilingTestCase):
+    """Test the debug headers and the log messages"""
+
+    def test_debug_headers(self):
+        """Test the statement count and database time headers"""
+        response = self.client.post("/accounts", json={"name": "Header", "email": "header@example.com"})
+        self.assertEqual(response.headers["X-DB-Queries"], "1")
+        self.assertGreater(float(response.headers["X-DB-Time"]), 0)
+
+        response = self.client.get("/accounts/cache/stats")
+        self.assertEqual(response.headers["X-DB-Queries"], "0")
+        self.assertEqual(response.headers["X-DB-Time"], "0.000")
+
+    def test_headers_off_by_default(self):
+        """Test that the headers need SQL_PROFILE_HEADERS or debug mode"""
+        app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+        response = app.test_client().get("/health")
+        self.assertNotIn("X-DB-Queries", response.headers)
+        self.assertNotIn("X-DB-Time", response.headers)
+
+    def test_repeated_statements_are_flagged(self):
+        """Test the N+1 warning for a statement run several times in one request"""
+        @self.app.route("/n-plus-one")
+        def n_plus_one():
+            from service.models import Account
+
+            return {"names": [Account.find(account_id).name for account_id in ids]}
+
+        ids = [self.create_account(f"n{i}@example.com") for i in range(3)]
+
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.get("/n-plus-one")
+        self.assertIn("Possible N+1 query in GET /n-plus-one: run 3 times", logs.output[0])
+
+    def test_batches_are_not_flagged(self):
+        """Test that the IN (...) chunks and executemany of a large bulk create are not N+1 queries"""
+        items = [{"name": f"Bulk {i}", "email": f"bulk{i}@example.com"} for i in range(1500)]
+        with self.assertNoLogs(self.app.logger, "WARNING"):
+            response = self.client.post("/accounts/bulk", json=items)
+        self.assertEqual(response.status_code, 201)
+
+    def test_compact_sql(self):
+        """Test that long placeholder lists are shortened for the log"""
+        self.assertEqual(
+            profiling.compact_sql("SELECT id FROM accounts WHERE email IN (?, ?, ?, ?, ?) AND id = ?"),
+            "SELECT id FROM accounts WHERE email IN (... 5 parameters) AND id = ?",
+        )
+        self.assertEqual(
+            profiling.compact_sql("WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s, %(id_1_4)s)"),
+            "WHERE id IN (... 4 parameters)",
+        )
+        self.assertEqual(profiling.compact_sql("VALUES (?, ?, ?)"), "VALUES (?, ?, ?)")
+
+    def test_parameter_shape(self):
+        """Test that parameters are described by type, never by value"""
+        self.assertEqual(profiling.parameter_shape(("secret", 5)), "(str, int)")
+        self.assertEqual(profiling.parameter_shape({"email": "secret"}), "{email: str}")
+        self.assertEqual(profiling.parameter_shape([("a", 1), ("b", 2)], executemany=True), "2 x (str, int)")
+
+
+class TestSlowQueryLog(ProfilingTestCase):
+    """Test the slow query log"""
+
+    config = {"SQL_SLOW_QUERY_MS": 0}
+
+    def test_slow_queries_are_logged(self):
+        """Test the statement and its parameter shape are logged"""
+        with self.assertLogs(self.app.logger, "WARNING") as logs:
+            self.client.post("/accounts", json={"name": "Slow", "email": "slow@example.com"})
+        message = logs.output[0]
+        self.assertIn("Slow query", message)
+        self.assertIn("INSERT INTO accounts", message)
+        self.assertNotIn("slow@example.com", message)
+        self.assertIn("str", message)
+
+    def test_capture_queries_outside_requests(self):
+        """Test capturing statements run from an app context"""
+        with self.app.app_context(), capture_queries(self.engine) as statements:
+            db.session.execute(db.text("SELECT 1"))
+        self.assertEqual(statements, ["SELECT 1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+"""Tests for read replica routing, with SQLite files standing in for the servers"""
+
+from service import create_app, database, db, replicas
+from service.profiling import capture_queries
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ReplicaTestCase(unittest.TestCase):
+    """Base class with a primary and two replicas that hold different rows"""
+
+    config = {}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        uri = f"sqlite:///{self.directory}/{{}}.db".format
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": uri("primary"),
+            "DATABASE_REPLICA_URIS": f"{uri('replica0')}, {uri('replica1')}",
+        }
+        test_config.update(self.config)
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            replica_engines = self.app.extensions["replicas"].engines
+            self.engines = {"primary": db.engine, "replica_0": replica_engines[0], "replica_1": replica_engines[1]}
+        for name, engine in self.engines.items():
+            # Tell the databases apart by the name of their one account
+            db.metadata.create_all(bind=engine)
+            with engine.begin() as conn:
+                conn.execute(db.insert(db.metadata.tables["accounts"]).values(name=name, email=f"{name}@example.com"))
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+        for engine in self.engines.values():
+            engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def list_names(self, client=None):
+        response = (client or self.client).get("/accounts?limit=10")
+        self.assertEqual(response.status_code, 200)
+        return [account["name"] for account in response.get_json()]
+
+
+class TestReplicaRouting(ReplicaTestCase):
+    """Test which database each request reads from"""
+
+    def test_reads_are_spread_round_robin(self):
+        """Test that list requests take the replicas in turn"""
+        client = self.app.test_client(use_cookies=False)
+        names = [self.list_names(client)[0] for _ in range(4)]
+        self.assertEqual(names, ["replica_0", "replica_1", "replica_0", "replica_1"])
+
+    def test_search_uses_replicas(self):
+        """Test that search is replica-safe too"""
+        with capture_queries(self.engines["primary"]) as primary, \
+                capture_queries(self.engines["replica_0"]) as replica0, \
+                capture_queries(self.engines["replica_1"]) as replica1:
+            response = self.client.get("/accounts/search?q=example")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, [])
+        self.assertEqual(len(replica0 + replica1), 1)
+
+    def test_request_sticks_to_one_replica(self):
+        """Test that the ETag query and the page query hit the same replica"""
+        with capture_queries(self.engines["replica_0"]) as first, capture_queries(self.engines["replica_1"]) as second:
+            self.client.get("/accounts?limit=10")
+        self.assertEqual(sorted([len(first), len(second)]), [0, 2])
+
+    def test_writes_use_primary(self):
+        """Test that creates and updates run on the primary only"""
+        with capture_queries(self.engines["primary"]) as primary, \
+                capture_queries(self.engines["replica_0"]) as replica0, \
+                capture_queries(self.engines["replica_1"]) as replica1:
+            response = self.client.post("/accounts", json={"name": "New", "email": "new@example.com"})
+            self.assertEqual(response.status_code, 201)
+            account_id = response.get_json()["id"]
+            response = self.client.patch(f"/accounts/{account_id}", json={"name": "Renamed"})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(primary), 2)
+        self.assertEqual(replica0 + replica1, [])
+
+    def test_cache_is_filled_from_replica(self):
+        """Test that a read outside the window fills the cache from a replica"""
+        with capture_queries(self.engines["primary"]) as primary:
+            name = self.client.get("/accounts/1").get_json()["name"]
+            self.assertEqual(self.client.get("/accounts/1").get_json()["name"], name)
+        self.assertTrue(name.startswith("replica_"))
+        self.assertEqual(primary, [])
+        with self.app.app_context():
+            self.assertEqual(self.app.extensions["account_cache"].get(1)["replica"], True)
+
+    def test_non_get_requests_stay_on_primary(self):
+        """Test that a bulk update reads and writes the primary"""
+        with capture_queries(self.engines["replica_0"]) as replica0, \
+                capture_queries(self.engines["replica_1"]) as replica1:
+            self.client.patch("/accounts/bulk", json={"ids": [1], "changes": {"disabled": True}})
+        self.assertEqual(replica0 + replica1, [])
+
+    def test_outside_requests_use_primary(self):
+        """Test that CLI-style work in an app context reads the primary"""
+        with self.app.app_context():
+            self.assertEqual(db.session.scalar(db.text("SELECT name FROM accounts")), "primary")
+            self.assertEqual(db.session.scalar(db.select(db.metadata.tables["accounts"].c.name)), "primary")
+
+
+class TestReadYourWrites(ReplicaTestCase):
+    """Test that a client reads its own writes"""
+
+    def test_reads_after_write_use_primary(self):
+        """Test that the cookie set by a write routes the next reads to the primary"""
+        self.client.post("/accounts", json={"name": "Mine", "email": "mine@example.com"})
+        self.assertIsNotNone(self.client.get_cookie(replicas.COOKIE_NAME))
+        self.assertEqual(self.list_names(), ["primary", "Mine"])
+
+        # Other clients keep reading from the replicas
+        other = self.app.test_client()
+        self.assertTrue(self.list_names(other)[0].startswith("replica_"))
+
+    def test_cached_replica_row_is_skipped_after_write(self):
+        """Test that a client inside the window reads its account from the primary"""
+        self.assertTrue(self.client.get("/accounts/1").get_json()["name"].startswith("replica_"))
+        self.client.set_cookie(replicas.COOKIE_NAME, "9999999999.0")
+        response = self.client.get("/accounts/1")
+        self.assertEqual(response.get_json()["name"], "primary")
+        revalidated = self.client.get("/accounts/1", headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(revalidated.status_code, 304)
+
+        # The outdated replica entry was replaced by the primary's row
+        with self.app.app_context():
+            self.assertNotIn("replica", self.app.extensions["account_cache"].get(1))
+
+    def test_window_expires(self):
+        """Test that reads go back to the replicas once the window has passed"""
+        self.client.set_cookie(replicas.COOKIE_NAME, "1.0")
+        self.assertTrue(self.list_names()[0].startswith("replica_"))
+
+    def test_failed_write_sets_no_cookie(self):
+        """Test that a rejected write does not pin the client"""
+        self.client.post("/accounts", json={"email": "missing-name@example.com"})
+        self.assertIsNone(self.client.get_cookie(replicas.COOKIE_NAME))
+
+
+class TestReadYourWritesDisabled(ReplicaTestCase):
+    """Test DATABASE_READ_YOUR_WRITES = 0"""
+
+    config = {"DATABASE_READ_YOUR_WRITES": 0}
+
+    def test_no_cookie(self):
+        """Test that writes set no cookie and reads stay on the replicas"""
+        self.client.post("/accounts", json={"name": "Mine", "email": "mine@example.com"})
+        self.assertIsNone(self.client.get_cookie(replicas.COOKIE_NAME))
+        self.assertTrue(self.list_names()[0].startswith("replica_"))
+
+
+class TestBalancers(unittest.TestCase):
+    """Test how a replica is picked"""
+
+    @staticmethod
+    def engine(name, checked_out):
+        return SimpleNamespace(name=name, pool=SimpleNamespace(checkedout=lambda: checked_out))
+
+    def test_least_connections(self):
+        """Test that the least busy replica wins, rotating between ties"""
+        balancer = replicas.LeastConnections()
+        busy, idle = self.engine("busy", 5), self.engine("idle", 1)
+        self.assertEqual([balancer.choose([busy, idle]).name for _ in range(3)], ["idle"] * 3)
+
+        first, second = self.engine("first", 0), self.engine("second", 0)
+        self.assertEqual({balancer.choose([first, second]).name for _ in range(2)}, {"first", "second"})
+
+    def test_unknown_balance(self):
+        """Test that a misspelt strategy fails at startup"""
+        with self.assertRaises(ValueError):
+            create_app({
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                "DATABASE_REPLICA_URIS": "sqlite:///:memory:",
+                "DATABASE_REPLICA_BALANCE": "random",
+            })
+
+    def test_settings_from_env(self):
+        """Test that replica settings are read from the environment"""
+        settings = database.settings_from_env({
+            "DATABASE_REPLICA_URIS": "postgresql://r1/accounts, postgresql://r2/accounts",
+            "DATABASE_REPLICA_BALANCE": "least_connections",
+            "DATABASE_READ_YOUR_WRITES": "2.5",
+        })
+        self.assertEqual(settings["DATABASE_REPLICA_URIS"], ("postgresql://r1/accounts", "postgresql://r2/accounts"))
+        self.assertEqual(settings["DATABASE_REPLICA_BALANCE"], "least_connections")
+        self.assertEqual(settings["DATABASE_READ_YOUR_WRITES"], 2.5)
+        self.assertEqual(database.settings_from_env({})["DATABASE_REPLICA_URIS"], ())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Tests for GET /accounts/search"""
+
+from service import create_app, db
+from service.models import Account
+from service.models.search import search_stmt
+from sqlalchemy.dialects import postgresql
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestAccountSearch(unittest.TestCase):
+    """Test prefix and full-text search over name and address"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+        accounts = [
+            {"name": "Margaret Hamilton", "email": "mh@example.com", "address": "12 Apollo Way"},
+            {"name": "Grace Hopper", "email": "gh@example.com", "address": "1 Cobol Street"},
+            {"name": "Ada Lovelace", "email": "al@example.com", "address": "5 Engine Street"},
+        ]
+        response = self.client.post("/accounts/bulk", json=accounts)
+        self.ids = [result["id"] for result in response.get_json()["results"]]
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _search(self, query):
+        response = self.client.get(f"/accounts/search?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [account["name"] for account in response.get_json()]
+
+    def test_search_by_name_prefix(self):
+        """Test that partial names match"""
+        self.assertEqual(self._search("q=hop"), ["Grace Hopper"])
+        self.assertEqual(self._search("q=marg ham"), ["Margaret Hamilton"])
+
+    def test_search_by_street(self):
+        """Test that address words match"""
+        self.assertEqual(sorted(self._search("q=street")), ["Ada Lovelace", "Grace Hopper"])
+
+    def test_search_sees_updates_and_deletes(self):
+        """Test that the index follows updates, patches and deletes"""
+        self.client.patch(f"/accounts/{self.ids[0]}", json={"address": "7 Saturn Street"})
+        self.assertIn("Margaret Hamilton", self._search("q=saturn"))
+        self.assertEqual(self._search("q=apollo"), [])
+
+        self.client.delete(f"/accounts/{self.ids[1]}")
+        self.assertEqual(self._search("q=cobol"), [])
+
+        self.client.patch("/accounts/bulk", json={"ids": [self.ids[2]], "changes": {"name": "Countess"}})
+        self.assertEqual(self._search("q=countess"), ["Countess"])
+
+    def test_search_skips_soft_deleted(self):
+        """Test that soft-deleted accounts are not returned"""
+        self.app.config["ACCOUNT_SOFT_DELETE"] = True
+        self.client.delete(f"/accounts/{self.ids[2]}")
+        self.assertEqual(self._search("q=lovelace"), [])
+
+    def test_search_pagination(self):
+        """Test paging through results with limit and offset"""
+        response = self.client.get("/accounts/search?q=street&limit=1")
+        self.assertEqual(len(response.get_json()), 1)
+        link = response.headers["Link"]
+        response = self.client.get(link[1:link.index(">")])
+        self.assertEqual(len(response.get_json()), 1)
+        self.assertNotIn("Link", response.headers)
+
+    def test_search_special_characters(self):
+        """Test that FTS syntax in the query cannot break the search"""
+        self.assertEqual(self._search('q="hop*" ('), ["Grace Hopper"])
+        self.assertEqual(self._search("q=%25%25"), [])
+
+    def test_search_every_word(self):
+        """Test that a multi-word query needs each word somewhere, in any order"""
+        self.assertEqual(self._search("q=cobol%20grace"), ["Grace Hopper"])
+        self.assertEqual(self._search("q=grace%20engine"), [])
+
+    def test_postgresql_matches_each_word(self):
+        """Test that PostgreSQL gets one ILIKE per word rather than the whole phrase"""
+        bind = SimpleNamespace(dialect=postgresql.dialect())
+        with self.app.app_context(), patch.object(db.session, "get_bind", return_value=bind):
+            stmt = search_stmt("john  main", Account.id)
+        params = stmt.compile(dialect=postgresql.dialect()).params.values()
+        self.assertEqual(sorted(value for value in params if value.startswith("%")), ["%john%", "%main%"])
+
+    def test_search_validation(self):
+        """Test that missing queries and bad paging return 400"""
+        for query in ["", "q=", "q=ada&offset=-1", "q=ada&offset=abc", "q=ada&offset=10001", "q=ada&limit=0"]:
+            response = self.client.get(f"/accounts/search?{query}")
+            self.assertEqual(response.status_code, 400, query)
+        response = self.client.get("/accounts/search?q=ada&offset=abc")
+        self.assertEqual(response.get_json()["error"], "offset must be a non-negative integer")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Tests for the row projection and the orjson JSON provider"""
+
+from service import create_app, json_provider
+from service.models import Account
+from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_app(provider):
+    """Create a test app using the given JSON_PROVIDER"""
+    return create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "JSON_PROVIDER": provider,
+    })
+
+
+class TestRowProjection(unittest.TestCase):
+    """Test that rows serialize exactly like ORM instances"""
+
+    def setUp(self):
+        self.app = make_app("auto")
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def test_serialize_row_matches_serialize(self):
+        """Test serialize_row() against serialize() for the same account"""
+        self.client.post("/accounts", json={"name": "Zoë", "email": "zoe@example.com", "address": "1 Rue"})
+        with self.app.app_context():
+            account = Account.find(1)
+            row = Account.page_rows()[0]
+            self.assertEqual(Account.serialize_row(row), account.serialize())
+
+    def test_list_and_read_use_rows(self):
+        """Test that list and read responses carry the serialized fields"""
+        created = self.client.post("/accounts", json={"name": "Row", "email": "row@example.com"}).get_json()
+        self.assertEqual(self.client.get("/accounts").get_json(), [created])
+        self.assertEqual(self.client.get("/accounts?limit=5").get_json(), [created])
+        self.assertEqual(self.client.get("/accounts/1").get_json(), created)
+
+
+class TestOrjsonProvider(unittest.TestCase):
+    """Test that the orjson provider matches the default one byte for byte"""
+
+    DOCUMENTS = [
+        {"b": 1, "a": [True, None, 1.5], "c": {"z": "x", "y": ""}},
+        [{"name": "Zoë", "emoji": "\U0001F600"}],
+        {"big": 2 ** 70},
+        {"when": datetime(2024, 1, 2, 3, 4, 5)},
+        "quote \" and backslash \\ and control \x01",
+    ]
+
+    def setUp(self):
+        self.fast = make_app("orjson")
+        self.slow = make_app("json")
+
+    def test_providers_installed(self):
+        """Test that JSON_PROVIDER selects the provider"""
+        self.assertIsInstance(self.fast.json, json_provider.OrjsonProvider)
+        self.assertIs(type(self.slow.json), DefaultJSONProvider)
+
+    def test_byte_identical_output(self):
+        """Test dumps() and response() output for a range of documents"""
+        for document in self.DOCUMENTS:
+            self.assertEqual(self.fast.json.dumps(document), self.slow.json.dumps(document), document)
+            compact = {"separators": (",", ":")}
+            self.assertEqual(
+                self.fast.json.dumps(document, **compact), self.slow.json.dumps(document, **compact), document
+            )
+            with self.fast.app_context():
+                fast = self.fast.json.response(document).get_data()
+            with self.slow.app_context():
+                slow = self.slow.json.response(document).get_data()
+            self.assertEqual(fast, slow, document)
+
+    def test_float_exponents(self):
+        """Test that floats decode the same even where their spelling differs"""
+        document = {"small": 1e-7, "large": 1e16}
+        compact = {"separators": (",", ":")}
+        fast, slow = self.fast.json.dumps(document, **compact), self.slow.json.dumps(document, **compact)
+        self.assertEqual(fast, '{"large":1e16,"small":1e-7}')
+        self.assertEqual(slow, '{"large":1e+16,"small":1e-07}')
+        self.assertEqual(json.loads(fast), json.loads(slow))
+
+    def test_list_endpoint_identical(self):
+        """Test that GET /accounts returns the same bytes with either provider"""
+        bodies = []
+        for app in (self.fast, self.slow):
+            with app.app_context():
+                from service import db
+
+                db.create_all()
+                db.session.execute(db.insert(Account), [
+                    {"name": "Ånne", "email": "anne@example.com", "date_joined": datetime(2024, 1, 1)},
+                    {"name": "Bob", "email": "bob@example.com", "date_joined": datetime(2024, 1, 2, 0, 0, 0, 5)},
+                ])
+                db.session.commit()
+            client = app.test_client()
+            urls = ("/accounts", "/accounts?limit=1", "/accounts/2", "/accounts?stream=1")
+            bodies.append([client.get(url).data for url in urls])
+            with app.app_context():
+                db.session.remove()
+                db.drop_all()
+        self.assertEqual(bodies[0], bodies[1])
+
+    def test_loads(self):
+        """Test request decoding, including values only the stdlib accepts"""
+        self.assertEqual(self.fast.json.loads('{"a": [1, 2]}'), {"a": [1, 2]})
+        self.assertEqual(self.fast.json.loads(b'{"big": 100000000000000000000}'), {"big": 10 ** 20})
+        with self.assertRaises(ValueError):
+            self.fast.json.loads("{not json")
+
+    def test_unknown_provider(self):
+        """Test that an unknown JSON_PROVIDER is rejected"""
+        with self.assertRaises(ValueError):
+            make_app("yaml")
+
+
+if __name__ == "__main__":
+    unittest.main()
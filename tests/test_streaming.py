@@ -0,0 +1,86 @@
+"""Tests for the streamed NDJSON account list"""
+
+from service import create_app
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestAccountStreaming(unittest.TestCase):
+    """Test the NDJSON mode of GET /accounts"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _create_accounts(self, count):
+        for i in range(count):
+            self.client.post(
+                "/accounts", json={"name": f"User {i}", "email": f"user{i}@example.com"}
+            )
+
+    def test_stream_with_accept_header(self):
+        """Test that Accept: application/x-ndjson streams one account per line"""
+        self._create_accounts(3)
+        response = self.client.get("/accounts", headers={"Accept": "application/x-ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertTrue(response.is_streamed)
+
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(len(lines), 3)
+        emails = [json.loads(line)["email"] for line in lines]
+        self.assertEqual(emails, [f"user{i}@example.com" for i in range(3)])
+
+    def test_stream_with_query_parameter(self):
+        """Test that ?stream=1 selects the streaming mode"""
+        self._create_accounts(2)
+        response = self.client.get("/accounts?stream=1")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 2)
+
+    def test_stream_matches_json_list(self):
+        """Test that the streamed records match the JSON array"""
+        self._create_accounts(2)
+        streamed = [
+            json.loads(line)
+            for line in self.client.get("/accounts?stream=1").get_data(as_text=True).splitlines()
+        ]
+        self.assertEqual(streamed, self.client.get("/accounts").get_json())
+
+    def test_stream_empty(self):
+        """Test streaming an empty table returns an empty body"""
+        response = self.client.get("/accounts?stream=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"")
+
+    def test_default_accept_returns_json(self):
+        """Test that a wildcard Accept header still returns a JSON array"""
+        self._create_accounts(1)
+        response = self.client.get("/accounts", headers={"Accept": "*/*"})
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(len(response.get_json()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Tests for duplicate detection and upserts on POST /accounts"""
+
+from service import create_app
+from service.models import Account
+from sqlalchemy import event
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestCreateConflicts(unittest.TestCase):
+    """Test how account creation handles existing emails"""
+
+    def setUp(self):
+        test_config = {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        }
+        self.app = create_app(test_config)
+        self.client = self.app.test_client()
+
+        with self.app.app_context():
+            from service import db
+
+            db.create_all()
+            self.engine = db.engine
+
+    def tearDown(self):
+        with self.app.app_context():
+            from service import db
+
+            db.session.remove()
+            db.drop_all()
+
+    def _count_statements(self, func):
+        statements = []
+
+        def before_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(self.engine, "before_cursor_execute", before_execute)
+        try:
+            result = func()
+        finally:
+            event.remove(self.engine, "before_cursor_execute", before_execute)
+        return result, statements
+
+    def test_create_is_a_single_statement(self):
+        """Test that creating an account issues only the INSERT"""
+        response, statements = self._count_statements(
+            lambda: self.client.post("/accounts", json={"name": "One", "email": "one@example.com"})
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("INSERT"))
+
+    def test_duplicate_email_maps_to_400(self):
+        """Test that the unique index violation returns the existing 400 error"""
+        self.client.post("/accounts", json={"name": "One", "email": "one@example.com"})
+        response = self.client.post("/accounts", json={"name": "Two", "email": "one@example.com"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already exists", response.get_json()["error"])
+
+        # The session is usable again after the rollback
+        response = self.client.post("/accounts", json={"name": "Three", "email": "three@example.com"})
+        self.assertEqual(response.status_code, 201)
+
+    def test_upsert_updates_existing_account(self):
+        """Test that on_conflict=update updates the account with that email"""
+        created = self.client.post(
+            "/accounts", json={"name": "Original", "email": "same@example.com"}
+        ).get_json()
+        response = self.client.post(
+            "/accounts?on_conflict=update",
+            json={"name": "Replaced", "email": "same@example.com", "address": "1 Main St"},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["id"], created["id"])
+        self.assertEqual(data["name"], "Replaced")
+        self.assertEqual(data["address"], "1 Main St")
+        self.assertEqual(data["date_joined"], created["date_joined"])
+
+        read = self.client.get(f"/accounts/{created['id']}").get_json()
+        self.assertEqual(read["name"], "Replaced")
+
+    def test_upsert_inserts_new_account(self):
+        """Test that on_conflict=update inserts when the email is new"""
+        response = self.client.post(
+            "/accounts?on_conflict=update", json={"name": "New", "email": "new@example.com"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.get_json()["id"])
+        self.assertEqual(len(self.client.get("/accounts").get_json()), 1)
+
+    def test_invalid_on_conflict(self):
+        """Test that unknown on_conflict values are rejected"""
+        response = self.client.post(
+            "/accounts?on_conflict=ignore", json={"name": "New", "email": "new@example.com"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @patch.object(Account, "UPSERT_DIALECTS", ("postgresql",))
+    def test_upsert_on_unsupported_dialect(self):
+        """Test 400 rather than a server error where there is no ON CONFLICT"""
+        response = self.client.post(
+            "/accounts?on_conflict=update", json={"name": "New", "email": "new@example.com"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "on_conflict=update is not supported on sqlite")
+        self.assertEqual(self.client.get("/accounts").get_json(), [])
+        with self.assertRaises(ValueError):
+            Account.upsert_stmt({"email": "new@example.com"}, "mysql")
+
+
+if __name__ == "__main__":
+    unittest.main()